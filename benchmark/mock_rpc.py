@@ -0,0 +1,620 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM_ID
+from solders.hash import Hash
+from solders.message import MessageV0, from_bytes_versioned
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+from solders.transaction import VersionedTransaction
+from spl.token.constants import ASSOCIATED_TOKEN_PROGRAM_ID, TOKEN_PROGRAM_ID
+from spl.token.instructions import get_associated_token_address
+
+LAMPORTS_PER_SIGNATURE = 5_000
+TOKEN_ACCOUNT_RENT = 2_039_280
+MINT_RENT = 1_461_600
+TOKEN_ACCOUNT_SIZE = 165
+MAX_RENT_EPOCH = 2 ** 64 - 1
+# blockhash 的有效区块数（与主网一致）
+BLOCKHASH_VALIDITY = 150
+# 模拟时各程序每条指令消耗的 CU
+UNITS = {
+    str(COMPUTE_BUDGET_PROGRAM_ID): 150,
+    str(SYSTEM_PROGRAM_ID): 150,
+    str(TOKEN_PROGRAM_ID): 4_500,
+    str(ASSOCIATED_TOKEN_PROGRAM_ID): 25_000,
+}
+
+
+class TransactionError(Exception):
+    """
+    交易执行失败（对应链上的 InstructionError）
+    """
+
+    def __init__(self, index: int, reason: str):
+        super().__init__(f"instruction {index}: {reason}")
+        self.index = index
+        self.reason = reason
+
+    def to_json(self):
+        return {"InstructionError": [self.index, {"Custom": 1}]}
+
+
+class RpcError(Exception):
+    """
+    以 JSON-RPC error 对象返回给调用方的错误
+    """
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+# 代币账户 state 字段的偏移（mint、owner、amount、delegate 之后）和取值
+TOKEN_STATE_OFFSET = 108
+TOKEN_STATE_FROZEN = 2
+
+
+def token_account_data(mint: Pubkey, owner: Pubkey, amount: int, state: int = 1) -> bytes:
+    # mint, owner, amount, delegate(COption), state(1=initialized, 2=frozen), is_native(COption), delegated_amount, close_authority(COption)
+    return struct.pack("<32s32sQ36sB12sQ36s", bytes(mint), bytes(owner), amount, b"", state, b"", 0, b"")
+
+
+def mint_data(authority: Pubkey, supply: int, decimals: int) -> bytes:
+    return struct.pack("<I32sQBBI32s", 1, bytes(authority), supply, decimals, 1, 0, b"")
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    slot_time: float = 0.4
+
+
+class MockLedger:
+    """
+    内存中的账本：账户（lamports/owner/data）、已处理交易的状态，以及按时间推进的 slot 和区块高度
+    只实现本工具用到的指令：System transfer、SPL Token transfer/transferChecked/closeAccount、
+    ATA create/createIdempotent 和 compute budget
+    """
+
+    def __init__(self, slot_time: float = 0.4):
+        self.slot_time = slot_time
+        self.started_at = time.monotonic()
+        self.accounts: Dict[Pubkey, List] = {}
+        # owner -> 代币账户地址（getTokenAccountsByOwner 不用遍历全部账户）
+        self.token_accounts: Dict[Pubkey, set] = {}
+        self.statuses: Dict[str, Tuple[int, Optional[dict]]] = {}
+        self.landed = 0
+        self.failed = 0
+        self.fees_burned = 0
+
+    @property
+    def slot(self) -> int:
+        return 1_000 + int((time.monotonic() - self.started_at) / self.slot_time)
+
+    @property
+    def block_height(self) -> int:
+        return self.slot - 100
+
+    def blockhash(self, height: int) -> Hash:
+        return Hash(hashlib.sha256(height.to_bytes(8, "little")).digest())
+
+    # ---- 初始状态 ----
+
+    def set_account(self, pubkey: Pubkey, lamports: int, owner: Pubkey = SYSTEM_PROGRAM_ID, data: bytes = b""):
+        self._store(pubkey, [lamports, owner, data])
+
+    def _store(self, pubkey: Pubkey, account: List):
+        self.accounts[pubkey] = account
+        if account[1] == TOKEN_PROGRAM_ID and len(account[2]) == TOKEN_ACCOUNT_SIZE:
+            self.token_accounts.setdefault(Pubkey(account[2][32:64]), set()).add(pubkey)
+
+    def _remove(self, pubkey: Pubkey):
+        account = self.accounts.pop(pubkey, None)
+        if account is not None and account[1] == TOKEN_PROGRAM_ID and len(account[2]) == TOKEN_ACCOUNT_SIZE:
+            self.token_accounts.get(Pubkey(account[2][32:64]), set()).discard(pubkey)
+
+    def fund(self, owners: List[Pubkey], lamports: int):
+        for owner in owners:
+            account = self.accounts.get(owner)
+            if account is None:
+                self.set_account(owner, lamports)
+            else:
+                account[0] += lamports
+
+    def create_mint(self, mint: Pubkey, decimals: int):
+        self.set_account(mint, MINT_RENT, TOKEN_PROGRAM_ID, mint_data(mint, 0, decimals))
+
+    def create_token_accounts(self, owners: List[Pubkey], mint: Pubkey, amount: int, associated: bool = True, frozen: bool = False):
+        """
+        为每个 owner 创建代币账户（默认为 ATA，否则为随机地址的普通代币账户；frozen 时为冻结状态）
+        """
+        state = TOKEN_STATE_FROZEN if frozen else 1
+        for owner in owners:
+            address = get_associated_token_address(owner, mint) if associated else Pubkey.new_unique()
+            self.set_account(address, TOKEN_ACCOUNT_RENT, TOKEN_PROGRAM_ID, token_account_data(mint, owner, amount, state))
+
+    # ---- 查询 ----
+
+    def token_accounts_of(self, owner: Pubkey) -> List[Tuple[Pubkey, List]]:
+        return [(address, self.accounts[address]) for address in sorted(self.token_accounts.get(owner, ()), key=bytes)]
+
+    def decimals_of(self, mint: Pubkey) -> int:
+        account = self.accounts.get(mint)
+        return account[2][44] if account is not None else 0
+
+    # ---- 执行 ----
+
+    @staticmethod
+    def fee_of(message) -> Tuple[int, int]:
+        """
+        :return: (手续费, compute unit limit)
+        """
+        keys = message.account_keys
+        limit, price = None, 0
+        instructions = 0
+        for ix in message.instructions:
+            program = keys[ix.program_id_index]
+            data = bytes(ix.data)
+            if program == COMPUTE_BUDGET_PROGRAM_ID:
+                if data[0] == 2:
+                    limit = struct.unpack_from("<I", data, 1)[0]
+                elif data[0] == 3:
+                    price = struct.unpack_from("<Q", data, 1)[0]
+            else:
+                instructions += 1
+        if limit is None:
+            limit = min(1_400_000, 200_000 * instructions)
+        fee = LAMPORTS_PER_SIGNATURE * message.header.num_required_signatures + math.ceil(limit * price / 1_000_000)
+        return fee, limit
+
+    def execute(self, message, commit: bool = True) -> int:
+        """
+        执行消息，失败时抛出 TransactionError 且不修改账本
+        :return: 消耗的 CU
+        """
+        if isinstance(message, MessageV0) and message.address_table_lookups:
+            raise TransactionError(0, "address lookup tables are not supported by the mock")
+        keys = message.account_keys
+        staged: Dict[Pubkey, Optional[List]] = {}
+
+        def load(pubkey: Pubkey) -> Optional[List]:
+            if pubkey not in staged:
+                account = self.accounts.get(pubkey)
+                staged[pubkey] = list(account) if account is not None else None
+            return staged[pubkey]
+
+        fee, _ = self.fee_of(message)
+        payer = load(keys[0])
+        if payer is None or payer[0] < fee:
+            raise TransactionError(0, "insufficient funds for fee")
+        payer[0] -= fee
+        units = 0
+        for index, ix in enumerate(message.instructions):
+            program = keys[ix.program_id_index]
+            accounts = [keys[i] for i in ix.accounts]
+            data = bytes(ix.data)
+            units += UNITS.get(str(program), 1_000)
+            if program == COMPUTE_BUDGET_PROGRAM_ID:
+                continue
+            if program == SYSTEM_PROGRAM_ID:
+                self._system(index, data, accounts, load, staged)
+            elif program == TOKEN_PROGRAM_ID:
+                self._token(index, data, accounts, load, staged)
+            elif program == ASSOCIATED_TOKEN_PROGRAM_ID:
+                self._create_ata(index, data, accounts, load, staged)
+            else:
+                raise TransactionError(index, f"unsupported program {program}")
+        if commit:
+            for pubkey, account in staged.items():
+                # lamports 为 0 的账户被回收
+                if account is None or account[0] == 0:
+                    self._remove(pubkey)
+                else:
+                    self._store(pubkey, account)
+            self.fees_burned += fee
+        return units
+
+    @staticmethod
+    def _debit(index: int, account: Optional[List], lamports: int):
+        if account is None or account[0] < lamports:
+            raise TransactionError(index, "insufficient lamports")
+        account[0] -= lamports
+
+    def _system(self, index, data, accounts, load, staged):
+        if len(data) != 12 or struct.unpack_from("<I", data)[0] != 2:
+            raise TransactionError(index, "unsupported system instruction")
+        lamports = struct.unpack_from("<Q", data, 4)[0]
+        source = load(accounts[0])
+        if source is not None and source[2]:
+            raise TransactionError(index, "transfer from an account with data")
+        self._debit(index, source, lamports)
+        destination = load(accounts[1])
+        if destination is None:
+            staged[accounts[1]] = [lamports, SYSTEM_PROGRAM_ID, b""]
+        else:
+            destination[0] += lamports
+
+    def _token_account(self, index, account) -> Tuple[Pubkey, Pubkey, int]:
+        if account is None or account[1] != TOKEN_PROGRAM_ID or len(account[2]) != TOKEN_ACCOUNT_SIZE:
+            raise TransactionError(index, "invalid token account")
+        if account[2][TOKEN_STATE_OFFSET] == TOKEN_STATE_FROZEN:
+            raise TransactionError(index, "account is frozen")
+        mint, owner, amount = struct.unpack_from("<32s32sQ", account[2])
+        return Pubkey(mint), Pubkey(owner), amount
+
+    def _token(self, index, data, accounts, load, staged):
+        tag = data[0]
+        if tag in (3, 12):
+            amount = struct.unpack_from("<Q", data, 1)[0]
+            if tag == 3:
+                source_key, destination_key, authority = accounts[0], accounts[1], accounts[2]
+            else:
+                source_key, destination_key, authority = accounts[0], accounts[2], accounts[3]
+            source, destination = load(source_key), load(destination_key)
+            mint, owner, balance = self._token_account(index, source)
+            destination_mint, destination_owner, destination_balance = self._token_account(index, destination)
+            if owner != authority or mint != destination_mint or balance < amount:
+                raise TransactionError(index, "invalid token transfer")
+            source[2] = token_account_data(mint, owner, balance - amount)
+            destination[2] = token_account_data(mint, destination_owner, destination_balance + amount)
+        elif tag == 9:
+            account = load(accounts[0])
+            _, owner, balance = self._token_account(index, account)
+            if owner != accounts[2] or balance != 0:
+                raise TransactionError(index, "cannot close token account")
+            destination = load(accounts[1])
+            if destination is None:
+                destination = staged[accounts[1]] = [0, SYSTEM_PROGRAM_ID, b""]
+            destination[0] += account[0]
+            staged[accounts[0]] = None
+        else:
+            raise TransactionError(index, f"unsupported token instruction {tag}")
+
+    def _create_ata(self, index, data, accounts, load, staged):
+        payer_key, address, owner, mint = accounts[:4]
+        if load(address) is not None:
+            if data[:1] == b"\x01":
+                return
+            raise TransactionError(index, "associated token account already exists")
+        if get_associated_token_address(owner, mint) != address or load(mint) is None:
+            raise TransactionError(index, "invalid associated token account")
+        self._debit(index, load(payer_key), TOKEN_ACCOUNT_RENT)
+        staged[address] = [TOKEN_ACCOUNT_RENT, TOKEN_PROGRAM_ID, token_account_data(mint, owner, 0)]
+
+    def process(self, raw: bytes) -> str:
+        """
+        处理一笔交易（重复的签名直接返回），返回签名
+        """
+        transaction = VersionedTransaction.from_bytes(raw)
+        signature = str(transaction.signatures[0])
+        if signature in self.statuses:
+            return signature
+        try:
+            self.execute(transaction.message)
+        except TransactionError as e:
+            # 和链上一样：付不起手续费的交易不会上链；其余失败照收手续费
+            if e.reason == "insufficient funds for fee":
+                raise
+            fee, _ = self.fee_of(transaction.message)
+            payer = transaction.message.account_keys[0]
+            self.accounts[payer][0] -= fee
+            if self.accounts[payer][0] == 0:
+                self._remove(payer)
+            self.fees_burned += fee
+            self.statuses[signature] = (self.slot, e.to_json())
+            self.failed += 1
+            return signature
+        self.statuses[signature] = (self.slot, None)
+        self.landed += 1
+        return signature
+
+
+class MockRpcServer:
+    """
+    本地 Solana JSON-RPC 模拟节点（HTTP/1.1 keep-alive，支持批量请求），
+    可配置每个 HTTP 请求的延迟、错误率和 429 限流率；另有 mock_* 方法用于布置状态和读取统计
+    """
+
+    def __init__(self, config: MockConfig = MockConfig()):
+        self.config = config
+        self.ledger = MockLedger(config.slot_time)
+        self.calls: Dict[str, int] = {}
+        self.http_requests = 0
+        self.rejected = 0
+
+    # ---- HTTP ----
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle_connection, host, port, limit=2 ** 24)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._handle_http(body)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_http(self, body: bytes) -> Tuple[str, bytes]:
+        self.http_requests += 1
+        request = json.loads(body)
+        admin = isinstance(request, dict) and str(request.get("method", "")).startswith("mock_")
+        if not admin:
+            if self.config.latency:
+                await asyncio.sleep(random.uniform(0.5, 1.5) * self.config.latency)
+            roll = random.random()
+            if roll < self.config.throttle_rate:
+                self.rejected += 1
+                return "429 Too Many Requests", b'{"jsonrpc":"2.0","error":{"code":429,"message":"Too many requests"},"id":null}'
+            if roll < self.config.throttle_rate + self.config.error_rate:
+                self.rejected += 1
+                return "503 Service Unavailable", b"{}"
+        if isinstance(request, list):
+            response = [self._dispatch(item) for item in request]
+        else:
+            response = self._dispatch(request)
+        return "200 OK", json.dumps(response).encode()
+
+    def _dispatch(self, request: dict) -> dict:
+        method = request.get("method")
+        self.calls[method] = self.calls.get(method, 0) + 1
+        handler = getattr(self, "rpc_" + method, None)
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        try:
+            result = handler(*request.get("params", []))
+        except RpcError as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": e.code, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    # ---- 编码 ----
+
+    def _context(self, value) -> dict:
+        return {"context": {"slot": self.ledger.slot}, "value": value}
+
+    @staticmethod
+    def _encode_account(account: Optional[List]) -> Optional[dict]:
+        if account is None:
+            return None
+        lamports, owner, data = account
+        return {
+            "lamports": lamports,
+            "owner": str(owner),
+            "data": [base64.b64encode(data).decode(), "base64"],
+            "executable": False,
+            "rentEpoch": MAX_RENT_EPOCH,
+            "space": len(data),
+        }
+
+    def _encode_parsed_token_account(self, address: Pubkey, account: List) -> dict:
+        lamports, owner, data = account
+        mint, token_owner, amount = struct.unpack_from("<32s32sQ", data)
+        mint = Pubkey(mint)
+        decimals = self.ledger.decimals_of(mint)
+        ui_amount = amount / 10 ** decimals
+        return {
+            "pubkey": str(address),
+            "account": {
+                "lamports": lamports,
+                "owner": str(owner),
+                "data": {
+                    "program": "spl-token",
+                    "parsed": {
+                        "info": {
+                            "isNative": False,
+                            "mint": str(mint),
+                            "owner": str(Pubkey(token_owner)),
+                            "state": "frozen" if data[TOKEN_STATE_OFFSET] == TOKEN_STATE_FROZEN else "initialized",
+                            "tokenAmount": {
+                                "amount": str(amount),
+                                "decimals": decimals,
+                                "uiAmount": ui_amount,
+                                "uiAmountString": str(ui_amount),
+                            },
+                        },
+                        "type": "account",
+                    },
+                    "space": len(data),
+                },
+                "executable": False,
+                "rentEpoch": MAX_RENT_EPOCH,
+                "space": len(data),
+            },
+        }
+
+    @staticmethod
+    def _decode_transaction(encoded: str, options: Optional[dict]) -> bytes:
+        if (options or {}).get("encoding", "base58") != "base64":
+            raise RpcError(-32602, "only base64 encoded transactions are supported")
+        return base64.b64decode(encoded)
+
+    # ---- JSON-RPC 方法 ----
+
+    def rpc_getSlot(self, config=None):
+        return self.ledger.slot
+
+    def rpc_getBlockHeight(self, config=None):
+        return self.ledger.block_height
+
+    def rpc_getLatestBlockhash(self, config=None):
+        height = self.ledger.block_height
+        return self._context({"blockhash": str(self.ledger.blockhash(height)), "lastValidBlockHeight": height + BLOCKHASH_VALIDITY})
+
+    def rpc_getBalance(self, pubkey, config=None):
+        account = self.ledger.accounts.get(Pubkey.from_string(pubkey))
+        return self._context(account[0] if account is not None else 0)
+
+    def rpc_getAccountInfo(self, pubkey, config=None):
+        return self._context(self._encode_account(self.ledger.accounts.get(Pubkey.from_string(pubkey))))
+
+    def rpc_getMultipleAccounts(self, pubkeys, config=None):
+        if len(pubkeys) > 100:
+            raise RpcError(-32602, "Too many inputs provided; max 100")
+        return self._context([self._encode_account(self.ledger.accounts.get(Pubkey.from_string(p))) for p in pubkeys])
+
+    def rpc_getTokenAccountsByOwner(self, owner, filter_, config=None):
+        if (config or {}).get("encoding") != "jsonParsed":
+            accounts = [
+                {"pubkey": str(address), "account": self._encode_account(account)}
+                for address, account in self.ledger.token_accounts_of(Pubkey.from_string(owner))
+            ]
+        else:
+            accounts = [
+                self._encode_parsed_token_account(address, account)
+                for address, account in self.ledger.token_accounts_of(Pubkey.from_string(owner))
+            ]
+        return self._context(accounts)
+
+    def rpc_getTokenAccountBalance(self, pubkey, config=None):
+        account = self.ledger.accounts.get(Pubkey.from_string(pubkey))
+        if account is None:
+            raise RpcError(-32602, "Invalid param: could not find account")
+        mint, _, amount = struct.unpack_from("<32s32sQ", account[2])
+        decimals = self.ledger.decimals_of(Pubkey(mint))
+        ui_amount = amount / 10 ** decimals
+        return self._context({"amount": str(amount), "decimals": decimals, "uiAmount": ui_amount, "uiAmountString": str(ui_amount)})
+
+    def rpc_getMinimumBalanceForRentExemption(self, size, config=None):
+        return (size + 128) * 6_960
+
+    def rpc_getRecentPrioritizationFees(self, accounts=None):
+        slot = self.ledger.slot
+        return [{"slot": slot - i, "prioritizationFee": random.choice((0, 0, 1_000, 5_000, 20_000))} for i in range(150)]
+
+    def rpc_getFeeForMessage(self, encoded, config=None):
+        message = from_bytes_versioned(base64.b64decode(encoded))
+        return self._context(self.ledger.fee_of(message)[0])
+
+    def rpc_simulateTransaction(self, encoded, config=None):
+        transaction = VersionedTransaction.from_bytes(self._decode_transaction(encoded, config))
+        try:
+            units = self.ledger.execute(transaction.message, commit=False)
+            err = None
+        except TransactionError as e:
+            units, err = 0, e.to_json()
+        return self._context({"err": err, "logs": [], "accounts": None, "unitsConsumed": units, "returnData": None})
+
+    def rpc_sendTransaction(self, encoded, config=None):
+        raw = self._decode_transaction(encoded, config)
+        try:
+            return self.ledger.process(raw)
+        except TransactionError as e:
+            raise RpcError(-32002, f"Transaction simulation failed: {e}")
+
+    def rpc_getSignatureStatuses(self, signatures, config=None):
+        slot = self.ledger.slot
+        statuses = []
+        for signature in signatures:
+            status = self.ledger.statuses.get(signature)
+            if status is None:
+                statuses.append(None)
+                continue
+            landed_slot, err = status
+            confirmations = slot - landed_slot
+            statuses.append({
+                "slot": landed_slot,
+                "confirmations": None if confirmations >= 32 else confirmations,
+                "err": err,
+                "status": {"Err": err} if err is not None else {"Ok": None},
+                "confirmationStatus": "finalized" if confirmations >= 32 else "confirmed" if confirmations >= 1 else "processed",
+            })
+        return self._context(statuses)
+
+    # ---- 布置状态和统计 ----
+
+    def rpc_mock_fund(self, owners, lamports):
+        self.ledger.fund([Pubkey.from_string(owner) for owner in owners], lamports)
+        return len(owners)
+
+    def rpc_mock_createMint(self, mint, decimals):
+        self.ledger.create_mint(Pubkey.from_string(mint), decimals)
+        return mint
+
+    def rpc_mock_createTokenAccounts(self, owners, mint, amount, associated=True, frozen=False):
+        self.ledger.create_token_accounts([Pubkey.from_string(owner) for owner in owners], Pubkey.from_string(mint), amount, associated, frozen)
+        return len(owners)
+
+    def rpc_mock_stats(self):
+        return {
+            "calls": dict(self.calls),
+            "http_requests": self.http_requests,
+            "rejected": self.rejected,
+            "landed": self.ledger.landed,
+            "failed": self.ledger.failed,
+            "fees_burned": self.ledger.fees_burned,
+        }
+
+    def rpc_mock_reset(self, latency=None, error_rate=None, throttle_rate=None):
+        """
+        清空账本和统计，可同时调整故障注入参数
+        """
+        if latency is not None:
+            self.config.latency = latency
+        if error_rate is not None:
+            self.config.error_rate = error_rate
+        if throttle_rate is not None:
+            self.config.throttle_rate = throttle_rate
+        self.ledger = MockLedger(self.config.slot_time)
+        self.calls = {}
+        self.http_requests = 0
+        self.rejected = 0
+        return True
+
+
+def run_server(host: str, port: int, config: MockConfig, ready=None):
+    """
+    在独立进程中运行模拟节点（ready 为 multiprocessing.Event 时在开始监听后置位）
+    """
+
+    async def main():
+        server = await MockRpcServer(config).serve(host, port)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local mock Solana JSON-RPC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--slot-time", type=float, default=0.4)
+    args = parser.parse_args()
+    print(f"Mock RPC listening on http://{args.host}:{args.port}")
+    run_server(args.host, args.port, MockConfig(args.latency, args.error_rate, args.throttle_rate, args.slot_time))
@@ -0,0 +1,205 @@
+"""
+在本地模拟节点上对各菜单操作跑合成钱包集，报告耗时、每个钱包的 RPC 调用数和 TPS：
+
+    python -m benchmark.run --wallets 100 1000 10000 --ops send_sol collect_sol --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+from loguru import logger
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+import main
+import utils.balance_scanner as balance_scanner
+import utils.run_journal as run_journal
+from benchmark.mock_rpc import MockConfig, run_server
+from data.config import SEND_CONCURRENCY, RPC_READ_RATE, RPC_READ_MAX_RATE, RPC_SEND_RATE, RPC_SEND_MAX_RATE
+from utils.metrics import metrics
+from utils.mint_cache import mint_cache
+from utils.rate_limiter import EndpointRateLimiter
+from utils.rpc_pool import RpcPool
+
+OPERATIONS = ("send_sol", "send_sol_batch", "collect_sol", "collect_tokens", "sweep_tokens", "close_accounts", "consolidate")
+LAMPORTS_PER_SOL = 1_000_000_000
+# 布置状态时每个 mock_* 请求携带的地址数
+SEED_CHUNK = 5_000
+
+
+async def admin(http: httpx.AsyncClient, url: str, method: str, *params):
+    response = await http.post(url, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)})
+    response.raise_for_status()
+    return response.json()["result"]
+
+
+async def seed_chunked(http: httpx.AsyncClient, url: str, method: str, owners: List[str], *params):
+    for i in range(0, len(owners), SEED_CHUNK):
+        await admin(http, url, method, owners[i:i + SEED_CHUNK], *params)
+
+
+async def seed(http: httpx.AsyncClient, url: str, operation: str, size: int) -> dict:
+    """
+    为一次运行布置账本：主钱包、size 个收款地址或私钥钱包，以及所需的 mint 和代币账户
+    """
+    context = {"main": Keypair(), "keys": [], "addresses": [], "mints": []}
+    await admin(http, url, "mock_fund", [str(context["main"].pubkey())], 1_000_000 * LAMPORTS_PER_SOL)
+    if operation.startswith("send_sol"):
+        context["addresses"] = [str(Pubkey.new_unique()) for _ in range(size)]
+        return context
+    context["keys"] = [Keypair() for _ in range(size)]
+    owners = [str(key.pubkey()) for key in context["keys"]]
+    await seed_chunked(http, url, "mock_fund", owners, LAMPORTS_PER_SOL // 100)
+    for index in range(2 if operation in ("sweep_tokens", "close_accounts", "consolidate") else 1):
+        mint = str(Pubkey.new_unique())
+        await admin(http, url, "mock_createMint", mint, 6)
+        context["mints"].append(mint)
+        # 归集/扫代币时为有余额的 ATA，关闭/扫 SOL 时为空账户，清空钱包时各一个
+        amount = 1_000_000 if operation in ("collect_tokens", "sweep_tokens") or (operation == "consolidate" and index == 0) else 0
+        await seed_chunked(http, url, "mock_createTokenAccounts", owners, mint, amount)
+    return context
+
+
+async def run_operation(operation: str, client: RpcPool, context: dict, concurrency: int):
+    recipient = str(context["main"].pubkey())
+    if operation.startswith("send_sol"):
+        await main.send_sol_to_addresses({
+            'network_url': client,
+            'addresses': context["addresses"],
+            'min_amount': 0.001,
+            'max_amount': 0.002,
+            'private_key': context["main"],
+            'batch': operation == "send_sol_batch",
+            'concurrency': concurrency,
+        })
+    elif operation == "collect_sol":
+        await main.collect_sol_from_addresses(client, recipient, context["keys"], close_accounts=True, concurrency=concurrency)
+    elif operation == "collect_tokens":
+        await main.collect_tokens_from_addresses(client, context["mints"][0], recipient, context["keys"])
+    elif operation == "sweep_tokens":
+        await main.sweep_all_tokens_from_addresses(client, recipient, context["keys"], concurrency=concurrency)
+    elif operation == "close_accounts":
+        await main.close_all_token_account_from_addresses(client, context["keys"], concurrency=concurrency)
+    elif operation == "consolidate":
+        await main.consolidate_wallets(client, recipient, context["keys"], concurrency=concurrency)
+
+
+def rpc_totals(stats: dict) -> Dict[str, int]:
+    calls = {method: count for method, count in stats["calls"].items() if not method.startswith("mock_")}
+    return {"calls": sum(calls.values()), "by_method": calls}
+
+
+async def benchmark(args, url: str) -> List[dict]:
+    rows = []
+    async with httpx.AsyncClient(timeout=600) as http:
+        for operation in args.ops:
+            for size in args.wallets:
+                await admin(http, url, "mock_reset", args.latency, args.error_rate, args.throttle_rate)
+                context = await seed(http, url, operation, size)
+                before = await admin(http, url, "mock_stats")
+                # 每次运行使用全新的余额快照、运行日志和 mint 缓存，避免上次运行的状态影响结果
+                snapshot_dir = tempfile.mkdtemp(prefix="bench_")
+                balance_scanner._snapshot = balance_scanner.BalanceSnapshot(os.path.join(snapshot_dir, "balances.sqlite"))
+                run_journal._journal = run_journal.RunJournal(os.path.join(snapshot_dir, "run_journal.sqlite"))
+                mint_cache.clear()
+                metrics.reset()
+                async with RpcPool([url]) as client:
+                    for endpoint in client.endpoints:
+                        endpoint.limiter = EndpointRateLimiter(args.read_rate, args.read_max_rate, args.send_rate, args.send_max_rate)
+                    started_at = time.monotonic()
+                    await run_operation(operation, client, context, args.concurrency)
+                    wall = time.monotonic() - started_at
+                after = await admin(http, url, "mock_stats")
+                balance_scanner._snapshot.close()
+                run_journal._journal.close()
+                calls = rpc_totals(after)["calls"] - rpc_totals(before)["calls"]
+                landed = after["landed"] - before["landed"]
+                row = {
+                    "operation": operation,
+                    "wallets": size,
+                    "wall_seconds": round(wall, 3),
+                    "rpc_calls": calls,
+                    "rpc_calls_per_wallet": round(calls / size, 2),
+                    "http_requests_per_wallet": round((after["http_requests"] - before["http_requests"] - 1) / size, 2),
+                    "transactions": landed,
+                    "failed_transactions": after["failed"] - before["failed"],
+                    "rejected_requests": after["rejected"] - before["rejected"],
+                    "tps": round(landed / wall, 1) if wall > 0 else 0.0,
+                    "rpc_by_method": {
+                        method: count - before["calls"].get(method, 0)
+                        for method, count in rpc_totals(after)["by_method"].items()
+                        if count - before["calls"].get(method, 0)
+                    },
+                    "client_metrics": metrics.report(),
+                }
+                rows.append(row)
+                print(
+                    f"{operation:<15} {size:>7} wallets  {row['wall_seconds']:>9.2f}s  "
+                    f"{row['rpc_calls_per_wallet']:>7.2f} calls/wallet  {row['http_requests_per_wallet']:>7.2f} http/wallet  "
+                    f"{landed:>7} tx  {row['tps']:>8.1f} tps",
+                    flush=True,
+                )
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark menu operations against a local mock JSON-RPC server")
+    parser.add_argument("--wallets", type=int, nargs="+", default=[100, 1_000], help="synthetic wallet set sizes")
+    parser.add_argument("--ops", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--latency", type=float, default=0.02, help="mean mock latency per HTTP request (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with HTTP 429")
+    parser.add_argument("--slot-time", type=float, default=0.4)
+    parser.add_argument("--concurrency", type=int, default=SEND_CONCURRENCY)
+    parser.add_argument("--read-rate", type=float, default=RPC_READ_RATE)
+    parser.add_argument("--read-max-rate", type=float, default=RPC_READ_MAX_RATE)
+    parser.add_argument("--send-rate", type=float, default=RPC_SEND_RATE)
+    parser.add_argument("--send-max-rate", type=float, default=RPC_SEND_MAX_RATE)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    # 模拟节点不实现地址查找表程序
+    main.USE_LOOKUP_TABLES = False
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(
+        target=run_server,
+        args=("127.0.0.1", port, MockConfig(args.latency, args.error_rate, args.throttle_rate, args.slot_time), ready),
+        daemon=True,
+    )
+    server.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("mock RPC server did not start")
+        rows = asyncio.run(benchmark(args, url))
+    finally:
+        server.terminate()
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(rows, file, indent=2)
+
+
+if __name__ == "__main__":
+    run()
@@ -1,14 +1,135 @@
-# Solana RPC URLs
+import os
+
+# Solana RPC URLs (every entry joins the RPC pool; add backups to enable failover)
 RPC_URLS = {
     "MAINNET": "https://stylish-winter-sanctuary.solana-mainnet.quiknode.pro/xxx",
 }
 
+# RPC pool: endpoints each transaction is broadcast to, base ejection time
+# after an error (seconds, doubled per consecutive failure) and request timeout
+RPC_SEND_FANOUT = 2
+RPC_EJECT_SECONDS = 5
+RPC_TIMEOUT = 10
+
+# Per-endpoint rate limits (requests/second): starting and ceiling budgets for
+# reads and sendTransaction, adapted AIMD-style on throttling
+RPC_READ_RATE = 25
+RPC_READ_MAX_RATE = 100
+RPC_SEND_RATE = 10
+RPC_SEND_MAX_RATE = 50
+RPC_MAX_CONCURRENCY = 50
+# JSON-RPC error codes providers use for rate limiting (HTTP 429 is always treated as one)
+RPC_THROTTLE_CODES = (429, -32429, -32005)
+# JSON-RPC batching: concurrent reads issued within RPC_BATCH_WINDOW seconds go out as one batch
+# array of at most RPC_BATCH_MAX_SIZE requests. RPC_BATCH_LIMITS overrides the cap for endpoints
+# whose URL contains the key (1 disables batching); a rejected batch halves the cap automatically
+RPC_BATCH_WINDOW = 0.005
+RPC_BATCH_MAX_SIZE = 100
+RPC_BATCH_LIMITS = {
+    # "quiknode.pro": 10,
+}
+
+# Max number of in-flight sends for multi-address operations
+SEND_CONCURRENCY = 20
+
+# Blockhash cache: background refresh period, max age served without a round-trip,
+# and how long an unused cache keeps refreshing (seconds)
+BLOCKHASH_REFRESH_INTERVAL = 2
+BLOCKHASH_MAX_AGE = 20
+BLOCKHASH_IDLE_TIMEOUT = 30
+
+# Mint info cache: max entries, TTL (seconds) and on-disk file (None disables persistence)
+MINT_CACHE_SIZE = 1024
+MINT_CACHE_TTL = 7 * 24 * 3600
+MINT_CACHE_PATH = "data/mint_cache.json"
+
+# Confirmation tracking: commitment counted as landed, status poll period and
+# fallback timeout for signatures without a known last_valid_block_height (seconds)
+CONFIRM_COMMITMENT = "confirmed"
+CONFIRM_POLL_INTERVAL = 1.0
+CONFIRM_TIMEOUT = 90
+
+# Sender: how often an unconfirmed transaction is rebroadcast (seconds) and how
+# many times it may be re-signed after its blockhash has provably expired
+REBROADCAST_INTERVAL = 2.0
+MAX_RESIGNS = 2
+
+# Priority fees (micro-lamports per CU): percentile of recent fees paid for the
+# accounts a message writes, cache lifetime (seconds) and clamps
+PRIORITY_FEE_PERCENTILE = 75
+PRIORITY_FEE_CACHE_TTL = 10
+PRIORITY_FEE_MIN = 1_000
+PRIORITY_FEE_MAX = 2_000_000
+# Compute unit limit: headroom over the simulated usage, and the fallback when simulation fails
+COMPUTE_UNIT_MARGIN = 0.1
+DEFAULT_COMPUTE_UNIT_LIMIT = 200_000
+
+# Address Lookup Tables: batched multi-sends and token sweeps compile against tables owned by
+# the main wallet once a transaction set touches at least LOOKUP_TABLE_MIN_ADDRESSES recurring
+# addresses; created tables are remembered in LOOKUP_TABLE_CACHE_PATH and extended on reuse
+USE_LOOKUP_TABLES = True
+LOOKUP_TABLE_MIN_ADDRESSES = 16
+LOOKUP_TABLE_CACHE_PATH = "data/lookup_tables.json"
+
+# Pre-signing: runs with at least PRESIGN_MIN_TRANSACTIONS transactions compile and sign them in
+# a process pool (or threads), PRESIGN_CHUNK_SIZE per task, keeping PRESIGN_LOOKAHEAD chunks
+# ahead of the send stage so signed bytes do not outlive their blockhash
+PRESIGN_MIN_TRANSACTIONS = 64
+PRESIGN_WORKERS = os.cpu_count() or 1
+PRESIGN_USE_PROCESSES = True
+PRESIGN_CHUNK_SIZE = 64
+PRESIGN_LOOKAHEAD = 4
+
+# keys.txt / addresses.txt loading: files of at least LOADER_PARALLEL_MIN_BYTES are decoded
+# in LOADER_WORKERS processes, LOADER_CHUNK_LINES lines per task
+LOADER_WORKERS = os.cpu_count() or 1
+LOADER_CHUNK_LINES = 5_000
+LOADER_PARALLEL_MIN_BYTES = 1_000_000
+
+# Balance snapshot (SQLite): scans refresh entries older than BALANCE_SNAPSHOT_MAX_AGE seconds,
+# and gather/close skip wallets the snapshot saw with no SOL within that window
+BALANCE_SNAPSHOT_PATH = "data/balances.sqlite"
+BALANCE_SNAPSHOT_MAX_AGE = 600
+
+# Metrics: per-RPC-method call counts, latency quantiles (from up to METRICS_MAX_SAMPLES samples),
+# error codes and retries, plus time to confirmation, reported after every menu operation.
+# METRICS_JSON_PATH also writes the report to a file; METRICS_PORT serves it in Prometheus text format
+METRICS_MAX_SAMPLES = 10_000
+METRICS_JSON_PATH = None  # e.g. "logs/metrics.json"
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None  # e.g. 9108
+
+# Run journal (resume interrupted operations)
+# Planned actions, their signatures (written before broadcast) and final statuses.
+# An interrupted run with the same inputs skips what landed and rechecks in-flight signatures
+RUN_JOURNAL_PATH = "data/run_journal.sqlite"
+# "NORMAL" survives a crash of this process; "FULL" also survives power loss at the cost of an fsync per write
+RUN_JOURNAL_SYNCHRONOUS = "NORMAL"
+
+# Sharded execution for very large wallet files: the list is split into SHARD_SIZE-wallet shards, each run
+# in a worker process with its own event loop, RPC connections and a 1/SHARD_WORKERS share of the RPC rate limits.
+# Menu options 1-4 switch to it from SHARD_MIN_WALLETS wallets. Shards are jobs in the SHARD_QUEUE_PATH database;
+# other machines with the same data files can help with `python -m utils.sharding work --queue <path>`
+SHARD_WORKERS = os.cpu_count() or 1
+SHARD_SIZE = 5_000
+SHARD_MIN_WALLETS = 50_000
+SHARD_QUEUE_PATH = "data/shard_jobs.sqlite"
+# A running shard whose worker stops heartbeating for this long is handed to another worker
+SHARD_LEASE_SECONDS = 300
+SHARD_MAX_ATTEMPTS = 3
+
 # Logging configuration
 LOG_CONFIG = {
     "format": "%(asctime)s - %(levelname)s - %(message)s",
     "level": "INFO",
     "filename": "logs/solana_transfer.log"
 }
+# Sinks write from a background thread (LOG_ENQUEUE). LOG_JSON writes the file log as one JSON record
+# per line, including structured fields (wallet, method, signature, latency). LOG_SAMPLE_RATES keeps
+# 1 of every N records of a level, e.g. {"SUCCESS": 100} for runs with thousands of sends per minute
+LOG_ENQUEUE = True
+LOG_JSON = False
+LOG_SAMPLE_RATES = {}
 
 # Token Constants
 GRASS_ADDRESS = "Grass7B4RdKfBCjTKgSqnXkqjwiGvQyFbuSCUJr3XXjs"
@@ -1,27 +1,49 @@
 import time
 import os
-from utils.Close_tokenAccount import close_token_account
+from utils.Close_tokenAccount import close_token_account_async, get_token_accounts_parsed, split_frozen
 from solders.keypair import Keypair
 from spl.token.core import MINT_LAYOUT, ACCOUNT_LAYOUT
 from typing import *
 from solders.pubkey import Pubkey
 from solana.rpc.async_api import AsyncClient
-from solana.rpc.api import Client
 from spl.token.instructions import transfer_checked, get_associated_token_address, TransferCheckedParams
 from spl.token.instructions import (
     create_associated_token_account,
+    create_idempotent_associated_token_account,
+    close_account,
+    CloseAccountParams,
     transfer as token_transfer_instruction,
     TransferParams as token_transferParams,
 )
-from spl.token.constants import TOKEN_PROGRAM_ID
+from spl.token.constants import TOKEN_PROGRAM_ID, WRAPPED_SOL_MINT
 import math
 import asyncio
+import functools
 import random
 import base58
-from data.config import RPC_URLS
+from data.config import RPC_URLS, SEND_CONCURRENCY, USE_LOOKUP_TABLES, LOOKUP_TABLE_MIN_ADDRESSES, PRESIGN_MIN_TRANSACTIONS, SHARD_WORKERS, SHARD_MIN_WALLETS
 from utils import logger
 from solders.system_program import transfer, TransferParams
-from solders.transaction import Transaction
+from solders.transaction import Transaction, VersionedTransaction
+from solders.message import MessageV0
+from solders.hash import Hash
+from solders.instruction import Instruction
+from utils.tx_packing import pack_instructions, pack_instruction_groups
+from utils.blockhash import get_blockhash_cache
+from utils.mint_cache import mint_cache
+from utils.account_loader import load_token_gathering_state, get_multiple_accounts_chunked, MAX_MULTIPLE_ACCOUNTS
+from utils.rpc_pool import RpcPool, open_client
+from utils.confirmation import get_confirmation_tracker, ConfirmationResult
+from utils.sender import get_transaction_sender, TransactionNotLanded
+from utils.fees import get_fee_planner, BUDGET_PLACEHOLDER
+from utils.lookup_table import get_lookup_table_manager
+from utils.presign import Presigner, PresignedTransaction
+from utils.wallet_loader import parse_keypair, load_keys, load_addresses
+from utils.balance_scanner import SOL, get_balance_snapshot, scan_balances, summarize_balances
+from utils.metrics import metrics
+from utils.run_journal import JournalRun, get_run_journal, recover_in_flight, digest, CONFIRMED, FAILED, SENT
+from utils.sharding import ShardedExecutor
+from solders.address_lookup_table_account import AddressLookupTableAccount
 LAMPORTS_PER_SOL=1e9
 # Create logs directory if it doesn't exist
 os.makedirs('logs', exist_ok=True)
@@ -62,171 +84,679 @@ async def create_associated_token_account_if_needed(
             f"msg:关联代币账户不存在，正在创建关联代币账户-pubkey:{pubkey.__str__()}-token_mint_address:{token_mint_address.__str__()}"
         )
         # 创建交易以创建关联代币账户
-        recent_blockhash = await get_recent_blockhash(connection)
-        instructions = create_associated_token_account(
-            keypair.pubkey(), pubkey, token_mint_address
-        )
-        transaction = Transaction.new_signed_with_payer(
-            [instructions], keypair.pubkey(), [keypair], recent_blockhash
+        instructions = await with_compute_budget(
+            connection,
+            keypair.pubkey(),
+            [create_associated_token_account(keypair.pubkey(), pubkey, token_mint_address)],
         )
         # 发送并确认交易
-        signature = await connection.send_transaction(transaction)
+        signature = await send_and_track(
+            connection,
+            lambda recent_blockhash: Transaction.new_signed_with_payer(
+                instructions, keypair.pubkey(), [keypair], recent_blockhash
+            ),
+        )
         # 确认交易
-        await connection.confirm_transaction(signature.value, "confirmed")
+        result = await wait_for_confirmation(connection, signature)
+        if not result.landed:
+            raise RuntimeError(f"create associated token account {signature} {result.status}: {result.err}")
         logger.info(
-            f"msg:关联代币账户已创建-pubkey:{pubkey.__str__()}-token_mint_address:{token_mint_address.__str__()}-{{signature.value}}"
+            f"msg:关联代币账户已创建-pubkey:{pubkey.__str__()}-token_mint_address:{token_mint_address.__str__()}-{signature}"
         )
     else:
         logger.debug(
             f"msg:关联代币账户已存在-pubkey:{pubkey.__str__()}-token_mint_address:{token_mint_address.__str__()}"
         )
     return associated_token_account
-def getKeypair(privateKey:Union[List[int],str]):
-    if isinstance(privateKey,list):
-        return Keypair.from_bytes(privateKey)
-    elif (privateKey.find('[')!=-1 and privateKey.find(']')!=-1):
-        privateKey=eval(privateKey)
-        return Keypair.from_bytes(privateKey)
-    else:
-        return Keypair.from_base58_string(privateKey)
+def getKeypair(privateKey:Union[List[int],str,Keypair]):
+    if isinstance(privateKey,Keypair):
+        return privateKey
+    return parse_keypair(privateKey)
 async def get_recent_blockhash(connection: AsyncClient):
-    response = await connection.get_latest_blockhash()
-    # 检查响应结果
-    if hasattr(response, "value"):
-        blockhash = response.value.blockhash
-        return blockhash
-    else:
-        raise ValueError("get recent blockhash failed")
-async def send_sol(client:AsyncClient, sender:Keypair, receiver:Pubkey, amount):
-    lamports = int(amount * LAMPORTS_PER_SOL)
-    transfer_instruction = transfer(
-        TransferParams(
-            from_pubkey=sender.pubkey(),
-            to_pubkey=receiver,
-            lamports=lamports,
+    """
+    从共享缓存获取 blockhash，缓存由后台任务刷新
+    """
+    return await get_blockhash_cache(connection).get()
+async def with_compute_budget(client:AsyncClient, payer:Pubkey, instructions:List[Instruction]) -> List[Instruction]:
+    """
+    在指令前加上按近期优先费和模拟 CU 消耗计算的 compute budget 指令
+    """
+    return await get_fee_planner(client).budget_instructions(payer, instructions) + list(instructions)
+async def ensure_lookup_tables(client:AsyncClient, authority:Keypair, addresses:List[Pubkey]) -> List[AddressLookupTableAccount]:
+    """
+    为重复使用的地址集合准备查找表；地址太少、关闭或失败时返回空列表（退回不使用查找表）
+    """
+    addresses = list(dict.fromkeys(addresses))
+    if not USE_LOOKUP_TABLES or len(addresses) < LOOKUP_TABLE_MIN_ADDRESSES:
+        return []
+    try:
+        return await get_lookup_table_manager(client).ensure(authority, addresses)
+    except Exception as e:
+        logger.warning(f"Lookup table unavailable, compiling without it: {e}")
+        return []
+async def extend_run_lookup_tables(client:AsyncClient, authority:Keypair, recipient:Pubkey, lookup_tables:List[AddressLookupTableAccount], mints:Dict[Pubkey, None], token_accounts:Iterable[list]):
+    """
+    整个运行共用的查找表：接收方、钱包要转出的 mint 和接收方对应的 ATA。每装载一块钱包调用一次，
+    只有出现新的 mint 时才追加；lookup_tables 原地更新，之后规划的钱包直接使用。
+    程序 ID 是被调用的程序，不能从查找表加载，不放入
+    :param mints: 已放入查找表的 mint（整个运行共享）
+    """
+    new_mints = [
+        mint for mint in dict.fromkeys(
+            token_account["mint"] for accounts in token_accounts for token_account in split_frozen(accounts)[0]
+            if token_account["amount"] > 0
         )
+        if mint not in mints
+    ]
+    if not new_mints:
+        return
+    mints.update(dict.fromkeys(new_mints))
+    tables = await ensure_lookup_tables(
+        client, authority, [recipient] + list(mints) + [get_associated_token_address(recipient, mint) for mint in mints]
     )
-    # 创建交易并添加指令
-    recent_blockhash = await get_recent_blockhash(client)
-    transaction = Transaction.new_signed_with_payer(
-        [transfer_instruction],
+    # 追加失败时保留已有的查找表，已覆盖的 mint 仍可使用
+    if tables:
+        lookup_tables[:] = tables
+async def _prefetch_token_accounts(client:AsyncClient, owners:List[Pubkey]) -> Dict[Pubkey, list]:
+    """
+    预先读取一块钱包的代币账户（并发请求合并成批量）；读取失败的钱包不在结果中，处理时再单独读取
+    """
+    results = await asyncio.gather(*[get_token_accounts_parsed(client, owner) for owner in owners], return_exceptions=True)
+    return {owner: accounts for owner, accounts in zip(owners, results) if not isinstance(accounts, Exception)}
+async def send_and_track(client:AsyncClient, build_transaction:Callable[[Hash], Transaction], presigned:Optional[PresignedTransaction]=None, on_signed=None):
+    """
+    用共享发送器发送交易：签名一次后持续重播直到确认或过期，返回首次签名
+    :param build_transaction: 接收 blockhash 返回已签名交易的函数（仅在 blockhash 确认过期后才会再次调用）
+    :param presigned: 预签名阶段产出的交易字节，有则首次发送直接使用
+    :param on_signed: 每个签名广播前的回调（运行日志记录签名）
+    """
+    return await get_transaction_sender(client).submit(build_transaction, presigned, on_signed)
+async def wait_for_confirmation(client:AsyncClient, signature) -> ConfirmationResult:
+    """
+    等待签名被确认、失败或过期（由后台跟踪器批量轮询）
+    """
+    sender = get_transaction_sender(client)
+    if sender.is_tracking(signature):
+        return await sender.wait(signature)
+    return await get_confirmation_tracker(client).wait(signature)
+async def send_sol(client:AsyncClient, sender:Keypair, receiver:Pubkey, amount, on_signed=None):
+    lamports = int(amount * LAMPORTS_PER_SOL)
+    instructions = await with_compute_budget(
+        client,
         sender.pubkey(),
-        [sender],
-        recent_blockhash,
+        [transfer(TransferParams(from_pubkey=sender.pubkey(), to_pubkey=receiver, lamports=lamports))],
+    )
+    # 创建交易并添加指令，发送至网络
+    return await send_and_track(
+        client,
+        lambda recent_blockhash: Transaction.new_signed_with_payer(
+            instructions,
+            sender.pubkey(),
+            [sender],
+            recent_blockhash,
+        ),
+        on_signed=on_signed,
+    )
+def build_sol_transfers(sender_pubkey: Pubkey, transfers: List[Tuple[Pubkey, int]]) -> List[Instruction]:
+    return [
+        transfer(TransferParams(from_pubkey=sender_pubkey, to_pubkey=receiver, lamports=lamports))
+        for receiver, lamports in transfers
+    ]
+def plan_sol_batches(sender_pubkey: Pubkey, transfers: List[Tuple[str, Pubkey, int]], lookup_tables: Sequence[AddressLookupTableAccount] = ()) -> List[List[Tuple[str, Pubkey, int]]]:
+    """
+    按 1232 字节交易大小上限贪心地把转账分组
+    :param transfers: (address, receiver, lamports) 列表
+    :param lookup_tables: 编译时使用的查找表，表中的地址只占 1 字节索引
+    """
+    instructions = build_sol_transfers(sender_pubkey, [(receiver, lamports) for _, receiver, lamports in transfers])
+    groups = pack_instructions(
+        instructions,
+        lambda ixs: MessageV0.try_compile(sender_pubkey, BUDGET_PLACEHOLDER + ixs, list(lookup_tables), Hash.default()),
+    )
+    batches = []
+    offset = 0
+    for group in groups:
+        batches.append(transfers[offset:offset + len(group)])
+        offset += len(group)
+    return batches
+async def send_sol_batch(client:AsyncClient, sender:Keypair, transfers:List[Tuple[Pubkey, int]], lookup_tables: Sequence[AddressLookupTableAccount] = (), on_signed=None):
+    """
+    在一笔交易中发送多个 SOL 转账（lamports）
+    """
+    instructions = await with_compute_budget(client, sender.pubkey(), build_sol_transfers(sender.pubkey(), transfers))
+    return await send_presigned(client, sender, instructions, lookup_tables, on_signed=on_signed)
+async def send_presigned(client:AsyncClient, sender:Keypair, instructions:List[Instruction], lookup_tables: Sequence[AddressLookupTableAccount] = (), presigned:Optional[PresignedTransaction]=None, on_signed=None):
+    """
+    发送一笔由 instructions 编译的版本化交易；presigned 为空时现场签名
+    """
+    return await send_and_track(
+        client,
+        lambda recent_blockhash: VersionedTransaction(
+            MessageV0.try_compile(sender.pubkey(), instructions, list(lookup_tables), recent_blockhash),
+            [sender],
+        ),
+        presigned,
+        on_signed,
     )
-    # 将交易发送至网络
-    signature = await client.send_transaction(transaction)
-    return signature.value
-async def close_all_token_account_from_addresses(network_url, keys):
-    client=Client(network_url)
-    for private_key in keys:
+async def _send_sol_batch_with_split(client:AsyncClient, sender:Keypair, batch, semaphore:asyncio.Semaphore, stats:dict, results:list, attempts=0, lookup_tables=(), presigned=None, journal_run:Optional[JournalRun]=None):
+    """
+    发送一个批次并等待确认；交易失败时对半拆分重试，单个地址最多重试 3 次；结果未知（超时）时不重试
+    :param presigned: (预签名交易, 指令)，调用方已为其占用一个 semaphore 名额
+    :param journal_run: 运行日志，按收款地址记录签名和结果
+    """
+    attempts += 1
+    stats['total_attempts'] += len(batch)
+    started_at = time.monotonic()
+    keys = [address for address, _, _ in batch]
+    on_signed = journal_run.on_signed(keys) if journal_run is not None else None
+    try:
+        if presigned is not None:
+            try:
+                transaction, instructions = presigned
+                signature = await send_presigned(client, sender, instructions, lookup_tables, transaction, on_signed)
+            finally:
+                semaphore.release()
+        else:
+            async with semaphore:
+                signature = await send_sol_batch(client, sender, [(receiver, lamports) for _, receiver, lamports in batch], lookup_tables, on_signed)
+        # 确认在 semaphore 之外等待，不占用发送并发
+        result = await wait_for_confirmation(client, signature)
+        signature = result.signature
+        if journal_run is not None:
+            journal_run.record(keys, result)
+        if not result.landed:
+            raise TransactionNotLanded(result)
+    except Exception as e:
+        error = e
+        if journal_run is not None and not isinstance(e, TransactionNotLanded) and not journal_run.fail(keys, e):
+            # 签名已记录，交易可能已经落地：保持 sent，由续跑时的 recover_in_flight 确定结果
+            logger.error("Batch of {transfers} transfers has unknown status: {error}", method="send_sol_batch", wallet=str(sender.pubkey()), transfers=len(batch), error=str(e))
+            for address, _, lamports in batch:
+                results.append({'address': address, 'amount': lamports / LAMPORTS_PER_SOL, 'signature': None, 'success': False, 'error': f"status unknown: {e}"})
+            return
+    else:
+        logger.success(
+            "Sent batch of {transfers} transfers. https://solscan.io/tx/{signature}",
+            method="send_sol_batch", wallet=str(sender.pubkey()), signature=str(signature),
+            transfers=len(batch), latency=round(time.monotonic() - started_at, 3),
+        )
+        for address, _, lamports in batch:
+            stats['successful_sends'] += 1
+            stats['total_sol_sent'] += lamports / LAMPORTS_PER_SOL
+            results.append({'address': address, 'amount': lamports / LAMPORTS_PER_SOL, 'signature': str(signature), 'success': True, 'error': None})
+        return
+    if isinstance(error, TransactionNotLanded) and not error.retryable:
+        # 结果未知，重发可能重复打款
+        logger.error("Batch of {transfers} transfers has unknown status: {error}", method="send_sol_batch", wallet=str(sender.pubkey()), transfers=len(batch), error=str(error))
+        for address, _, lamports in batch:
+            results.append({'address': address, 'amount': lamports / LAMPORTS_PER_SOL, 'signature': str(error.result.signature), 'success': False, 'error': str(error)})
+        return
+    if len(batch) > 1:
+        logger.warning("Batch of {transfers} transfers failed, splitting: {error}", method="send_sol_batch", wallet=str(sender.pubkey()), transfers=len(batch), error=str(error))
+        mid = len(batch) // 2
+        await asyncio.gather(
+            _send_sol_batch_with_split(client, sender, batch[:mid], semaphore, stats, results, lookup_tables=lookup_tables, journal_run=journal_run),
+            _send_sol_batch_with_split(client, sender, batch[mid:], semaphore, stats, results, lookup_tables=lookup_tables, journal_run=journal_run),
+        )
+    elif attempts < 3:
+        logger.warning("Error sending SOL to {recipient}, retrying: {error}", method="send_sol", wallet=str(sender.pubkey()), recipient=batch[0][0], error=str(error))
+        await asyncio.sleep(1)
+        await _send_sol_batch_with_split(client, sender, batch, semaphore, stats, results, attempts, lookup_tables, journal_run=journal_run)
+    else:
+        address, _, lamports = batch[0]
+        logger.error("Error sending SOL to {recipient}: {error}", method="send_sol", wallet=str(sender.pubkey()), recipient=address, error=str(error))
+        results.append({'address': address, 'amount': lamports / LAMPORTS_PER_SOL, 'signature': None, 'success': False, 'error': str(error)})
+async def _record_wallet(journal_run:JournalRun, task):
+    """
+    等待单个钱包的任务，完成后立即把汇总记入运行日志：没有失败的钱包续跑时跳过
+    """
+    wallet = await task
+    if wallet['wallet'] is not None:
+        journal_run.finish([wallet['wallet']], FAILED if wallet['failed'] or wallet['error'] else CONFIRMED, detail=wallet)
+    return wallet
+async def _close_wallet_token_accounts(client:AsyncClient, private_key, semaphore:asyncio.Semaphore):
+    """
+    关闭单个钱包的空代币账户，返回该钱包的汇总
+    """
+    async with semaphore:
+        wallet = {'wallet': None, 'closed': 0, 'rent_reclaimed': 0, 'failed': 0, 'frozen': 0, 'error': None}
         try:
             sender = getKeypair(private_key)
-            close_token_account(client,sender)
-            logger.success(f"Sender {sender.pubkey()} close token accounts success")
-            return True
-            
+            wallet['wallet'] = str(sender.pubkey())
+            result = await close_token_account_async(client,sender)
+            wallet.update(closed=result['closed'], rent_reclaimed=result['rent_reclaimed'], failed=result['failed'], frozen=result['frozen'])
+            logger.success(
+                "Sender {wallet} close token accounts success - closed {closed} - rent {rent} SOL - failed {failed} - frozen {frozen}",
+                method="close_accounts", wallet=wallet['wallet'], closed=result['closed'],
+                rent=result['rent_reclaimed'] / LAMPORTS_PER_SOL, failed=result['failed'], frozen=result['frozen'],
+            )
         except Exception as e:
-            logger.exception(e)
+            logger.error("Sender {wallet} close token accounts failed: {error}", method="close_accounts", wallet=wallet['wallet'], error=str(e))
+            wallet['error'] = str(e)
+        return wallet
+async def open_journal_run(client:AsyncClient, operation:str, params:dict) -> JournalRun:
+    """
+    打开运行日志；继续中断的运行时先重新检查上次结果未知的签名
+    """
+    journal_run = get_run_journal().open_run(operation, params)
+    if journal_run.resumed:
+        await recover_in_flight(client, journal_run)
+    return journal_run
+def split_resumed(journal_run:JournalRun, senders:List[Keypair]) -> Tuple[List[Keypair], List[dict]]:
+    """
+    按钱包记录的运行：跳过已完成的钱包，以及仍有结果未知交易的钱包（重发可能重复转账）
+    :return: (需要处理的钱包, 已完成钱包上次记录的汇总)
+    """
+    confirmed = journal_run.with_status(CONFIRMED)
+    unknown = {key.split('/')[0] for key in journal_run.with_status(SENT)}
+    if unknown:
+        logger.warning(f"Skipping {len(unknown)} wallets with transactions of unknown status from the interrupted run")
+    resumed = [detail for key, (_, detail) in confirmed.items() if '/' not in key]
+    return [sender for sender in senders if str(sender.pubkey()) not in confirmed and str(sender.pubkey()) not in unknown], resumed
+def skip_known_empty(keys) -> Tuple[List[Keypair], int]:
+    """
+    跳过余额快照中近期确认 SOL 为 0 的钱包（付不起手续费）
+    :return: (需要处理的 Keypair 列表, 跳过的数量)
+    """
+    senders = [getKeypair(private_key) for private_key in keys]
+    owners = [str(sender.pubkey()) for sender in senders]
+    empty = set(get_balance_snapshot().known_empty(owners))
+    if empty:
+        logger.info(f"Skipping {len(empty)} wallets with no SOL in the balance snapshot")
+    return [sender for sender, owner in zip(senders, owners) if owner not in empty], len(empty)
+async def close_all_token_account_from_addresses(network_url, keys, concurrency=SEND_CONCURRENCY):
+    """
+    并发关闭 keys 中所有钱包的空代币账户
+    :return: 汇总 {'wallets', 'skipped', 'closed', 'rent_reclaimed'(SOL), 'failed', 'frozen'(跳过的冻结账户), 'results'(每个钱包)}
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    senders = [getKeypair(private_key) for private_key in keys]
+    keys, skipped = skip_known_empty(senders)
+    async with open_client(network_url) as client:
+        # 关闭账户可以安全重做，续跑时只跳过已全部关闭的钱包
+        journal_run = await open_journal_run(client, "close_accounts", {'wallets': digest(str(sender.pubkey()) for sender in senders)})
+        keys, resumed = split_resumed(journal_run, keys)
+        results = await asyncio.gather(
+            *[_record_wallet(journal_run, _close_wallet_token_accounts(client, private_key, semaphore)) for private_key in keys]
+        )
+    get_balance_snapshot().invalidate([r['wallet'] for r in results if r['closed']])
+    journal_run.complete()
+    results = resumed + list(results)
+    return {
+        'wallets': len(results),
+        'skipped': skipped,
+        'closed': sum(r['closed'] for r in results),
+        'rent_reclaimed': sum(r['rent_reclaimed'] for r in results) / LAMPORTS_PER_SOL,
+        'failed': sum(r['failed'] for r in results) + sum(1 for r in results if r['error']),
+        'frozen': sum(r.get('frozen', 0) for r in results),
+        'results': results,
+    }
+def plan_sol_sweep(owner: Pubkey, recipient: Pubkey, empty_accounts: list):
+    """
+    为 SOL 归集打包交易：先关闭空代币账户，最后一笔交易末尾是转给 recipient 的 SOL 转账（金额稍后填入）
+    :return: [(close 指令列表, 该交易关闭的代币账户列表)]，转账追加在最后一项之后
+    """
+    groups = [
+        [close_account(CloseAccountParams(account=token_account["pubkey"], dest=owner, owner=owner, program_id=TOKEN_PROGRAM_ID))]
+        for token_account in empty_accounts
+    ]
+    groups.append(build_sol_transfers(owner, [(recipient, 0)]))
+    batches = pack_instruction_groups(
+        groups,
+        lambda ixs: MessageV0.try_compile(owner, BUDGET_PLACEHOLDER + ixs, [], Hash.default()),
+    )
+    closes = len(empty_accounts)
+    return [
+        ([groups[index][0] for index in batch if index < closes], [empty_accounts[index] for index in batch if index < closes])
+        for batch in batches
+    ]
+async def _sweep_wallet_sol(client:AsyncClient, sender:Keypair, recipient:Pubkey, balance:int, close_accounts:bool, semaphore:asyncio.Semaphore, journal_run:Optional[JournalRun]=None):
+    """
+    把单个钱包的 SOL 全部转给 recipient：金额 = 余额 - getFeeForMessage 给出的精确手续费（整数 lamports）；
+    close_accounts 时在同一笔交易里先关闭空代币账户，回收的租金一并转走
+    :param journal_run: 运行日志，每笔交易以 "钱包/序号" 记录签名和结果
+    :return: 该钱包的汇总（lamports/fees/rent_reclaimed 单位为 lamports）
+    """
+    async with semaphore:
+        owner = sender.pubkey()
+        wallet = {'wallet': str(owner), 'lamports': 0, 'fees': 0, 'closed': 0, 'rent_reclaimed': 0, 'failed': 0, 'signature': None, 'error': None}
 
+        def on_signed(name):
+            return journal_run.on_signed([f"{owner}/{name}"]) if journal_run is not None else None
 
-            return False
-async def collect_sol_from_addresses(network_url, recipient, keys):
-    async with AsyncClient(network_url) as client:
-        total_amount=0
-        for private_key in keys:
-            try:
-                sender = getKeypair(private_key)
-                recipient = Pubkey.from_string(recipient)
-                balance = await client.get_balance(sender.pubkey())
-                amount = int(balance.value)/LAMPORTS_PER_SOL
-                rent=0.001
-                if amount-rent > 0:
-                    
-                    signature=await send_sol(client,sender,recipient,amount-rent)
-                    total_amount+=amount
-                    logger.success(f"Sender {sender.pubkey()} - recipient {recipient} - amount {amount} - signature {signature} is success")
-                else:
-                    logger.info(f"Sender {sender.pubkey()} has no sol")
-            except Exception as e:
-                logger.exception(e)
+        def record(name, result):
+            if journal_run is not None:
+                journal_run.record([f"{owner}/{name}"], result)
 
-        return total_amount
+        try:
+            if journal_run is not None:
+                journal_run.reset_prefix(f"{owner}/")
+            if balance <= 0:
+                logger.info("Sender {wallet} has no sol", method="sweep_sol", wallet=str(owner))
+                return wallet
+            empty_accounts = []
+            if close_accounts:
+                empty_accounts, _ = split_frozen([t for t in await get_token_accounts_parsed(client, owner) if t["amount"] == 0])
+            fee_planner = get_fee_planner(client)
+            sender_service = get_transaction_sender(client)
+            available = balance
+            *prefix, (final_closes, final_accounts) = plan_sol_sweep(owner, recipient, empty_accounts)
+            # 一笔交易放不下的空账户先单独关闭，只有落地的租金和手续费计入最终转账金额
+            for index, (closes, accounts) in enumerate(prefix):
+                instructions = await with_compute_budget(client, owner, closes)
+                fee = await fee_planner.message_fee(owner, instructions)
+                if available < fee:
+                    wallet['failed'] += len(accounts)
+                    continue
+                result = await sender_service.send(
+                    lambda recent_blockhash, instructions=instructions: VersionedTransaction(
+                        MessageV0.try_compile(owner, instructions, [], recent_blockhash), [sender]
+                    ),
+                    on_signed=on_signed(f"close{index}"),
+                )
+                record(f"close{index}", result)
+                if not result.landed:
+                    logger.error(
+                        "Sender {wallet} - close tx {signature} {status}: {error}",
+                        method="sweep_sol", wallet=str(owner), signature=str(result.signature), status=result.status, error=str(result.err),
+                    )
+                    wallet['failed'] += len(accounts)
+                    continue
+                rent = sum(token_account["lamports"] for token_account in accounts)
+                available += rent - fee
+                wallet['closed'] += len(accounts)
+                wallet['rent_reclaimed'] += rent
+                wallet['fees'] += fee
+            instructions = await with_compute_budget(client, owner, final_closes + build_sol_transfers(owner, [(recipient, 0)]))
+            fee = await fee_planner.message_fee(owner, instructions)
+            rent = sum(token_account["lamports"] for token_account in final_accounts)
+            # 手续费在执行前从余额扣除，关闭账户回收的租金不能用来付本笔手续费
+            lamports = available + rent - fee
+            if available < fee or lamports <= 0:
+                logger.info("Sender {wallet} has no sol above the {fee} lamports fee", method="sweep_sol", wallet=str(owner), fee=fee)
+                wallet['failed'] += len(final_accounts)
+                return wallet
+            instructions[-1] = build_sol_transfers(owner, [(recipient, lamports)])[0]
+            started_at = time.monotonic()
+            result = await sender_service.send(
+                lambda recent_blockhash: VersionedTransaction(
+                    MessageV0.try_compile(owner, instructions, [], recent_blockhash), [sender]
+                ),
+                on_signed=on_signed("sweep"),
+            )
+            record("sweep", result)
+            wallet['signature'] = str(result.signature)
+            if not result.landed:
+                logger.error(
+                    "Sender {wallet} - signature {signature} {status}: {error}",
+                    method="sweep_sol", wallet=str(owner), signature=str(result.signature), status=result.status, error=str(result.err),
+                )
+                wallet['failed'] += len(final_accounts)
+                wallet['error'] = f"{result.status}: {result.err}"
+                return wallet
+            wallet['lamports'] = lamports
+            wallet['fees'] += fee
+            wallet['closed'] += len(final_accounts)
+            wallet['rent_reclaimed'] += rent
+            logger.success(
+                "Sender {wallet} - recipient {recipient} - amount {amount} - closed {closed} - signature {signature} is success",
+                method="sweep_sol", wallet=str(owner), recipient=str(recipient), amount=lamports / LAMPORTS_PER_SOL,
+                closed=len(final_accounts), signature=str(result.signature), latency=round(time.monotonic() - started_at, 3),
+            )
+        except Exception as e:
+            logger.error("Sender {wallet} SOL sweep failed: {error}", method="sweep_sol", wallet=str(owner), error=str(e))
+            wallet['error'] = str(e)
+        return wallet
+async def collect_sol_from_addresses(network_url, recipient, keys, close_accounts=False, concurrency=SEND_CONCURRENCY):
+    """
+    并发把 keys 中所有钱包的 SOL 清空到 recipient（按精确手续费计算，不留余额）
+    :param close_accounts: 同时关闭空代币账户，把租金一起归集
+    :return: 汇总 {'wallets', 'skipped', 'swept', 'sol'(SOL), 'fees'(SOL), 'closed', 'failed', 'results'(每个钱包)}
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    recipient = Pubkey.from_string(recipient)
+    wallets = [getKeypair(private_key) for private_key in keys]
+    senders, skipped = skip_known_empty(wallets)
+    async with open_client(network_url) as client:
+        journal_run = await open_journal_run(client, "collect_sol", {
+            'recipient': str(recipient),
+            'wallets': digest(str(sender.pubkey()) for sender in wallets),
+            'close_accounts': close_accounts,
+        })
+        # 续跑时只扫描未完成钱包的余额
+        senders, resumed = split_resumed(journal_run, senders)
+        # 分块 getMultipleAccounts 一次取回全部余额（转账金额依赖余额，强制刷新）
+        balances = (await scan_balances(client, [sender.pubkey() for sender in senders], max_age=0))[SOL]
+        results = await asyncio.gather(
+            *[
+                _record_wallet(
+                    journal_run,
+                    _sweep_wallet_sol(client, sender, recipient, balances.get(str(sender.pubkey()), 0), close_accounts, semaphore, journal_run),
+                )
+                for sender in senders
+            ]
+        )
+    get_balance_snapshot().invalidate([r['wallet'] for r in results if r['lamports'] or r['closed']])
+    journal_run.complete()
+    results = resumed + list(results)
+    return {
+        'wallets': len(results),
+        'skipped': skipped,
+        'swept': sum(1 for r in results if r['lamports']),
+        'sol': sum(r['lamports'] for r in results) / LAMPORTS_PER_SOL,
+        'fees': sum(r['fees'] for r in results) / LAMPORTS_PER_SOL,
+        'closed': sum(r['closed'] for r in results),
+        'failed': sum(r['failed'] for r in results) + sum(1 for r in results if r['error']),
+        'results': results,
+    }
+async def _send_sol_with_retry(client:AsyncClient, sender:Keypair, address:str, amount, semaphore:asyncio.Semaphore, stats:dict, results:list, journal_run:Optional[JournalRun]=None):
+    """
+    单个地址的发送任务，确认落地才算成功；过期由发送器重签，交易失败才重试（最多 3 次），发送受 semaphore 限制并发
+    :param amount: 调用方随机一次的金额（SOL）：重试只发生在交易确认失败之后，不会重复打款
+    """
+    success = False
+    attempts = 0
+    on_signed = journal_run.on_signed([address]) if journal_run is not None else None
+    while not success and attempts < 3:
+        attempts += 1
+        stats['total_attempts'] += 1
+        started_at = time.monotonic()
+        try:
+            async with semaphore:
+                logger.debug("Attempting to send {amount} SOL to {recipient}", method="send_sol", wallet=str(sender.pubkey()), recipient=address, amount=amount)
+                recipient = Pubkey.from_string(address)
+                signature = await send_sol(client, sender, recipient, amount, on_signed)
+            # 确认在 semaphore 之外等待
+            result = await wait_for_confirmation(client, signature)
+            signature = result.signature
+            if journal_run is not None:
+                journal_run.record([address], result)
+            if not result.landed:
+                raise TransactionNotLanded(result)
+            success = True
+            stats['successful_sends'] += 1
+            stats['total_sol_sent'] += amount
+
+            logger.success(
+                "Sent {amount} SOL to {recipient}. https://solscan.io/tx/{signature}",
+                method="send_sol", wallet=str(sender.pubkey()), recipient=address, amount=amount,
+                signature=str(signature), latency=round(time.monotonic() - started_at, 3),
+            )
+            results.append({'address': address, 'amount': amount, 'signature': str(signature), 'success': True, 'error': None})
+        except TransactionNotLanded as e:
+            logger.error("Error sending SOL to {recipient}: {error}", method="send_sol", wallet=str(sender.pubkey()), recipient=address, error=str(e))
+            error = e
+            if not e.retryable:
+                # 结果未知，重发可能重复打款
+                break
+        except Exception as e:
+            logger.error("Error sending SOL to {recipient}: {error}", method="send_sol", wallet=str(sender.pubkey()), recipient=address, error=str(e))
+            error = e
+            if journal_run is not None and not journal_run.fail([address], e):
+                # 签名已记录，交易可能已经落地，重发可能重复打款
+                error = f"status unknown: {e}"
+                break
+            await asyncio.sleep(1)
+    if not success:
+        results.append({'address': address, 'amount': 0, 'signature': None, 'success': False, 'error': str(error)})
+    return success
+async def _dispatch_presigned_batches(client:AsyncClient, sender:Keypair, batches, lookup_tables, semaphore:asyncio.Semaphore, stats:dict, results:list, journal_run:Optional[JournalRun]=None):
+    """
+    在进程池中预签名所有批次，按签好的顺序交给发送阶段；发送名额用尽时预签名随之暂停
+    """
+    messages = [
+        build_sol_transfers(sender.pubkey(), [(receiver, lamports) for _, receiver, lamports in batch])
+        for batch in batches
+    ]
+    # 同一计划的交易形状相近，compute budget 按最大的一笔规划一次
+    budget = await get_fee_planner(client).budget_instructions(sender.pubkey(), max(messages, key=len))
+    messages = [budget + instructions for instructions in messages]
+    tasks = []
+    dispatched = 0
+    try:
+        async for index, transaction in Presigner().stream(client, sender, messages, lookup_tables):
+            await semaphore.acquire()
+            tasks.append(
+                asyncio.create_task(
+                    _send_sol_batch_with_split(
+                        client, sender, batches[index], semaphore, stats, results,
+                        lookup_tables=lookup_tables, presigned=(transaction, messages[index]), journal_run=journal_run,
+                    )
+                )
+            )
+            dispatched = index + 1
+    except Exception as e:
+        # 预签名中途出错（取 blockhash 失败、进程池崩溃等）：已发出的批次照常等待结果，其余批次没有签名，记为失败
+        logger.error(
+            "Presigning failed after {dispatched} of {transactions} transactions: {error}",
+            method="send_sol_batch", wallet=str(sender.pubkey()), dispatched=dispatched, transactions=len(batches), error=str(e),
+        )
+        await asyncio.gather(*tasks)
+        for batch in batches[dispatched:]:
+            stats['total_attempts'] += len(batch)
+            for address, _, lamports in batch:
+                results.append({'address': address, 'amount': lamports / LAMPORTS_PER_SOL, 'signature': None, 'success': False, 'error': f"not sent: presigning failed: {e}"})
+    return tasks
 async def send_sol_to_addresses(params):
     network_url = params['network_url']
     addresses = params['addresses']
     min_amount = params['min_amount']
     max_amount = params['max_amount']
     private_key = params['private_key']
+    concurrency = max(1, int(params.get('concurrency', SEND_CONCURRENCY)))
 
-    logger.info(f"Starting SOL transfer. Network URL: {network_url}")
+    logger.info(f"Starting SOL transfer. Network URL: {network_url}, concurrency: {concurrency}")
 
     start_time = time.time()
-    total_sol_sent = 0
 
-    async with AsyncClient(network_url) as client:
+    async with open_client(network_url) as client:
         try:
             sender = getKeypair(private_key)
             logger.info(f"Sender public key: {sender.pubkey()}")
         except Exception as e:
             logger.exception(f"Error decoding private key: {e}")
-            return {'total_attempts': 0, 'successful_sends': 0, 'total_sol_sent': 0, 'duration': 0}
+            return {'total_attempts': 0, 'successful_sends': 0, 'total_sol_sent': 0, 'duration': 0, 'results': []}
 
-        total_attempts = 0
-        successful_sends = 0
-        
-        for address in addresses:
-            success = False
-            attempts = 0
-            while not success and attempts < 3:
-                attempts += 1
-                total_attempts += 1
-                amount = random.uniform(min_amount, max_amount)
+        stats = {'total_attempts': 0, 'successful_sends': 0, 'total_sol_sent': 0}
+        results = []
+        semaphore = asyncio.Semaphore(concurrency)
+        # 同一发送方、地址列表和金额范围的中断运行会被继续：已落地的地址不再发送，金额沿用上次随机的结果
+        journal_run = await open_journal_run(client, "send_sol", {
+            'sender': str(sender.pubkey()),
+            'addresses': digest(addresses),
+            'min_amount': min_amount,
+            'max_amount': max_amount,
+            'batch': bool(params.get('batch')),
+        })
+        amounts = {
+            address: detail['lamports']
+            for address, detail in journal_run.plan({
+                address: {'lamports': int(random.uniform(min_amount, max_amount) * LAMPORTS_PER_SOL)} for address in addresses
+            }).items()
+        }
+        # 续跑时已有结果的地址也计入尝试次数，成功数不会超过总数
+        for address, (signature, _) in journal_run.with_status(CONFIRMED).items():
+            stats['total_attempts'] += 1
+            stats['successful_sends'] += 1
+            stats['total_sol_sent'] += amounts[address] / LAMPORTS_PER_SOL
+            results.append({'address': address, 'amount': amounts[address] / LAMPORTS_PER_SOL, 'signature': signature, 'success': True, 'error': None})
+        # 上次发出、重新检查后仍无法确定是否落地的地址不再发送
+        for address, (signature, _) in journal_run.with_status(SENT).items():
+            stats['total_attempts'] += 1
+            results.append({'address': address, 'amount': 0, 'signature': signature, 'success': False, 'error': 'status unknown'})
+        done = journal_run.done()
+        addresses = [address for address in addresses if address not in done]
+        presign = params.get('presign', True) and len(addresses) >= PRESIGN_MIN_TRANSACTIONS
+        if params.get('batch') or presign:
+            transfers = []
+            for address in addresses:
                 try:
-                    logger.info(f"Attempting to send {amount} SOL to {address}")
                     recipient = Pubkey.from_string(address)
-                    signature = await send_sol(client, sender, recipient, amount)
-                    success = True
-                    successful_sends += 1
-                    total_sol_sent += amount
-
-                    solscan_url = f"https://solscan.io/tx/{signature.value}"
-
-                    logger.info(f"Successfully sent {amount} SOL to {address}. {solscan_url} Signature: {signature.value}")
                 except Exception as e:
-                    logger.exception(f"Error sending SOL to {address}: {e}")
-                    await asyncio.sleep(1)
+                    logger.error(f"Invalid address {address}: {e}")
+                    results.append({'address': address, 'amount': 0, 'signature': None, 'success': False, 'error': str(e)})
+                    continue
+                transfers.append((address, recipient, amounts[address]))
+            if params.get('batch'):
+                # 收款地址集合通常固定（addresses.txt），放进查找表后每个地址只占 1 字节
+                lookup_tables = []
+                if params.get('lookup_tables', True):
+                    lookup_tables = await ensure_lookup_tables(client, sender, [receiver for _, receiver, _ in transfers])
+                batches = plan_sol_batches(sender.pubkey(), transfers, lookup_tables)
+                logger.info(f"Packed {len(transfers)} transfers into {len(batches)} transactions")
+            else:
+                lookup_tables = []
+                batches = [[entry] for entry in transfers]
+            if presign:
+                tasks = await _dispatch_presigned_batches(client, sender, batches, lookup_tables, semaphore, stats, results, journal_run)
+            else:
+                tasks = [
+                    asyncio.create_task(
+                        _send_sol_batch_with_split(client, sender, batch, semaphore, stats, results, lookup_tables=lookup_tables, journal_run=journal_run)
+                    )
+                    for batch in batches
+                ]
+        else:
+            tasks = [
+                asyncio.create_task(
+                    _send_sol_with_retry(client, sender, address, amounts[address] / LAMPORTS_PER_SOL, semaphore, stats, results, journal_run)
+                )
+                for address in addresses
+            ]
+        await asyncio.gather(*tasks)
+        journal_run.complete()
 
     end_time = time.time()
     duration = end_time - start_time
 
-    logger.info(f"SOL transfer completed. Total attempts: {total_attempts}, Successful sends: {successful_sends}")
+    logger.info(f"SOL transfer completed. Total attempts: {stats['total_attempts']}, Successful sends: {stats['successful_sends']}")
     return {
-        'total_attempts': total_attempts,
-        'successful_sends': successful_sends,
-        'total_sol_sent': total_sol_sent,
-        'duration': duration
+        'total_attempts': stats['total_attempts'],
+        'successful_sends': stats['successful_sends'],
+        'total_sol_sent': stats['total_sol_sent'],
+        'duration': duration,
+        'results': results,
     }
     
 
-async def get_token_info(connection: AsyncClient, mint_pubkey: Pubkey):
-    """
-    获取 Solana Token 的 Mint 信息，例如 decimals
-    :param connection: AsyncClient 实例
-    :param mint_pubkey: 代币的 Mint Pubkey
-    :return: 解码后的 Mint 信息字典
-    """
+async def _fetch_mint_account(connection: AsyncClient, mint_pubkey: Pubkey) -> bytes:
     # 获取 Mint Account 的信息
     mint_info_resp = await connection.get_account_info(mint_pubkey)
     if not hasattr(mint_info_resp, "value"):
         raise ValueError("Token mint account not found")
     if not hasattr(mint_info_resp.value, "data"):
         raise ValueError("Token mint account not found")
-    # 解析账户数据
-    mint_data = mint_info_resp.value.data
-    decoded_mint = MINT_LAYOUT.parse(mint_data)
-    # 返回代币的 decimals 信息及其他信息
-    return decoded_mint
+    return mint_info_resp.value.data
+async def get_token_info(connection: AsyncClient, mint_pubkey: Pubkey):
+    """
+    获取 Solana Token 的 Mint 信息，例如 decimals（优先读取 mint_cache）
+    :param connection: AsyncClient 实例
+    :param mint_pubkey: 代币的 Mint Pubkey
+    :return: 解码后的 Mint 信息字典
+    """
+    return await mint_cache.get_or_fetch(
+        mint_pubkey, lambda mint: _fetch_mint_account(connection, mint)
+    )
 
 async def transfer_tokens(
     connection: AsyncClient,
@@ -268,6 +798,20 @@ async def transfer_tokens(
         connection, sender_keypair, receiver_pubkey, token_mint_address
     )
 
+    return await send_token_transfer(
+        connection, sender_keypair, sender_token_account, receiver_token_account, amount
+    )
+async def send_token_transfer(
+    connection: AsyncClient,
+    sender_keypair: Keypair,
+    sender_token_account: Pubkey,
+    receiver_token_account: Pubkey,
+    amount: int,
+    on_signed=None,
+):
+    """
+    发送代币转账交易（不做余额和账户检查）
+    """
     # 创建转账指令
     transfer_instruction = token_transfer_instruction(
         token_transferParams(
@@ -278,50 +822,623 @@ async def transfer_tokens(
             amount,
         )
     )
-    recent_blockhash = await get_recent_blockhash(connection)
-    # 创建交易
-    transaction = Transaction.new_signed_with_payer(
-        [transfer_instruction],
-        sender_keypair.pubkey(),
-        [sender_keypair],
-        recent_blockhash,
+    instructions = await with_compute_budget(connection, sender_keypair.pubkey(), [transfer_instruction])
+    # 创建并发送交易
+    return await send_and_track(
+        connection,
+        lambda recent_blockhash: Transaction.new_signed_with_payer(
+            instructions,
+            sender_keypair.pubkey(),
+            [sender_keypair],
+            recent_blockhash,
+        ),
+        on_signed=on_signed,
     )
-    # 发送交易
-    signature = await connection.send_transaction(transaction)
-    # # 确认交易
-    # await connection.confirm_transaction(signature.value, "confirmed")
-    # # 获取更新后的余额
-    # sender_balance = await get_token_balance(
-    #     connection, sender_keypair.pubkey(), token_mint_address
-    # )
-    # receiver_balance = await get_token_balance(
-    #     connection, receiver_pubkey, token_mint_address
-    # )
-    return signature.value
 async def collect_tokens_from_addresses(network_url, token_contract, recipient, keys):
-    async with AsyncClient(network_url) as client:
+    async with open_client(network_url) as client:
         total_tokens = 0
+        token_pubkey = Pubkey.from_string(token_contract)
+        recipient_pubkey = Pubkey.from_string(recipient)
+        senders = []
         for private_key in keys:
             try:
-                sender = getKeypair(private_key)
-                token_pubkey = Pubkey.from_string(token_contract)
-                recipient_pubkey = Pubkey.from_string(recipient)
-                balance_info=await get_token_balance(client,sender.pubkey(),token_pubkey)
-                amount=balance_info.get('balance')
-                decimals=balance_info.get('decimals')
+                senders.append(getKeypair(private_key))
+            except Exception as e:
+                logger.exception(e)
+        journal_run = await open_journal_run(client, "collect_tokens", {
+            'mint': token_contract,
+            'recipient': recipient,
+            'wallets': digest(str(sender.pubkey()) for sender in senders),
+        })
+        # 续跑时已归集的钱包不再查询和发送
+        senders, resumed = split_resumed(journal_run, senders)
+        total_tokens += sum(detail.get('amount', 0) for detail in resumed)
+        # 预取所有钱包状态，后续转账直接使用快照
+        states, recipient_token_account, recipient_ata_exists = await load_token_gathering_state(
+            client, [sender.pubkey() for sender in senders], token_pubkey, recipient_pubkey
+        )
+        decimals = (await get_token_info(client, token_pubkey)).decimals
+        pending = []
+        for sender in senders:
+            try:
+                state = states[sender.pubkey()]
+                amount = state.token_amount
                 if amount>0:
+                    assert (
+                        state.lamports > 0
+                    ), f"pubkey:{sender.pubkey().__str__()}-SOL余额不足, 当前余额: 0 SOL"
+                    if not recipient_ata_exists:
+                        await create_associated_token_account_if_needed(
+                            client, sender, recipient_pubkey, token_pubkey
+                        )
+                        recipient_ata_exists = True
                     human_readable_amount=amount/pow(10,decimals)
-                    signature=await transfer_tokens(client,sender,recipient_pubkey,token_pubkey,amount)
-                    total_tokens+=human_readable_amount
-                    logger.success(f"Sender {sender.pubkey()} - recipient {recipient} - token_contract {token_contract} - amount {human_readable_amount} - signature {signature} is success")
+                    signature=await send_token_transfer(
+                        client, sender, state.token_account, recipient_token_account, amount,
+                        on_signed=journal_run.on_signed([str(sender.pubkey())]),
+                    )
+                    pending.append((sender, human_readable_amount, signature))
                 else:
-                    logger.info(f"Sender {sender.pubkey()} has no tokens")
+                    logger.info("Sender {wallet} has no tokens", method="collect_tokens", wallet=str(sender.pubkey()))
+                    journal_run.finish([str(sender.pubkey())], CONFIRMED, detail={'wallet': str(sender.pubkey()), 'amount': 0})
             except Exception as e:
-                logger.exception(e)
+                logger.error("Sender {wallet} token transfer failed: {error}", method="collect_tokens", wallet=str(sender.pubkey()), error=str(e))
+                journal_run.fail([str(sender.pubkey())], e)
+        # 统一等待确认，只统计真正落地的转账
+        confirmations = await asyncio.gather(*[wait_for_confirmation(client, signature) for _, _, signature in pending])
+        for (sender, human_readable_amount, signature), result in zip(pending, confirmations):
+            journal_run.record([str(sender.pubkey())], result, detail={'wallet': str(sender.pubkey()), 'amount': human_readable_amount})
+            if result.landed:
+                total_tokens+=human_readable_amount
+                logger.success(
+                    "Sender {wallet} - recipient {recipient} - token_contract {mint} - amount {amount} - signature {signature} is success",
+                    method="collect_tokens", wallet=str(sender.pubkey()), recipient=recipient, mint=token_contract,
+                    amount=human_readable_amount, signature=str(signature),
+                )
+            else:
+                logger.error(
+                    "Sender {wallet} - signature {signature} {status}: {error}",
+                    method="collect_tokens", wallet=str(sender.pubkey()), signature=str(signature), status=result.status, error=str(result.err),
+                )
+        journal_run.complete()
         return  total_tokens
-async def get_sol_balance(network_url: str, address: str) -> float:
+def plan_token_sweep(owner: Pubkey, token_accounts: list, recipient: Pubkey, recipient_atas: Dict[Pubkey, bool], lookup_tables: Sequence[AddressLookupTableAccount] = ()):
+    """
+    为钱包的所有非零代币账户生成 transfer_checked（接收方 ATA 不存在时在同一笔交易前置幂等创建），
+    按交易大小上限打包
+    :param recipient_atas: mint -> 接收方 ATA 是否已存在
+    :param lookup_tables: 编译时使用的查找表
+    :return: [(指令列表, 该交易转出的代币账户列表)]
+    """
+    groups = []
+    for token_account in token_accounts:
+        mint = token_account["mint"]
+        destination = get_associated_token_address(recipient, mint)
+        group = []
+        if not recipient_atas.get(mint):
+            group.append(create_idempotent_associated_token_account(owner, recipient, mint))
+        group.append(
+            transfer_checked(
+                TransferCheckedParams(
+                    program_id=TOKEN_PROGRAM_ID,
+                    source=token_account["pubkey"],
+                    mint=mint,
+                    dest=destination,
+                    owner=owner,
+                    amount=token_account["amount"],
+                    decimals=token_account["decimals"],
+                )
+            )
+        )
+        groups.append(group)
+    batches = pack_instruction_groups(
+        groups,
+        lambda ixs: MessageV0.try_compile(owner, BUDGET_PLACEHOLDER + ixs, list(lookup_tables), Hash.default()),
+    )
+    return [
+        ([ix for index in batch for ix in groups[index]], [token_accounts[index] for index in batch])
+        for batch in batches
+    ]
+async def _refresh_recipient_atas(client:AsyncClient, recipient:Pubkey, mints, recipient_atas:Dict[Pubkey, bool]):
+    """
+    批量查询尚未知道是否存在的接收方 ATA
+    """
+    unknown = [mint for mint in dict.fromkeys(mints) if mint not in recipient_atas]
+    if not unknown:
+        return
+    accounts = await get_multiple_accounts_chunked(
+        client, [get_associated_token_address(recipient, mint) for mint in unknown]
+    )
+    for mint, account in zip(unknown, accounts):
+        recipient_atas.setdefault(mint, account is not None)
+async def _sweep_wallet_tokens(client:AsyncClient, private_key, recipient:Pubkey, recipient_atas:Dict[Pubkey, bool], semaphore:asyncio.Semaphore, lookup_tables:Sequence[AddressLookupTableAccount]=(), journal_run:Optional[JournalRun]=None, token_accounts:Optional[list]=None):
+    """
+    把单个钱包的所有代币转给 recipient，返回该钱包的汇总（amounts 为 mint -> 最小单位数量）
+    :param lookup_tables: 整个运行共用的查找表（见 extend_run_lookup_tables）
+    :param journal_run: 运行日志，每笔交易以 "钱包/序号" 记录签名和结果
+    :param token_accounts: 预先读取的代币账户，为空时在这里读取
+    """
+    async with semaphore:
+        wallet = {'wallet': None, 'transfers': 0, 'failed': 0, 'frozen': 0, 'transactions': 0, 'amounts': {}, 'decimals': {}, 'error': None}
+        try:
+            sender = getKeypair(private_key)
+            owner = sender.pubkey()
+            wallet['wallet'] = str(owner)
+            if journal_run is not None:
+                journal_run.reset_prefix(f"{owner}/")
+            if token_accounts is None:
+                token_accounts = await get_token_accounts_parsed(client, owner)
+            token_accounts, frozen = split_frozen([
+                token_account for token_account in token_accounts if token_account["amount"] > 0
+            ])
+            wallet['frozen'] = len(frozen)
+            if frozen:
+                logger.warning("Sender {wallet} has {frozen} frozen token accounts, skipping them", method="sweep_tokens", wallet=str(owner), frozen=len(frozen))
+            if not token_accounts:
+                logger.info("Sender {wallet} has no tokens", method="sweep_tokens", wallet=str(owner))
+                return wallet
+            mints = [t["mint"] for t in token_accounts]
+            await _refresh_recipient_atas(client, recipient, mints, recipient_atas)
+            pending = []
+            for index, (instructions, batch) in enumerate(plan_token_sweep(owner, token_accounts, recipient, recipient_atas, lookup_tables)):
+                keys = [f"{owner}/{index}"]
+                try:
+                    instructions = await with_compute_budget(client, owner, instructions)
+                    signature = await send_and_track(
+                        client,
+                        lambda recent_blockhash, instructions=instructions: VersionedTransaction(
+                            MessageV0.try_compile(owner, instructions, list(lookup_tables), recent_blockhash), [sender]
+                        ),
+                        on_signed=journal_run.on_signed(keys) if journal_run is not None else None,
+                    )
+                    pending.append((keys, batch, signature))
+                except Exception as e:
+                    logger.error("Sender {wallet} token sweep send failed: {error}", method="sweep_tokens", wallet=str(owner), error=str(e))
+                    wallet['failed'] += len(batch)
+            for keys, batch, signature in pending:
+                result = await wait_for_confirmation(client, signature)
+                if journal_run is not None:
+                    journal_run.record(keys, result)
+                if not result.landed:
+                    logger.error(
+                        "Sender {wallet} - signature {signature} {status}: {error}",
+                        method="sweep_tokens", wallet=str(owner), signature=str(signature), status=result.status, error=str(result.err),
+                    )
+                    wallet['failed'] += len(batch)
+                    continue
+                wallet['transactions'] += 1
+                wallet['transfers'] += len(batch)
+                for token_account in batch:
+                    mint = str(token_account["mint"])
+                    recipient_atas[token_account["mint"]] = True
+                    wallet['amounts'][mint] = wallet['amounts'].get(mint, 0) + token_account["amount"]
+                    wallet['decimals'][mint] = token_account["decimals"]
+                logger.success(
+                    "Sender {wallet} - swept {transfers} token accounts - signature {signature}",
+                    method="sweep_tokens", wallet=str(owner), transfers=len(batch), signature=str(result.signature),
+                )
+        except Exception as e:
+            logger.error("Sender {wallet} token sweep failed: {error}", method="sweep_tokens", wallet=wallet['wallet'], error=str(e))
+            wallet['error'] = str(e)
+        return wallet
+async def sweep_all_tokens_from_addresses(network_url, recipient, keys, concurrency=SEND_CONCURRENCY, authority_key=None):
+    """
+    并发把 keys 中所有钱包的全部 SPL 代币归集到 recipient（每个钱包一次 jsonParsed 查询，转账尽量打包进少量交易）
+    :param authority_key: 查找表的 authority/付款私钥（通常为主钱包），为空时不使用查找表
+    :return: 汇总 {'wallets', 'transfers', 'transactions', 'failed', 'frozen'(跳过的冻结账户), 'totals'(mint -> 数量), 'results'(每个钱包)}
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    recipient_pubkey = Pubkey.from_string(recipient)
+    recipient_atas: Dict[Pubkey, bool] = {}
+    authority = getKeypair(authority_key) if authority_key else None
+    wallets = [getKeypair(private_key) for private_key in keys]
+    keys, _ = skip_known_empty(wallets)
+    async with open_client(network_url) as client:
+        journal_run = await open_journal_run(client, "sweep_tokens", {
+            'recipient': recipient,
+            'wallets': digest(str(sender.pubkey()) for sender in wallets),
+        })
+        keys, resumed = split_resumed(journal_run, keys)
+        use_tables = authority is not None and USE_LOOKUP_TABLES
+        lookup_tables, mints = [], {}
+        tasks, pending = [], set()
+        for start in range(0, len(keys), MAX_MULTIPLE_ACCOUNTS):
+            chunk = keys[start:start + MAX_MULTIPLE_ACCOUNTS]
+            prefetched = {}
+            if use_tables:
+                # 按块读出代币账户，把新出现的 mint 追加进查找表后再开始这块钱包的转账
+                prefetched = await _prefetch_token_accounts(client, [sender.pubkey() for sender in chunk])
+                await extend_run_lookup_tables(client, authority, recipient_pubkey, lookup_tables, mints, prefetched.values())
+            for sender in chunk:
+                task = asyncio.ensure_future(_record_wallet(
+                    journal_run,
+                    _sweep_wallet_tokens(
+                        client, sender, recipient_pubkey, recipient_atas, semaphore, list(lookup_tables), journal_run,
+                        prefetched.get(sender.pubkey()),
+                    ),
+                ))
+                tasks.append(task)
+                pending.add(task)
+            # 在途钱包降到并发数以内再读下一块：预读最多领先发送一块，代币账户总在使用前不久取得
+            while len(pending) > max(1, concurrency) and start + MAX_MULTIPLE_ACCOUNTS < len(keys):
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        results = await asyncio.gather(*tasks)
+    get_balance_snapshot().invalidate([r['wallet'] for r in results if r['transactions']])
+    journal_run.complete()
+    results = resumed + list(results)
+    totals = {}
+    for result in results:
+        for mint, amount in result['amounts'].items():
+            totals[mint] = totals.get(mint, 0) + amount / pow(10, result['decimals'][mint])
+    return {
+        'wallets': len(results),
+        'transfers': sum(r['transfers'] for r in results),
+        'transactions': sum(r['transactions'] for r in results),
+        'failed': sum(r['failed'] for r in results) + sum(1 for r in results if r['error']),
+        'frozen': sum(r.get('frozen', 0) for r in results),
+        'totals': totals,
+        'results': results,
+    }
+def plan_consolidation(owner: Pubkey, token_accounts: list, recipient: Pubkey, create_mints: Set[Pubkey], lookup_tables: Sequence[AddressLookupTableAccount] = ()):
+    """
+    为钱包清空打包交易：每个有余额的代币账户 transfer_checked 后立即关闭（create_mints 中的 mint 在第一次出现时前置幂等创建接收方 ATA），
+    再关闭空代币账户，最后一笔交易末尾是转给 recipient 的 SOL 转账（金额稍后填入）
+    :return: [(指令列表, 该交易关闭的代币账户列表, 该交易创建接收方 ATA 的 mint 列表)]，最后一项的指令以 SOL 转账结尾
+    """
+    groups = []
+    creates = []
+    for token_account in token_accounts:
+        mint = token_account["mint"]
+        group = []
+        create = None
+        if token_account["amount"] > 0:
+            if mint in create_mints and mint not in creates:
+                group.append(create_idempotent_associated_token_account(owner, recipient, mint))
+                create = mint
+            group.append(
+                transfer_checked(
+                    TransferCheckedParams(
+                        program_id=TOKEN_PROGRAM_ID,
+                        source=token_account["pubkey"],
+                        mint=mint,
+                        dest=get_associated_token_address(recipient, mint),
+                        owner=owner,
+                        amount=token_account["amount"],
+                        decimals=token_account["decimals"],
+                    )
+                )
+            )
+        group.append(close_account(CloseAccountParams(account=token_account["pubkey"], dest=owner, owner=owner, program_id=TOKEN_PROGRAM_ID)))
+        groups.append(group)
+        creates.append(create)
+    groups.append(build_sol_transfers(owner, [(recipient, 0)]))
+    batches = pack_instruction_groups(
+        groups,
+        lambda ixs: MessageV0.try_compile(owner, BUDGET_PLACEHOLDER + ixs, list(lookup_tables), Hash.default()),
+    )
+    count = len(token_accounts)
+    return [
+        (
+            [ix for index in batch for ix in groups[index]],
+            [token_accounts[index] for index in batch if index < count],
+            [creates[index] for index in batch if index < count and creates[index] is not None],
+        )
+        for batch in batches
+    ]
+def reclaimed_rent(token_accounts: list) -> int:
+    """
+    关闭代币账户回收的 lamports（wSOL 账户的余额已随 transfer_checked 转出，只剩租金）
+    """
+    return sum(
+        t["lamports"] - (t["amount"] if t["mint"] == WRAPPED_SOL_MINT else 0)
+        for t in token_accounts
+    )
+async def _claim_recipient_atas(client:AsyncClient, recipient:Pubkey, mints, recipient_atas:Dict[Pubkey, bool], creating:Dict[Pubkey, asyncio.Future]) -> Set[Pubkey]:
+    """
+    认领需要由本钱包创建的接收方 ATA：每个 mint 同一时间只有一个钱包创建（只有它付租金），
+    其他需要该 mint 的钱包等它落地；创建失败时由等待者之一重新认领
+    :param creating: mint -> 创建结果的 future（True 表示 ATA 已存在）
+    :return: 本钱包认领的 mint 集合，之后必须用 _release_recipient_ata 释放
+    """
+    await _refresh_recipient_atas(client, recipient, mints, recipient_atas)
+    while True:
+        missing = [mint for mint in dict.fromkeys(mints) if not recipient_atas.get(mint)]
+        waiting = [creating[mint] for mint in missing if mint in creating]
+        if not waiting:
+            break
+        # 等待期间不持有任何认领，避免两个钱包互相等待
+        await asyncio.wait(waiting)
+    for mint in missing:
+        creating[mint] = asyncio.get_running_loop().create_future()
+    return set(missing)
+def _release_recipient_ata(mint:Pubkey, created:bool, recipient_atas:Dict[Pubkey, bool], creating:Dict[Pubkey, asyncio.Future], claimed:Set[Pubkey]):
+    """
+    结束对 mint 的认领并唤醒等待者；created 为 False 时由等待者重新认领
+    """
+    if mint not in claimed:
+        return
+    claimed.discard(mint)
+    if created:
+        recipient_atas[mint] = True
+    future = creating.pop(mint, None)
+    if future is not None and not future.done():
+        future.set_result(created)
+def _consolidation_result(owner:Pubkey, error:Optional[str]=None) -> dict:
+    return {
+        'wallet': str(owner), 'lamports': 0, 'fees': 0, 'transfers': 0, 'closed': 0, 'rent_reclaimed': 0,
+        'transactions': 0, 'failed': 0, 'frozen': 0, 'amounts': {}, 'decimals': {}, 'signature': None, 'error': error,
+    }
+async def _consolidate_wallet(client:AsyncClient, sender:Keypair, balance:int, token_accounts:list, recipient:Pubkey, recipient_atas:Dict[Pubkey, bool], creating:Dict[Pubkey, asyncio.Future], ata_rent:int, lookup_tables:Sequence[AddressLookupTableAccount]=(), journal_run:Optional[JournalRun]=None):
+    """
+    清空单个钱包：转出全部代币并关闭代币账户，最后把剩余 SOL（含回收的租金，扣除精确手续费）转给 recipient。
+    除最后一笔外的交易互不依赖，一起发出；最后一笔的转账金额依赖它们的结果
+    :param balance: 装载阶段取得的 SOL 余额，token_accounts 为同时取得的全部代币账户
+    :param lookup_tables: 整个运行共用的查找表（见 extend_run_lookup_tables）
+    :param journal_run: 运行日志，每笔交易以 "钱包/序号" 记录签名和结果
+    :return: 该钱包的汇总（lamports/fees/rent_reclaimed 单位为 lamports，amounts 为 mint -> 最小单位数量）
+    """
+    owner = sender.pubkey()
+    wallet = _consolidation_result(owner)
+    claimed: Set[Pubkey] = set()
+    created: List[Pubkey] = []
+
+    def on_signed(index):
+        return journal_run.on_signed([f"{owner}/{index}"]) if journal_run is not None else None
+
+    def record(index, result):
+        if journal_run is not None:
+            journal_run.record([f"{owner}/{index}"], result)
+
+    def settle(accounts, creates, success):
+        # 记入一笔交易的结果，并释放它负责创建的接收方 ATA
+        for mint in creates:
+            _release_recipient_ata(mint, success, recipient_atas, creating, claimed)
+        if not success:
+            wallet['failed'] += len(accounts)
+            return
+        created.extend(creates)
+        wallet['transactions'] += 1
+        wallet['closed'] += len(accounts)
+        wallet['rent_reclaimed'] += reclaimed_rent(accounts)
+        for token_account in accounts:
+            if not token_account["amount"]:
+                continue
+            mint = str(token_account["mint"])
+            recipient_atas[token_account["mint"]] = True
+            wallet['transfers'] += 1
+            wallet['amounts'][mint] = wallet['amounts'].get(mint, 0) + token_account["amount"]
+            wallet['decimals'][mint] = token_account["decimals"]
+
+    def build(instructions, lookup_tables):
+        return lambda recent_blockhash: VersionedTransaction(
+            MessageV0.try_compile(owner, instructions, list(lookup_tables), recent_blockhash), [sender]
+        )
+
     try:
-        async with AsyncClient(network_url) as client:
+        if journal_run is not None:
+            journal_run.reset_prefix(f"{owner}/")
+        if balance <= 0:
+            logger.info("Sender {wallet} has no sol", method="consolidate", wallet=str(owner))
+            return wallet
+        # 冻结账户无法转出或关闭，不计入失败，也不妨碍归集 SOL
+        token_accounts, frozen = split_frozen(token_accounts)
+        wallet['frozen'] = len(frozen)
+        if frozen:
+            logger.warning("Sender {wallet} has {frozen} frozen token accounts, skipping them", method="consolidate", wallet=str(owner), frozen=len(frozen))
+        mints = [t["mint"] for t in token_accounts if t["amount"] > 0]
+        claimed = await _claim_recipient_atas(client, recipient, mints, recipient_atas, creating)
+        fee_planner = get_fee_planner(client)
+        *prefix, (final_instructions, final_accounts, final_creates) = plan_consolidation(owner, token_accounts, recipient, claimed, lookup_tables)
+        # 先预留每笔交易的手续费和 ATA 租金，落地后再加回关闭账户的租金
+        available = balance
+        exact = True
+        pending = []
+        for index, (instructions, accounts, creates) in enumerate(prefix):
+            instructions = await with_compute_budget(client, owner, instructions)
+            fee = await fee_planner.message_fee(owner, instructions)
+            cost = fee + ata_rent * len(creates)
+            if available < cost:
+                logger.warning(
+                    "Sender {wallet} cannot pay {cost} lamports for {accounts} token accounts",
+                    method="consolidate", wallet=str(owner), cost=cost, accounts=len(accounts),
+                )
+                settle(accounts, creates, False)
+                continue
+            available -= cost
+            try:
+                signature = await send_and_track(client, build(instructions, lookup_tables), on_signed=on_signed(index))
+                pending.append((index, accounts, creates, fee, signature))
+            except Exception as e:
+                logger.error("Sender {wallet} consolidation send failed: {error}", method="consolidate", wallet=str(owner), error=str(e))
+                exact = False
+                settle(accounts, creates, False)
+        for index, accounts, creates, fee, signature in pending:
+            result = await wait_for_confirmation(client, signature)
+            record(index, result)
+            if not result.landed:
+                logger.error(
+                    "Sender {wallet} - signature {signature} {status}: {error}",
+                    method="consolidate", wallet=str(owner), signature=str(signature), status=result.status, error=str(result.err),
+                )
+                # 链上失败的交易照收手续费，过期的不收：改为重新读取余额
+                exact = False
+                settle(accounts, creates, False)
+                continue
+            available += reclaimed_rent(accounts)
+            wallet['fees'] += fee
+            settle(accounts, creates, True)
+        if not exact:
+            available = (await client.get_balance(owner)).value
+        instructions = await with_compute_budget(client, owner, final_instructions)
+        fee = await fee_planner.message_fee(owner, instructions)
+        cost = fee + ata_rent * len(final_creates)
+        # 手续费和 ATA 租金在关闭账户之前扣除，本笔回收的租金不能用来支付
+        lamports = available - cost + reclaimed_rent(final_accounts)
+        if wallet['failed']:
+            # 还有代币账户没清空时保留 SOL，重新运行时用来付手续费和 ATA 租金
+            lamports = 0
+            logger.warning(
+                "Sender {wallet} keeps its SOL: {failed} token accounts were not emptied",
+                method="consolidate", wallet=str(owner), failed=wallet['failed'],
+            )
+        if available < cost or (lamports <= 0 and not final_accounts):
+            if not wallet['failed']:
+                logger.info("Sender {wallet} has no sol above the {fee} lamports fee", method="consolidate", wallet=str(owner), fee=cost)
+            settle(final_accounts, final_creates, False)
+            return wallet
+        if lamports > 0:
+            instructions[-1] = build_sol_transfers(owner, [(recipient, lamports)])[0]
+        else:
+            instructions = instructions[:-1]
+        started_at = time.monotonic()
+        result = await get_transaction_sender(client).send(build(instructions, lookup_tables), on_signed=on_signed(len(prefix)))
+        record(len(prefix), result)
+        wallet['signature'] = str(result.signature)
+        if not result.landed:
+            logger.error(
+                "Sender {wallet} - signature {signature} {status}: {error}",
+                method="consolidate", wallet=str(owner), signature=str(result.signature), status=result.status, error=str(result.err),
+            )
+            settle(final_accounts, final_creates, False)
+            wallet['error'] = f"{result.status}: {result.err}"
+            return wallet
+        wallet['fees'] += fee
+        wallet['lamports'] = max(lamports, 0)
+        settle(final_accounts, final_creates, True)
+        if created and lamports > 0:
+            # 其他进程或机器先创建了同一个 ATA 时幂等创建不收租金，预留的租金还留在钱包里
+            leftover = (await client.get_balance(owner)).value
+            instructions = await with_compute_budget(client, owner, build_sol_transfers(owner, [(recipient, 0)]))
+            fee = await fee_planner.message_fee(owner, instructions)
+            if leftover > fee:
+                instructions[-1] = build_sol_transfers(owner, [(recipient, leftover - fee)])[0]
+                result = await get_transaction_sender(client).send(build(instructions, []), on_signed=on_signed(len(prefix) + 1))
+                record(len(prefix) + 1, result)
+                if result.landed:
+                    wallet['lamports'] += leftover - fee
+                    wallet['fees'] += fee
+                    wallet['transactions'] += 1
+        logger.success(
+            "Sender {wallet} - recipient {recipient} - transfers {transfers} - closed {closed} - amount {amount} - signature {signature} is success",
+            method="consolidate", wallet=str(owner), recipient=str(recipient), transfers=wallet['transfers'], closed=wallet['closed'],
+            amount=wallet['lamports'] / LAMPORTS_PER_SOL, signature=str(result.signature), latency=round(time.monotonic() - started_at, 3),
+        )
+    except Exception as e:
+        logger.error("Sender {wallet} consolidation failed: {error}", method="consolidate", wallet=str(owner), error=str(e))
+        wallet['error'] = str(e)
+    finally:
+        for mint in list(claimed):
+            _release_recipient_ata(mint, False, recipient_atas, creating, claimed)
+    return wallet
+async def _load_wallet_states(client:AsyncClient, senders:List[Keypair], queue:asyncio.Queue, workers:int, extend_lookup_tables:Optional[Callable[[Iterable[list]], Awaitable[None]]]=None):
+    """
+    装载阶段：每 100 个钱包一次 getMultipleAccounts 取 SOL 余额，同时取各钱包的代币账户（并发请求合并成批量），
+    逐个放入队列；队列有上限，状态总在使用前不久取得
+    :param extend_lookup_tables: 每块放入队列前，用这块钱包的代币账户追加查找表（见 extend_run_lookup_tables）
+    """
+    try:
+        for start in range(0, len(senders), MAX_MULTIPLE_ACCOUNTS):
+            chunk = senders[start:start + MAX_MULTIPLE_ACCOUNTS]
+            owners = [sender.pubkey() for sender in chunk]
+            accounts, token_accounts = await asyncio.gather(
+                get_multiple_accounts_chunked(client, owners),
+                asyncio.gather(*[get_token_accounts_parsed(client, owner) for owner in owners], return_exceptions=True),
+                return_exceptions=True,
+            )
+            if extend_lookup_tables is not None and not isinstance(token_accounts, Exception):
+                await extend_lookup_tables([a for a in token_accounts if not isinstance(a, Exception)])
+            for index, sender in enumerate(chunk):
+                error = accounts if isinstance(accounts, Exception) else token_accounts if isinstance(token_accounts, Exception) else token_accounts[index]
+                if isinstance(error, Exception):
+                    await queue.put((sender, 0, [], error))
+                    continue
+                account = accounts[index]
+                await queue.put((sender, account.lamports if account is not None else 0, token_accounts[index], None))
+    finally:
+        for _ in range(workers):
+            await queue.put(None)
+async def consolidate_wallets(network_url, recipient, keys, concurrency=SEND_CONCURRENCY, authority_key=None):
+    """
+    单遍清空 keys 中所有钱包：每个钱包的状态只取一次，代币转出、关闭代币账户和 SOL 归集作为该钱包的依赖阶段
+    尽量打包进最少的交易（通常一笔），多个钱包同时在途（相当于依次运行菜单 2、3、4）
+    :param authority_key: 查找表的 authority/付款私钥（通常为主钱包），为空时不使用查找表
+    :return: 汇总 {'wallets', 'skipped', 'swept', 'sol'(SOL), 'fees'(SOL), 'transfers', 'closed', 'transactions', 'failed', 'frozen'(跳过的冻结账户), 'totals'(mint -> 数量), 'results'(每个钱包)}
+    """
+    workers = max(1, concurrency)
+    recipient = Pubkey.from_string(recipient)
+    authority = getKeypair(authority_key) if authority_key else None
+    wallets = [getKeypair(private_key) for private_key in keys]
+    senders, skipped = skip_known_empty(wallets)
+    recipient_atas: Dict[Pubkey, bool] = {}
+    creating: Dict[Pubkey, asyncio.Future] = {}
+    async with open_client(network_url) as client:
+        journal_run = await open_journal_run(client, "consolidate", {
+            'recipient': str(recipient),
+            'wallets': digest(str(sender.pubkey()) for sender in wallets),
+        })
+        senders, resumed = split_resumed(journal_run, senders)
+        ata_rent = (await client.get_minimum_balance_for_rent_exemption(ACCOUNT_LAYOUT.sizeof())).value
+        lookup_tables, extend_lookup_tables = [], None
+        if authority is not None and USE_LOOKUP_TABLES:
+            # 装载每块钱包时把新出现的 mint 追加进查找表，不必先读完所有钱包
+            extend_lookup_tables = functools.partial(extend_run_lookup_tables, client, authority, recipient, lookup_tables, {})
+        queue = asyncio.Queue(maxsize=workers)
+        results = []
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                sender, balance, token_accounts, error = item
+                if error is not None:
+                    logger.error("Sender {wallet} state fetch failed: {error}", method="consolidate", wallet=str(sender.pubkey()), error=str(error))
+                    results.append(_consolidation_result(sender.pubkey(), str(error)))
+                    continue
+                results.append(await _record_wallet(
+                    journal_run,
+                    _consolidate_wallet(client, sender, balance, token_accounts, recipient, recipient_atas, creating, ata_rent, list(lookup_tables), journal_run),
+                ))
+
+        await asyncio.gather(_load_wallet_states(client, senders, queue, workers, extend_lookup_tables), *[worker() for _ in range(workers)])
+    get_balance_snapshot().invalidate([r['wallet'] for r in results if r['transactions']])
+    journal_run.complete()
+    results = resumed + results
+    totals = {}
+    for result in results:
+        for mint, amount in result['amounts'].items():
+            totals[mint] = totals.get(mint, 0) + amount / pow(10, result['decimals'][mint])
+    return {
+        'wallets': len(results),
+        'skipped': skipped,
+        'swept': sum(1 for r in results if r['lamports']),
+        'sol': sum(r['lamports'] for r in results) / LAMPORTS_PER_SOL,
+        'fees': sum(r['fees'] for r in results) / LAMPORTS_PER_SOL,
+        'transfers': sum(r['transfers'] for r in results),
+        'closed': sum(r['closed'] for r in results),
+        'transactions': sum(r['transactions'] for r in results),
+        'failed': sum(r['failed'] for r in results) + sum(1 for r in results if r['error']),
+        'frozen': sum(r.get('frozen', 0) for r in results),
+        'totals': totals,
+        'results': results,
+    }
+async def scan_wallet_balances(network_url, owners: List[Pubkey], mints: Sequence[Pubkey] = ()):
+    """
+    用分块 getMultipleAccounts 扫描 SOL 和指定代币余额（只刷新快照中过期的条目）
+    :return: {资产: {'decimals', 'count', 'nonzero', 'total', 'min', 'p50', 'p90', 'p99', 'max', 'histogram'}}，数量为最小单位
+    """
+    async with open_client(network_url) as client:
+        balances = await scan_balances(client, owners, mints)
+        decimals = {SOL: 9}
+        for mint in mints:
+            decimals[str(mint)] = (await get_token_info(client, mint)).decimals
+    return {
+        asset: {'decimals': decimals[asset], **summarize_balances(list(amounts.values()))}
+        for asset, amounts in balances.items()
+    }
+async def get_sol_balance(network_url: Union[str, RpcPool], address: str) -> float:
+    try:
+        async with open_client(network_url) as client:
             pubkey = Pubkey.from_string(address)
             response = await client.get_balance(pubkey)
 
@@ -334,6 +1451,30 @@ async def get_sol_balance(network_url: str, address: str) -> float:
         logger.exception(f"Error getting SOL balance: {e}")
         raise
 
+async def load_keys_file(filename) -> List[Keypair]:
+    """
+    读取 data/ 下的私钥文件：去重、并行解码，非法行在开始前统一报告；返回 Keypair 列表
+    """
+    filepath = os.path.join('data', filename)
+    try:
+        index, report = await asyncio.to_thread(load_keys, filepath)
+    except FileNotFoundError:
+        logger.error(f"Error: {filepath} not found")
+        return []
+    report.log()
+    return index.keypairs()
+async def load_addresses_file(filename) -> List[str]:
+    """
+    读取 data/ 下的地址文件：校验并去重，非法行在开始前统一报告
+    """
+    filepath = os.path.join('data', filename)
+    try:
+        addresses, report = await asyncio.to_thread(load_addresses, filepath)
+    except FileNotFoundError:
+        logger.error(f"Error: {filepath} not found")
+        return []
+    report.log()
+    return addresses
 def load_from_file(filename):
     filepath = os.path.join('data', filename)
     try:
@@ -343,8 +1484,42 @@ def load_from_file(filename):
         logger.exception(f"Error: {filepath} not found")
         return []
 
+def use_shards(count:int) -> bool:
+    """
+    钱包数量达到 SHARD_MIN_WALLETS 时改用多进程分片执行
+    """
+    return SHARD_WORKERS > 1 and count >= SHARD_MIN_WALLETS
+def report_failed_shards(summary:dict) -> bool:
+    """
+    打印分片模式下放弃的分片（其中的钱包不在汇总里）
+    :return: 是否还有分片完成（全部放弃时汇总为空，不再打印）
+    """
+    if summary['failed_shards']:
+        print(f"\n{summary['failed_shards']} of {summary['shards']} shards gave up; {summary['unprocessed']} wallets were not processed and are not counted below. Run the same option again to retry them")
+    return summary['failed_shards'] < summary['shards']
+def report_run_metrics():
+    """
+    输出本次操作的 RPC/确认指标，并按配置写入 JSON 文件
+    """
+    if not metrics.calls:
+        return
+    metrics.log_report()
+    try:
+        metrics.write_json()
+    except Exception as e:
+        logger.warning(f"Failed to write metrics: {e}")
+
 async def main(main_private_key):
-    network_url = RPC_URLS["MAINNET"]
+    metrics_server = await metrics.serve()
+    try:
+        # 所有配置的 RPC 节点组成一个池，各操作共用持久连接
+        async with RpcPool(list(RPC_URLS.values())) as network_url:
+            await run_menu(main_private_key, network_url)
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+
+async def run_menu(main_private_key, network_url):
     logger.info("Starting Solana Transfer Tool")
     await asyncio.sleep(0.1)
 
@@ -354,84 +1529,195 @@ async def main(main_private_key):
         print("2. Gather tokens from multiple wallets")
         print("3. close all token accounts from multiple wallets")
         print("4. Gather sol from multiple wallets")
+        print("5. Scan wallet balances")
+        print("6. Consolidate wallets (tokens, token accounts and SOL in one pass)")
         print("0. Exit")
         
-        choice = input("\nEnter your choice (0-4): ")
-        
-        if choice == "1":
-            # logger.info("Selected: Send SOL to multiple addresses")
-            addresses = load_from_file('addresses.txt')
-            if not addresses:
-                logger.exception("addresses.txt not found or is empty")
-                continue
+        choice = input("\nEnter your choice (0-6): ")
+        metrics.reset()
+        try:
+            if choice == "1":
+                # logger.info("Selected: Send SOL to multiple addresses")
+                addresses = await load_addresses_file('addresses.txt')
+                if not addresses:
+                    logger.exception("addresses.txt not found or is empty")
+                    continue
                 
-            private_key = main_private_key
-            main_address=str(getKeypair(main_private_key).pubkey())
-            print(f'main wallet address: {main_address}')
-            print(f'other wallet count: {len(addresses)}')
-            min_amount = float(input("Enter minimum SOL amount: "))
-            max_amount = float(input("Enter maximum SOL amount: "))
+                private_key = main_private_key
+                main_address=str(getKeypair(main_private_key).pubkey())
+                print(f'main wallet address: {main_address}')
+                print(f'other wallet count: {len(addresses)}')
+                min_amount = float(input("Enter minimum SOL amount: "))
+                max_amount = float(input("Enter maximum SOL amount: "))
+                batch = input("Pack transfers into batched transactions? (y/N): ").strip().lower() == 'y'
             
-            params = {
-                'network_url': network_url,
-                'addresses': addresses,
-                'min_amount': min_amount,
-                'max_amount': max_amount,
-                'private_key': private_key
-            }
+                params = {
+                    'network_url': network_url,
+                    'addresses': addresses,
+                    'min_amount': min_amount,
+                    'max_amount': max_amount,
+                    'private_key': private_key,
+                    'batch': batch,
+                }
             
-            result = await send_sol_to_addresses(params)
-            print(f"\nTransfer completed:")
-            print(f"Successful sends: {result['successful_sends']}/{result['total_attempts']}")
-            print(f"Total SOL sent: {result['total_sol_sent']:.4f}")
+                if use_shards(len(addresses)):
+                    result = await ShardedExecutor().run(
+                        "send_sol", addresses,
+                        {'sender': main_address, 'min_amount': min_amount, 'max_amount': max_amount, 'batch': batch},
+                        sender=getKeypair(private_key),
+                    )
+                    if not report_failed_shards(result):
+                        continue
+                else:
+                    result = await send_sol_to_addresses(params)
+                print(f"\nTransfer completed:")
+                print(f"Successful sends: {result['successful_sends']}/{result['total_attempts']}")
+                print(f"Total SOL sent: {result['total_sol_sent']:.4f}")
+                failed = [r['address'] for r in result['results'] if not r['success']]
+                if failed:
+                    print(f"Failed recipients: {len(failed)}")
             
-        elif choice == "2":
-            # Gather tokens from multiple wallets
-            keys = load_from_file('keys.txt')
-            if not keys:
-                print("Please ensure keys.txt exists with private keys")
-                continue
-            private_key = main_private_key
-            recipient=str(getKeypair(main_private_key).pubkey())
-            print(f'recipient wallet address: {recipient}')
-            token_contract = input("Enter token contract address: ")
-            total_tokens= await collect_tokens_from_addresses(
-                network_url, token_contract, recipient, keys
-            )
+            elif choice == "2":
+                # Gather tokens from multiple wallets
+                keys = await load_keys_file('keys.txt')
+                if not keys:
+                    print("Please ensure keys.txt exists with private keys")
+                    continue
+                private_key = main_private_key
+                recipient=str(getKeypair(main_private_key).pubkey())
+                print(f'recipient wallet address: {recipient}')
+                token_contract = input("Enter token contract address (leave empty to sweep all tokens): ").strip()
+                if not token_contract:
+                    if use_shards(len(keys)):
+                        summary = await ShardedExecutor().run("sweep_tokens", keys, {'recipient': recipient})
+                        if not report_failed_shards(summary):
+                            continue
+                    else:
+                        summary = await sweep_all_tokens_from_addresses(network_url, recipient, keys, authority_key=main_private_key)
+                    print(f"\nToken sweep completed:")
+                    for mint, amount in summary['totals'].items():
+                        print(f"{mint}: {amount:.6f}")
+                    print(f"Wallets: {summary['wallets']}, transfers: {summary['transfers']}, transactions: {summary['transactions']}, failures: {summary['failed']}")
+                    if summary['frozen']:
+                        print(f"Frozen token accounts skipped: {summary['frozen']}")
+                    continue
+                if use_shards(len(keys)):
+                    summary = await ShardedExecutor().run("collect_tokens", keys, {'mint': token_contract, 'recipient': recipient})
+                    if not report_failed_shards(summary):
+                        continue
+                    total_tokens = summary['total_tokens']
+                else:
+                    total_tokens= await collect_tokens_from_addresses(
+                        network_url, token_contract, recipient, keys
+                    )
             
-            print(f"\nToken collection completed:")
-            print(f"Total tokens collected: {total_tokens:.6f}")
-        elif choice == "3":
-            # Gather tokens from multiple wallets
-            keys = load_from_file('keys.txt')
-            if not keys:
-                print("Please ensure keys.txt exists with private keys")
-                continue
-            status= await close_all_token_account_from_addresses(
-                network_url, keys
-            )
+                print(f"\nToken collection completed:")
+                print(f"Total tokens collected: {total_tokens:.6f}")
+            elif choice == "3":
+                # Gather tokens from multiple wallets
+                keys = await load_keys_file('keys.txt')
+                if not keys:
+                    print("Please ensure keys.txt exists with private keys")
+                    continue
+                if use_shards(len(keys)):
+                    summary = await ShardedExecutor().run("close_accounts", keys, {})
+                    if not report_failed_shards(summary):
+                        continue
+                else:
+                    summary= await close_all_token_account_from_addresses(
+                        network_url, keys
+                    )
             
-            print(f"\nclose token accounts completed:")
+                print(f"\nclose token accounts completed:")
+                for wallet in summary['results']:
+                    if not wallet['failed'] and not wallet['error']:
+                        continue
+                    status = wallet['error'] or 'partial'
+                    print(f"{wallet['wallet']}: closed {wallet['closed']}, rent {wallet['rent_reclaimed']/LAMPORTS_PER_SOL:.6f} SOL, failed {wallet['failed']} ({status})")
+                print(f"Wallets: {summary['wallets']}, accounts closed: {summary['closed']}, failures: {summary['failed']}")
+                if summary['frozen']:
+                    print(f"Frozen token accounts skipped: {summary['frozen']}")
+                print(f"Total rent reclaimed: {summary['rent_reclaimed']:.6f} SOL")
 
-        elif choice == "4":
-            # Gather tokens from multiple wallets
-            keys = load_from_file('keys.txt')
-            if not keys:
-                print("Please ensure keys.txt exists with private keys")
-                continue
-            private_key = main_private_key
-            recipient=str(getKeypair(main_private_key).pubkey())
-            print(f'recipient wallet address: {recipient}')
-            total_sol= await collect_sol_from_addresses(
-                network_url,  recipient, keys
-            )
-            print(f"Successful transfers close sol") 
-            print(f"Total SOL recive: {total_sol:.4f}")
-        elif choice == "0":
-            print("Exiting...")
-            break
-        else:
-            print("Invalid choice. Please try again.")
+            elif choice == "4":
+                # Gather tokens from multiple wallets
+                keys = await load_keys_file('keys.txt')
+                if not keys:
+                    print("Please ensure keys.txt exists with private keys")
+                    continue
+                private_key = main_private_key
+                recipient=str(getKeypair(main_private_key).pubkey())
+                print(f'recipient wallet address: {recipient}')
+                close_accounts = input("Also close empty token accounts and sweep their rent? (y/N): ").strip().lower() == 'y'
+                if use_shards(len(keys)):
+                    summary = await ShardedExecutor().run("collect_sol", keys, {'recipient': recipient, 'close_accounts': close_accounts})
+                    if not report_failed_shards(summary):
+                        continue
+                else:
+                    summary = await collect_sol_from_addresses(
+                        network_url, recipient, keys, close_accounts=close_accounts
+                    )
+                print(f"Successful transfers close sol") 
+                print(f"Wallets swept: {summary['swept']}/{summary['wallets']}, accounts closed: {summary['closed']}, failures: {summary['failed']}")
+                print(f"Total fees paid: {summary['fees']:.9f}")
+                print(f"Total SOL recive: {summary['sol']:.9f}")
+            elif choice == "5":
+                # Scan balances of every wallet in keys.txt and addresses.txt
+                owners = [sender.pubkey() for sender in await load_keys_file('keys.txt')]
+                if os.path.exists(os.path.join('data', 'addresses.txt')):
+                    # load_addresses_file 已跳过并报告非法行
+                    owners += [Pubkey.from_string(address) for address in await load_addresses_file('addresses.txt')]
+                owners = list(dict.fromkeys(owners))
+                if not owners:
+                    print("Please ensure keys.txt or addresses.txt exists")
+                    continue
+                while True:
+                    entered = input("Token mints to include (comma separated, optional): ").strip()
+                    mints, invalid = [], []
+                    for mint in filter(None, (mint.strip() for mint in entered.split(','))):
+                        try:
+                            mints.append(Pubkey.from_string(mint))
+                        except ValueError:
+                            invalid.append(mint)
+                    if not invalid:
+                        break
+                    print(f"Invalid token mint address: {', '.join(invalid)}. Please try again.")
+                summary = await scan_wallet_balances(network_url, owners, mints)
+                for asset, stats in summary.items():
+                    scale = pow(10, stats['decimals'])
+                    print(f"\n{asset or 'SOL'}: total {stats['total']/scale:.6f}, non-empty wallets {stats['nonzero']}/{stats['count']}")
+                    print(f"  min {stats['min']/scale:.6f}, p50 {stats['p50']/scale:.6f}, p90 {stats['p90']/scale:.6f}, p99 {stats['p99']/scale:.6f}, max {stats['max']/scale:.6f}")
+                    for bucket, count in stats['histogram'].items():
+                        print(f"  >= {pow(10, bucket)/scale:g}: {count}")
+            elif choice == "6":
+                # Tokens, token account rent and SOL of every wallet in keys.txt in one pass
+                keys = await load_keys_file('keys.txt')
+                if not keys:
+                    print("Please ensure keys.txt exists with private keys")
+                    continue
+                recipient=str(getKeypair(main_private_key).pubkey())
+                print(f'recipient wallet address: {recipient}')
+                if use_shards(len(keys)):
+                    summary = await ShardedExecutor().run("consolidate", keys, {'recipient': recipient})
+                    if not report_failed_shards(summary):
+                        continue
+                else:
+                    summary = await consolidate_wallets(network_url, recipient, keys, authority_key=main_private_key)
+                print(f"\nConsolidation completed:")
+                for mint, amount in summary['totals'].items():
+                    print(f"{mint}: {amount:.6f}")
+                print(f"Wallets swept: {summary['swept']}/{summary['wallets']}, token transfers: {summary['transfers']}, accounts closed: {summary['closed']}, transactions: {summary['transactions']}, failures: {summary['failed']}")
+                if summary['frozen']:
+                    print(f"Frozen token accounts skipped: {summary['frozen']}")
+                print(f"Total fees paid: {summary['fees']:.9f}")
+                print(f"Total SOL received: {summary['sol']:.9f}")
+            elif choice == "0":
+                print("Exiting...")
+                break
+            else:
+                print("Invalid choice. Please try again.")
+        finally:
+            report_run_metrics()
 
 if __name__ == "__main__":
     # main wallet private_key
@@ -1,5 +1,4 @@
 from solana.rpc.commitment import Finalized
-from solders.compute_budget import set_compute_unit_price, set_compute_unit_limit
 from solders.message import MessageV0
 from solders.pubkey import Pubkey
 from solders.keypair import Keypair
@@ -7,12 +6,15 @@ from solana.rpc.api import Client
 from solana.rpc.async_api import AsyncClient
 from solders.transaction import VersionedTransaction
 from solana.rpc.api import Client
-from solana.transaction import Transaction
 from solana.rpc import types
 from spl.token.constants import TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID
 from spl.token.instructions import burn, BurnParams, CloseAccountParams, close_account
+from solders.hash import Hash
 from loguru import logger
-
+from utils.blockhash import get_blockhash_cache
+from utils.fees import get_fee_planner, BUDGET_PLACEHOLDER
+from utils.sender import send_until_expiry_sync, get_transaction_sender
+from utils.tx_packing import pack_instructions
 
 
 def get_token_accountsCount(client: Client, wallet_address: Pubkey):
@@ -59,31 +61,27 @@ def close_and_burn_token_account(
                     owner=payer.pubkey(),
                     program_id=TOKEN_PROGRAM_ID,
                 )
-                transaction = Transaction()
-                transaction.add(
-                    close_account(close_account_params),
-                    set_compute_unit_price(25_232),
-                    set_compute_unit_limit(200_337),
-                )
+                close_instruction = close_account(close_account_params)
                 burn_instruction.extend(
-                    [
-                        burn_inst,
-                        transaction.instructions[0],
-                        transaction.instructions[1],
-                        transaction.instructions[2],
-                    ]
+                    get_fee_planner(client).budget_instructions_sync(
+                        payer.pubkey(), [burn_inst, close_instruction]
+                    )
+                    + [burn_inst, close_instruction]
                 )
-                block_hash = client.get_latest_blockhash(commitment=Finalized)
-                logger.debug(block_hash.value.blockhash)
-                msg = MessageV0.try_compile(
-                    payer=payer.pubkey(),
-                    instructions=[instruction for instruction in burn_instruction],
-                    address_lookup_table_accounts=[],
-                    recent_blockhash=block_hash.value.blockhash,
+                # 签名一次并重播直到确认，blockhash 确认过期后才重签
+                result = send_until_expiry_sync(
+                    client,
+                    lambda block_hash: VersionedTransaction(
+                        MessageV0.try_compile(
+                            payer=payer.pubkey(),
+                            instructions=[instruction for instruction in burn_instruction],
+                            address_lookup_table_accounts=[],
+                            recent_blockhash=block_hash,
+                        ),
+                        [payer],
+                    ),
                 )
-                tx1 = VersionedTransaction(msg, [payer])
-                txn_sig = client.send_transaction(tx1)
-                logger.debug(txn_sig.value)
+                logger.debug(f"{result.signature} {result.status}")
                 tokenAccount_list.remove(token)
         except Exception as e:
             logger.debug(e)
@@ -115,28 +113,28 @@ def close_token_account_by_token(
                 owner=payer.pubkey(),
                 program_id=TOKEN_PROGRAM_ID,
             )
-            transaction = Transaction()
-            transaction.add(
-                close_account(close_account_params),
-                set_compute_unit_price(25_232),
-                set_compute_unit_limit(200_337),
-            )
+            close_instruction = close_account(close_account_params)
+            instructions = get_fee_planner(client).budget_instructions_sync(
+                payer.pubkey(), [close_instruction]
+            ) + [close_instruction]
 
-            block_hash = client.get_latest_blockhash(commitment=Finalized)
-            logger.debug(block_hash.value.blockhash)
-            msg = MessageV0.try_compile(
-                payer=payer.pubkey(),
-                instructions=[
-                transaction.instructions[0],
-                transaction.instructions[1],
-                transaction.instructions[2],
-            ],
-                address_lookup_table_accounts=[],
-                recent_blockhash=block_hash.value.blockhash,
+            # 签名一次并重播直到确认，blockhash 确认过期后才重签
+            result = send_until_expiry_sync(
+                client,
+                lambda block_hash: VersionedTransaction(
+                    MessageV0.try_compile(
+                        payer=payer.pubkey(),
+                        instructions=instructions,
+                        address_lookup_table_accounts=[],
+                        recent_blockhash=block_hash,
+                    ),
+                    [payer],
+                ),
             )
-            tx1 = VersionedTransaction(msg, [payer])
-            txn_sig = client.send_transaction(tx1)
-            logger.success(f'清除{token_account}成功-tx:{txn_sig.value}')
+            if result.landed:
+                logger.success(f'清除{token_account}成功-tx:{result.signature}')
+            else:
+                logger.error(f'清除{token_account}失败-tx:{result.signature} {result.status}: {result.err}')
         else:
             logger.warning(f"{mint_address},余额不为0,amount:{amount}")
     except Exception as e:
@@ -167,28 +165,25 @@ def close_token_account(
                         owner=payer.pubkey(),
                         program_id=TOKEN_PROGRAM_ID,
                     )
-                    transaction = Transaction()
-                    transaction.add(
-                        close_account(close_account_params),
-                        set_compute_unit_price(25_232),
-                        set_compute_unit_limit(200_337),
-                    )
+                    close_instruction = close_account(close_account_params)
+                    instructions = get_fee_planner(client).budget_instructions_sync(
+                        payer.pubkey(), [close_instruction]
+                    ) + [close_instruction]
 
-                    block_hash = client.get_latest_blockhash(commitment=Finalized)
-                    logger.debug(block_hash.value.blockhash)
-                    msg = MessageV0.try_compile(
-                        payer=payer.pubkey(),
-                        instructions=[
-                        transaction.instructions[0],
-                        transaction.instructions[1],
-                        transaction.instructions[2],
-                    ],
-                        address_lookup_table_accounts=[],
-                        recent_blockhash=block_hash.value.blockhash,
+                    # 签名一次并重播直到确认，blockhash 确认过期后才重签
+                    result = send_until_expiry_sync(
+                        client,
+                        lambda block_hash: VersionedTransaction(
+                            MessageV0.try_compile(
+                                payer=payer.pubkey(),
+                                instructions=instructions,
+                                address_lookup_table_accounts=[],
+                                recent_blockhash=block_hash,
+                            ),
+                            [payer],
+                        ),
                     )
-                    tx1 = VersionedTransaction(msg, [payer])
-                    txn_sig = client.send_transaction(tx1)
-                    logger.debug(txn_sig.value)
+                    logger.debug(f"{result.signature} {result.status}")
                 else:
                     logger.warning(f"{mint_address},balance not zero,amount:{amount}")
                 tokenAccount_list.remove(token)
@@ -196,3 +191,124 @@ def close_token_account(
             logger.debug(e)
             continue
 
+
+async def get_token_accounts_parsed(client: AsyncClient, wallet_address: Pubkey):
+    """
+    一次 jsonParsed 查询获取钱包全部代币账户的 mint、余额、租金和状态
+    :return: [{"pubkey", "mint", "amount", "decimals", "lamports", "state"}]
+    """
+    opts = types.TokenAccountOpts(program_id=TOKEN_PROGRAM_ID)
+    response = await client.get_token_accounts_by_owner_json_parsed(wallet_address, opts)
+    token_accounts = []
+    for keyed_account in response.value:
+        info = keyed_account.account.data.parsed["info"]
+        token_accounts.append(
+            {
+                "pubkey": keyed_account.pubkey,
+                "mint": Pubkey.from_string(info["mint"]),
+                "amount": int(info["tokenAmount"]["amount"]),
+                "decimals": info["tokenAmount"]["decimals"],
+                "lamports": keyed_account.account.lamports,
+                "state": info.get("state", "initialized"),
+            }
+        )
+    return token_accounts
+
+
+def split_frozen(token_accounts: list):
+    """
+    冻结的代币账户既不能转出也不能关闭，和其他指令打包在一起会让整笔交易失败
+    :return: (可以处理的代币账户, 冻结的代币账户)
+    """
+    frozen = [token_account for token_account in token_accounts if token_account["state"] == "frozen"]
+    return [token_account for token_account in token_accounts if token_account["state"] != "frozen"], frozen
+
+
+def compile_close_account_message(
+    payer: Pubkey, instructions: list, recent_blockhash: Hash = Hash.default(), budget: list = BUDGET_PLACEHOLDER
+):
+    """
+    编译一批 close_account 指令，前置一对共用的 compute budget 指令（默认为估算大小用的占位指令）
+    """
+    return MessageV0.try_compile(
+        payer=payer,
+        instructions=budget + instructions,
+        address_lookup_table_accounts=[],
+        recent_blockhash=recent_blockhash,
+    )
+
+
+def plan_close_account_batches(payer: Pubkey, token_accounts: list):
+    """
+    把 close_account 指令尽量多地打包进 MessageV0，每笔交易共用一对 compute budget 指令
+    :return: [(指令列表, 该交易关闭的代币账户列表)]
+    """
+    instructions = [
+        close_account(
+            CloseAccountParams(
+                account=token_account["pubkey"],
+                dest=payer,
+                owner=payer,
+                program_id=TOKEN_PROGRAM_ID,
+            )
+        )
+        for token_account in token_accounts
+    ]
+    batches = []
+    offset = 0
+    for batch in pack_instructions(instructions, lambda ixs: compile_close_account_message(payer, ixs)):
+        batches.append((batch, token_accounts[offset:offset + len(batch)]))
+        offset += len(batch)
+    return batches
+
+
+async def close_token_account_async(
+    client: AsyncClient,
+    payer: Keypair,
+):
+    """
+    异步批量关闭钱包下所有余额为 0 的代币账户
+    :return: {"closed", "rent_reclaimed", "failed", "frozen", "signatures"}，rent_reclaimed 单位为 lamports，frozen 为跳过的冻结空账户数
+    """
+    wallet_address = payer.pubkey()
+    result = {"closed": 0, "rent_reclaimed": 0, "failed": 0, "frozen": 0, "signatures": []}
+    token_accounts = await get_token_accounts_parsed(client, wallet_address)
+    empty_accounts = []
+    for token_account in token_accounts:
+        logger.debug(f'{token_account["pubkey"]},{token_account["mint"]},{token_account["amount"]}')
+        if token_account["amount"] == 0:
+            empty_accounts.append(token_account)
+        else:
+            logger.warning(f'{token_account["mint"]},balance not zero,amount:{token_account["amount"]}')
+    empty_accounts, frozen = split_frozen(empty_accounts)
+    result["frozen"] = len(frozen)
+    if frozen:
+        logger.warning(f'{wallet_address} has {len(frozen)} frozen empty token accounts, skipping them')
+    if not empty_accounts:
+        return result
+    sender = get_transaction_sender(client)
+    sent = []
+    fee_planner = get_fee_planner(client)
+    for instructions, batch in plan_close_account_batches(wallet_address, empty_accounts):
+        try:
+            budget = await fee_planner.budget_instructions(wallet_address, instructions)
+            signature = await sender.submit(
+                lambda recent_blockhash, instructions=instructions, budget=budget: VersionedTransaction(
+                    compile_close_account_message(wallet_address, instructions, recent_blockhash, budget), [payer]
+                )
+            )
+            logger.debug(f"sent close of {len(batch)} token accounts - tx:{signature}")
+            sent.append((batch, signature))
+        except Exception as e:
+            logger.debug(e)
+            result["failed"] += len(batch)
+    for batch, signature in sent:
+        confirmed = await sender.wait(signature)
+        if confirmed.landed:
+            result["closed"] += len(batch)
+            result["rent_reclaimed"] += sum(token_account["lamports"] for token_account in batch)
+            result["signatures"].append(str(confirmed.signature))
+        else:
+            logger.debug(f"close tx {confirmed.signature} {confirmed.status}: {confirmed.err}")
+            result["failed"] += len(batch)
+    return result
@@ -0,0 +1,83 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from solana.rpc.async_api import AsyncClient
+from solders.account import Account
+from solders.pubkey import Pubkey
+from spl.token.core import ACCOUNT_LAYOUT
+from spl.token.instructions import get_associated_token_address
+
+from data.config import SEND_CONCURRENCY
+
+# getMultipleAccounts 单次最多查询 100 个账户
+MAX_MULTIPLE_ACCOUNTS = 100
+
+
+@dataclass
+class WalletTokenState:
+    owner: Pubkey
+    lamports: int
+    token_account: Pubkey
+    token_account_exists: bool
+    token_amount: int
+
+
+async def get_multiple_accounts_chunked(
+    client: AsyncClient,
+    pubkeys: Sequence[Pubkey],
+    chunk_size: int = MAX_MULTIPLE_ACCOUNTS,
+    concurrency: int = SEND_CONCURRENCY,
+) -> List[Optional[Account]]:
+    """
+    按每 100 个一组调用 getMultipleAccounts，返回与 pubkeys 一一对应的账户（不存在为 None）
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    chunks = [list(pubkeys[i:i + chunk_size]) for i in range(0, len(pubkeys), chunk_size)]
+
+    async def fetch(chunk):
+        async with semaphore:
+            response = await client.get_multiple_accounts(chunk)
+            return response.value
+
+    results = await asyncio.gather(*[fetch(chunk) for chunk in chunks])
+    return [account for chunk in results for account in chunk]
+
+
+def decode_token_amount(account: Optional[Account]) -> Optional[int]:
+    """
+    用 ACCOUNT_LAYOUT 解码代币账户余额，账户不存在或不是代币账户时返回 None
+    """
+    if account is None or len(account.data) < ACCOUNT_LAYOUT.sizeof():
+        return None
+    return ACCOUNT_LAYOUT.parse(account.data).amount
+
+
+async def load_token_gathering_state(
+    client: AsyncClient,
+    owners: Sequence[Pubkey],
+    token_mint_address: Pubkey,
+    recipient: Pubkey,
+):
+    """
+    一次性预取归集代币所需的全部状态：各钱包 SOL 余额、各钱包 ATA 余额、接收方 ATA 是否存在
+    :return: (Dict[owner, WalletTokenState], recipient_token_account, recipient_token_account_exists)
+    """
+    token_accounts = [get_associated_token_address(owner, token_mint_address) for owner in owners]
+    recipient_token_account = get_associated_token_address(recipient, token_mint_address)
+    accounts = await get_multiple_accounts_chunked(
+        client, list(owners) + token_accounts + [recipient_token_account]
+    )
+    count = len(owners)
+    wallet_accounts, ata_accounts = accounts[:count], accounts[count:2 * count]
+    states: Dict[Pubkey, WalletTokenState] = {}
+    for owner, token_account, wallet_account, ata_account in zip(owners, token_accounts, wallet_accounts, ata_accounts):
+        amount = decode_token_amount(ata_account)
+        states[owner] = WalletTokenState(
+            owner=owner,
+            lamports=wallet_account.lamports if wallet_account is not None else 0,
+            token_account=token_account,
+            token_account_exists=amount is not None,
+            token_amount=amount or 0,
+        )
+    return states, recipient_token_account, accounts[-1] is not None
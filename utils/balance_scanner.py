@@ -0,0 +1,165 @@
+import math
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from solana.rpc.async_api import AsyncClient
+from solders.pubkey import Pubkey
+from spl.token.instructions import get_associated_token_address
+
+from data.config import BALANCE_SNAPSHOT_PATH, BALANCE_SNAPSHOT_MAX_AGE
+from utils.account_loader import get_multiple_accounts_chunked, decode_token_amount
+
+# mint 列为空字符串表示 SOL（lamports），否则为该 mint 的 ATA 余额（最小单位）
+SOL = ""
+
+
+class BalanceSnapshot:
+    """
+    钱包余额快照（SQLite）：每个 (owner, mint) 一行，记录余额和扫描时间，
+    再次扫描时只刷新超过 max_age 的条目
+    """
+
+    def __init__(self, path: str = BALANCE_SNAPSHOT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 分片执行时多个进程同时读写：WAL 下读不阻塞写，写锁最多等待 30 秒
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS balances ("
+            "owner TEXT NOT NULL, mint TEXT NOT NULL, amount INTEGER NOT NULL, scanned_at REAL NOT NULL, "
+            "PRIMARY KEY (owner, mint)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def get(self, owners: Sequence[str], mint: str = SOL) -> Dict[str, Tuple[int, float]]:
+        """
+        :return: owner -> (amount, scanned_at)，未扫描过的 owner 不在结果中
+        """
+        result = {}
+        # SQLite 单条语句的参数个数有限，分批查询
+        for i in range(0, len(owners), 900):
+            chunk = list(owners[i:i + 900])
+            rows = self._db.execute(
+                f"SELECT owner, amount, scanned_at FROM balances WHERE mint = ? AND owner IN ({','.join('?' * len(chunk))})",
+                [mint] + chunk,
+            )
+            result.update({owner: (amount, scanned_at) for owner, amount, scanned_at in rows})
+        return result
+
+    def stale(self, owners: Sequence[str], mint: str = SOL, max_age: float = BALANCE_SNAPSHOT_MAX_AGE) -> List[str]:
+        known = self.get(owners, mint)
+        now = time.time()
+        return [owner for owner in owners if owner not in known or now - known[owner][1] > max_age]
+
+    def update(self, rows: Iterable[Tuple[str, str, int]], scanned_at: Optional[float] = None):
+        scanned_at = time.time() if scanned_at is None else scanned_at
+        self._db.executemany(
+            "INSERT OR REPLACE INTO balances (owner, mint, amount, scanned_at) VALUES (?, ?, ?, ?)",
+            [(owner, mint, amount, scanned_at) for owner, mint, amount in rows],
+        )
+        self._db.commit()
+
+    def invalidate(self, owners: Sequence[str]):
+        """
+        余额已变化（转出、关闭账户后）的钱包标记为过期
+        """
+        for i in range(0, len(owners), 900):
+            chunk = list(owners[i:i + 900])
+            self._db.execute(f"UPDATE balances SET scanned_at = 0 WHERE owner IN ({','.join('?' * len(chunk))})", chunk)
+        self._db.commit()
+
+    def known_empty(self, owners: Sequence[str], max_age: float = BALANCE_SNAPSHOT_MAX_AGE) -> List[str]:
+        """
+        快照中在 max_age 内确认 SOL 余额为 0 的钱包（无法支付手续费，可直接跳过）
+        """
+        now = time.time()
+        return [
+            owner for owner, (amount, scanned_at) in self.get(owners).items()
+            if amount == 0 and now - scanned_at <= max_age
+        ]
+
+    def close(self):
+        self._db.close()
+
+
+_snapshot: Optional[BalanceSnapshot] = None
+
+
+def get_balance_snapshot() -> BalanceSnapshot:
+    """
+    获取共享的余额快照（首次使用时打开）
+    """
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = BalanceSnapshot()
+    return _snapshot
+
+
+async def scan_balances(
+    client: AsyncClient,
+    owners: Sequence[Pubkey],
+    mints: Sequence[Pubkey] = (),
+    snapshot: Optional[BalanceSnapshot] = None,
+    max_age: float = BALANCE_SNAPSHOT_MAX_AGE,
+) -> Dict[str, Dict[str, int]]:
+    """
+    用分块 getMultipleAccounts 扫描 SOL 和指定代币余额，只刷新快照中过期的条目
+    :return: {SOL 或 mint: {owner: 余额}}
+    """
+    snapshot = snapshot or get_balance_snapshot()
+    owner_keys = [str(owner) for owner in owners]
+    by_key = dict(zip(owner_keys, owners))
+    for mint in [SOL] + [str(mint) for mint in mints]:
+        stale = snapshot.stale(owner_keys, mint, max_age)
+        if not stale:
+            continue
+        if mint == SOL:
+            accounts = await get_multiple_accounts_chunked(client, [by_key[owner] for owner in stale])
+            amounts = [account.lamports if account is not None else 0 for account in accounts]
+        else:
+            mint_pubkey = Pubkey.from_string(mint)
+            accounts = await get_multiple_accounts_chunked(
+                client, [get_associated_token_address(by_key[owner], mint_pubkey) for owner in stale]
+            )
+            amounts = [decode_token_amount(account) or 0 for account in accounts]
+        snapshot.update((owner, mint, amount) for owner, amount in zip(stale, amounts))
+        logger.debug(f"refreshed {len(stale)} {'SOL' if mint == SOL else mint} balances")
+    return {
+        mint: {owner: amount for owner, (amount, _) in snapshot.get(owner_keys, mint).items()}
+        for mint in [SOL] + [str(mint) for mint in mints]
+    }
+
+
+def summarize_balances(amounts: Sequence[int]) -> dict:
+    """
+    余额分布：总额、非零数量、分位数，以及按数量级分桶的直方图
+    """
+    ordered = sorted(amounts)
+    nonzero = [amount for amount in ordered if amount > 0]
+
+    def percentile(pct):
+        if not ordered:
+            return 0
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+    histogram: Dict[int, int] = {}
+    for amount in nonzero:
+        bucket = int(math.log10(amount))
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return {
+        "count": len(ordered),
+        "nonzero": len(nonzero),
+        "total": sum(ordered),
+        "min": ordered[0] if ordered else 0,
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": ordered[-1] if ordered else 0,
+        "histogram": dict(sorted(histogram.items())),
+    }
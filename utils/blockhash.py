@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Optional, Tuple, Union
+
+from loguru import logger
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment
+from solders.hash import Hash
+
+from data.config import BLOCKHASH_REFRESH_INTERVAL, BLOCKHASH_MAX_AGE, BLOCKHASH_IDLE_TIMEOUT
+from utils.client_registry import ClientBound, ClientRegistry
+
+
+class BlockhashCache(ClientBound):
+    """
+    共享的 blockhash 缓存：后台定时刷新，调用方直接拿缓存值，无需每笔交易请求一次 RPC
+    """
+
+    def __init__(
+        self,
+        client: Union[AsyncClient, Client],
+        commitment: Optional[Commitment] = None,
+        refresh_interval: float = BLOCKHASH_REFRESH_INTERVAL,
+        max_age: float = BLOCKHASH_MAX_AGE,
+        idle_timeout: float = BLOCKHASH_IDLE_TIMEOUT,
+    ):
+        super().__init__(client)
+        self.commitment = commitment
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self.blockhash: Optional[Hash] = None
+        self.last_valid_block_height: Optional[int] = None
+        self.fetched_at = 0.0
+        self.last_access = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.blockhash is not None and time.monotonic() - self.fetched_at < self.max_age
+
+    def _store(self, response):
+        if not hasattr(response, "value"):
+            raise ValueError("get recent blockhash failed")
+        self.blockhash = response.value.blockhash
+        self.last_valid_block_height = response.value.last_valid_block_height
+        self.fetched_at = time.monotonic()
+
+    async def refresh(self) -> Tuple[Hash, int]:
+        response = await self.client.get_latest_blockhash(self.commitment)
+        self._store(response)
+        return self.blockhash, self.last_valid_block_height
+
+    async def get_with_height(self) -> Tuple[Hash, int]:
+        """
+        返回 (blockhash, last_valid_block_height)，缓存过期时才请求 RPC
+        """
+        self.last_access = time.monotonic()
+        if not self.is_fresh():
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if not self.is_fresh():
+                    await self.refresh()
+        self.start()
+        return self.blockhash, self.last_valid_block_height
+
+    async def get(self) -> Hash:
+        blockhash, _ = await self.get_with_height()
+        return blockhash
+
+    def get_sync(self) -> Tuple[Hash, int]:
+        """
+        同步 Client 使用：没有后台任务，过期时同步刷新
+        """
+        self.last_access = time.monotonic()
+        if self.blockhash is None or time.monotonic() - self.fetched_at >= self.refresh_interval:
+            self._store(self.client.get_latest_blockhash(self.commitment))
+        return self.blockhash, self.last_valid_block_height
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            # 长时间无人使用（或 client 已关闭）时自动停止，避免泄漏任务
+            if time.monotonic() - self.last_access > self.idle_timeout:
+                return
+            try:
+                await self.refresh()
+            except Exception as e:
+                if self._client_ref() is None:
+                    return
+                logger.debug(f"blockhash refresh failed: {e}")
+
+
+_caches: ClientRegistry[BlockhashCache] = ClientRegistry(BlockhashCache)
+
+
+def get_blockhash_cache(client: Union[AsyncClient, Client], commitment: Optional[Commitment] = None) -> BlockhashCache:
+    """
+    获取 client 对应的共享 blockhash 缓存（按 commitment 区分）
+    """
+    return _caches.get(client, commitment)
@@ -0,0 +1,37 @@
+import weakref
+from typing import Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ClientBound:
+    """
+    绑定到一个 RPC client 的共享服务：只保存 client 的弱引用，共享注册表不会让 client 无法释放
+    """
+
+    def __init__(self, client):
+        self._client_ref = weakref.ref(client)
+
+    @property
+    def client(self):
+        client = self._client_ref()
+        if client is None:
+            raise RuntimeError("RPC client has been released")
+        return client
+
+
+class ClientRegistry(Generic[T]):
+    """
+    每个 client（以及 commitment 等额外参数）一个共享实例，client 释放后随之回收
+    """
+
+    def __init__(self, factory: Callable[..., T]):
+        self.factory = factory
+        self._instances: "weakref.WeakKeyDictionary[object, Dict[Tuple[Hashable, ...], T]]" = weakref.WeakKeyDictionary()
+
+    def get(self, client, *args: Hashable) -> T:
+        per_client = self._instances.setdefault(client, {})
+        instance = per_client.get(args)
+        if instance is None:
+            instance = per_client[args] = self.factory(client, *args)
+        return instance
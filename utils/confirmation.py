@@ -0,0 +1,151 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from loguru import logger
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment
+from solders.signature import Signature
+
+from data.config import CONFIRM_COMMITMENT, CONFIRM_POLL_INTERVAL, CONFIRM_TIMEOUT
+from utils.client_registry import ClientBound, ClientRegistry
+
+# getSignatureStatuses 单次最多 256 个签名
+MAX_SIGNATURE_STATUSES = 256
+COMMITMENT_RANK = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+CONFIRMED = "confirmed"
+FAILED = "failed"
+# blockhash 已确认过期（高度超过 last_valid_block_height），交易不可能再上链
+EXPIRED = "expired"
+# 超时但无法确认是否过期（未知 last_valid_block_height 或轮询失败），不能据此重签
+TIMEOUT = "timeout"
+
+
+@dataclass
+class ConfirmationResult:
+    signature: Signature
+    status: str
+    err: Optional[object] = None
+    slot: Optional[int] = None
+
+    @property
+    def landed(self) -> bool:
+        return self.status == CONFIRMED
+
+
+class _Pending:
+    __slots__ = ("future", "last_valid_block_height", "deadline")
+
+    def __init__(self, future, last_valid_block_height, deadline):
+        self.future = future
+        self.last_valid_block_height = last_valid_block_height
+        self.deadline = deadline
+
+
+class ConfirmationTracker(ClientBound):
+    """
+    后台确认跟踪器：批量轮询 getSignatureStatuses，按 commitment 完成每个签名的 future，
+    blockhash 超过 last_valid_block_height 后判定为过期，超过 timeout 仍无结果判定为超时
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        commitment: Commitment = CONFIRM_COMMITMENT,
+        poll_interval: float = CONFIRM_POLL_INTERVAL,
+        timeout: float = CONFIRM_TIMEOUT,
+    ):
+        super().__init__(client)
+        self.commitment = commitment
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pending: Dict[Signature, _Pending] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, signature: Signature, last_valid_block_height: Optional[int] = None) -> asyncio.Future:
+        """
+        登记一个已发送的签名，返回在确认/失败/过期时完成的 future（结果为 ConfirmationResult）
+        """
+        pending = self._pending.get(signature)
+        if pending is None:
+            future = asyncio.get_running_loop().create_future()
+            pending = _Pending(future, last_valid_block_height, time.monotonic() + self.timeout)
+            self._pending[signature] = pending
+        elif last_valid_block_height is not None:
+            pending.last_valid_block_height = last_valid_block_height
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+        return pending.future
+
+    async def wait(self, signature: Signature, last_valid_block_height: Optional[int] = None) -> ConfirmationResult:
+        return await asyncio.shield(self.track(signature, last_valid_block_height))
+
+    def _resolve(self, signature: Signature, result: ConfirmationResult):
+        pending = self._pending.pop(signature, None)
+        if pending is not None and not pending.future.done():
+            pending.future.set_result(result)
+
+    async def poll_once(self):
+        signatures = list(self._pending)
+        if not signatures:
+            return
+        # 先取区块高度再查状态：状态仍为空且高度已超过 last_valid_block_height 才判定过期
+        block_height = None
+        if any(p.last_valid_block_height is not None for p in self._pending.values()):
+            block_height = (await self.client.get_block_height(self.commitment)).value
+        required = COMMITMENT_RANK.get(str(self.commitment), 1)
+        for i in range(0, len(signatures), MAX_SIGNATURE_STATUSES):
+            chunk = signatures[i:i + MAX_SIGNATURE_STATUSES]
+            response = await self.client.get_signature_statuses(chunk)
+            for signature, status in zip(chunk, response.value):
+                if status is not None:
+                    if status.err is not None:
+                        self._resolve(signature, ConfirmationResult(signature, FAILED, status.err, status.slot))
+                        continue
+                    # confirmation_status 为空表示已 rooted（finalized）
+                    rank = int(status.confirmation_status) if status.confirmation_status is not None else 2
+                    if rank >= required:
+                        self._resolve(signature, ConfirmationResult(signature, CONFIRMED, None, status.slot))
+                        continue
+                pending = self._pending.get(signature)
+                if pending is None:
+                    continue
+                expired_by_height = (
+                    block_height is not None
+                    and pending.last_valid_block_height is not None
+                    and block_height > pending.last_valid_block_height
+                )
+                if status is None and expired_by_height:
+                    self._resolve(signature, ConfirmationResult(signature, EXPIRED))
+                elif status is None and time.monotonic() > pending.deadline:
+                    self._resolve(signature, ConfirmationResult(signature, TIMEOUT))
+
+    async def _poll_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.debug(f"signature status poll failed: {e}")
+                self._expire_overdue()
+                if self._client_ref() is None:
+                    for signature in list(self._pending):
+                        self._resolve(signature, ConfirmationResult(signature, TIMEOUT))
+                    return
+
+    def _expire_overdue(self):
+        now = time.monotonic()
+        for signature in [s for s, p in self._pending.items() if now > p.deadline]:
+            self._resolve(signature, ConfirmationResult(signature, TIMEOUT))
+
+
+_trackers: ClientRegistry[ConfirmationTracker] = ClientRegistry(ConfirmationTracker)
+
+
+def get_confirmation_tracker(client: AsyncClient, commitment: Commitment = CONFIRM_COMMITMENT) -> ConfirmationTracker:
+    """
+    获取 client 对应的共享确认跟踪器（按 commitment 区分）
+    """
+    return _trackers.get(client, commitment)
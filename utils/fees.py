@@ -0,0 +1,262 @@
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM_ID, set_compute_unit_limit, set_compute_unit_price
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+from solders.transaction import VersionedTransaction
+from spl.token.constants import TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID
+
+from data.config import (
+    PRIORITY_FEE_PERCENTILE,
+    PRIORITY_FEE_CACHE_TTL,
+    PRIORITY_FEE_MIN,
+    PRIORITY_FEE_MAX,
+    COMPUTE_UNIT_MARGIN,
+    DEFAULT_COMPUTE_UNIT_LIMIT,
+)
+from utils.client_registry import ClientBound, ClientRegistry
+from utils.blockhash import get_blockhash_cache
+from utils.rpc_pool import raw_rpc_request, raw_rpc_request_sync
+
+MAX_COMPUTE_UNIT_LIMIT = 1_400_000
+# getRecentPrioritizationFees 最多接受 128 个账户
+MAX_FEE_ACCOUNTS = 128
+# 优先费样本缓存超过这个数量时清理过期条目
+FEE_CACHE_SIZE = 1024
+TOKEN_PROGRAM_IDS = (TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID)
+# System Program transfer 指令的编号（u32 小端）
+SYSTEM_TRANSFER_TAG = (2).to_bytes(4, "little")
+# 打包时用于估算交易大小的占位 compute budget 指令（指令数据定长，大小与真实值一致）
+BUDGET_PLACEHOLDER = [set_compute_unit_limit(0), set_compute_unit_price(0)]
+
+
+def contended_accounts(instructions: Sequence[Instruction]) -> Tuple[Pubkey, ...]:
+    """
+    优先费采样的账户：消息写入的账户去掉签名者和签名者自己的代币账户，只留下其他钱包的交易
+    也会写入的账户（如收款钱包和它的 ATA），这样同一批钱包的交易能共用一个样本。
+    都是自己的账户时为空，采样全网最近的优先费。只剩 SOL 转账的收款地址时也为空：分发给不同
+    地址的转账各不相同，按收款地址采样会每笔交易查询一次
+    """
+    own = {meta.pubkey for ix in instructions for meta in ix.accounts if meta.is_signer}
+    for ix in instructions:
+        # SPL Token 的 transfer/transfer_checked/close_account 第一个账户是签名者转出或关闭的代币账户
+        if ix.program_id in TOKEN_PROGRAM_IDS and any(meta.is_signer for meta in ix.accounts):
+            own.add(ix.accounts[0].pubkey)
+    accounts = {meta.pubkey for ix in instructions for meta in ix.accounts if meta.is_writable and meta.pubkey not in own}
+    recipients = {
+        ix.accounts[1].pubkey for ix in instructions
+        if ix.program_id == SYSTEM_PROGRAM_ID and bytes(ix.data[:4]) == SYSTEM_TRANSFER_TAG
+    }
+    if accounts <= recipients:
+        return ()
+    return tuple(sorted(accounts, key=bytes))[:MAX_FEE_ACCOUNTS]
+
+
+def message_shape(instructions: Sequence[Instruction]) -> tuple:
+    """
+    消息“形状”：程序、账户数和数据长度相同的消息消耗的 CU 基本一致，可共用一次模拟结果
+    """
+    return tuple((ix.program_id, len(ix.accounts), len(ix.data)) for ix in instructions)
+
+
+def fee_shape(instructions: Sequence[Instruction]) -> tuple:
+    """
+    手续费只取决于签名数和 compute budget 取值：消息形状加上 compute budget 指令数据即可唯一确定
+    """
+    budget = tuple(bytes(ix.data) for ix in instructions if ix.program_id == COMPUTE_BUDGET_PROGRAM_ID)
+    return message_shape(instructions), budget
+
+
+def percentile(values: List[int], pct: float) -> int:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FeePlanner(ClientBound):
+    """
+    优先费/CU 规划：按消息写入的共享账户采样 getRecentPrioritizationFees 取分位数（带缓存），
+    每种消息形状只做一次 simulateTransaction 来确定 CU limit
+    """
+
+    def __init__(
+        self,
+        client: Union[AsyncClient, Client],
+        fee_percentile: float = PRIORITY_FEE_PERCENTILE,
+        fee_cache_ttl: float = PRIORITY_FEE_CACHE_TTL,
+        min_price: int = PRIORITY_FEE_MIN,
+        max_price: int = PRIORITY_FEE_MAX,
+        cu_margin: float = COMPUTE_UNIT_MARGIN,
+        default_limit: int = DEFAULT_COMPUTE_UNIT_LIMIT,
+    ):
+        super().__init__(client)
+        self.fee_percentile = fee_percentile
+        self.fee_cache_ttl = fee_cache_ttl
+        self.min_price = min_price
+        self.max_price = max_price
+        self.cu_margin = cu_margin
+        self.default_limit = default_limit
+        self._fees: Dict[Tuple[Pubkey, ...], Tuple[int, float]] = {}
+        self._limits: Dict[tuple, int] = {}
+        self._message_fees: Dict[tuple, int] = {}
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def _cached_fee(self, accounts) -> Optional[int]:
+        cached = self._fees.get(accounts)
+        if cached is not None and time.monotonic() - cached[1] < self.fee_cache_ttl:
+            return cached[0]
+        return None
+
+    def _store_fee(self, accounts, result) -> int:
+        fees = [entry["prioritizationFee"] for entry in result or []]
+        price = min(self.max_price, max(self.min_price, percentile(fees, self.fee_percentile)))
+        now = time.monotonic()
+        if len(self._fees) >= FEE_CACHE_SIZE:
+            self._fees = {key: value for key, value in self._fees.items() if now - value[1] < self.fee_cache_ttl}
+        self._fees[accounts] = (price, now)
+        return price
+
+    def _store_limit(self, shape, response) -> int:
+        value = getattr(response, "value", None)
+        if value is None or value.err is not None or not value.units_consumed:
+            # 模拟失败（如余额不足）时不缓存，使用默认值
+            logger.debug(f"compute unit simulation failed: {getattr(value, 'err', response)}")
+            return self.default_limit
+        limit = min(MAX_COMPUTE_UNIT_LIMIT, math.ceil(value.units_consumed * (1 + self.cu_margin)))
+        self._limits[shape] = limit
+        return limit
+
+    @staticmethod
+    def _simulation_transaction(payer: Pubkey, instructions, blockhash: Hash, price: int):
+        message = MessageV0.try_compile(
+            payer=payer,
+            instructions=[set_compute_unit_limit(MAX_COMPUTE_UNIT_LIMIT), set_compute_unit_price(price)] + list(instructions),
+            address_lookup_table_accounts=[],
+            recent_blockhash=blockhash,
+        )
+        # 模拟不校验签名，用占位签名即可
+        return VersionedTransaction.populate(message, [Signature.default()] * message.header.num_required_signatures)
+
+    async def _shared(self, key: tuple, fetch):
+        """
+        并发的相同查询（同一形状的多个钱包同时规划）只发一次 RPC，其余等待同一结果
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def priority_fee(self, instructions: Sequence[Instruction]) -> int:
+        accounts = contended_accounts(instructions)
+        cached = self._cached_fee(accounts)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            try:
+                result = await raw_rpc_request(self.client, "getRecentPrioritizationFees", [[str(a) for a in accounts]])
+            except Exception as e:
+                logger.debug(f"getRecentPrioritizationFees failed: {e}")
+                return self.min_price
+            return self._store_fee(accounts, result)
+
+        return await self._shared(("price", accounts), fetch)
+
+    async def compute_unit_limit(self, payer: Pubkey, instructions: Sequence[Instruction], price: int = 0) -> int:
+        shape = message_shape(instructions)
+        if shape in self._limits:
+            return self._limits[shape]
+
+        async def simulate():
+            try:
+                blockhash = await get_blockhash_cache(self.client).get()
+                response = await self.client.simulate_transaction(
+                    self._simulation_transaction(payer, instructions, blockhash, price)
+                )
+            except Exception as e:
+                logger.debug(f"simulateTransaction failed: {e}")
+                return self.default_limit
+            return self._store_limit(shape, response)
+
+        return await self._shared(("limit", shape), simulate)
+
+    async def message_fee(self, payer: Pubkey, instructions: Sequence[Instruction]) -> int:
+        """
+        getFeeForMessage 给出的精确手续费（lamports，含优先费），按 fee_shape 缓存
+        """
+        shape = fee_shape(instructions)
+        if shape in self._message_fees:
+            return self._message_fees[shape]
+
+        async def fetch():
+            blockhash = await get_blockhash_cache(self.client).get()
+            response = await self.client.get_fee_for_message(
+                MessageV0.try_compile(payer, list(instructions), [], blockhash)
+            )
+            if response.value is None:
+                # blockhash 在节点上已过期时返回 null，不缓存
+                raise RuntimeError("getFeeForMessage returned no fee")
+            self._message_fees[shape] = response.value
+            return response.value
+
+        return await self._shared(("fee", shape), fetch)
+
+    async def budget_instructions(self, payer: Pubkey, instructions: Sequence[Instruction]) -> List[Instruction]:
+        """
+        返回应前置到消息中的 [set_compute_unit_limit, set_compute_unit_price]
+        """
+        price = await self.priority_fee(instructions)
+        limit = await self.compute_unit_limit(payer, instructions, price)
+        return [set_compute_unit_limit(limit), set_compute_unit_price(price)]
+
+    def budget_instructions_sync(self, payer: Pubkey, instructions: Sequence[Instruction]) -> List[Instruction]:
+        """
+        同步 Client 版本的 budget_instructions
+        """
+        accounts = contended_accounts(instructions)
+        price = self._cached_fee(accounts)
+        if price is None:
+            try:
+                price = self._store_fee(
+                    accounts,
+                    raw_rpc_request_sync(self.client, "getRecentPrioritizationFees", [[str(a) for a in accounts]]),
+                )
+            except Exception as e:
+                logger.debug(f"getRecentPrioritizationFees failed: {e}")
+                price = self.min_price
+        shape = message_shape(instructions)
+        limit = self._limits.get(shape)
+        if limit is None:
+            try:
+                blockhash, _ = get_blockhash_cache(self.client).get_sync()
+                limit = self._store_limit(
+                    shape,
+                    self.client.simulate_transaction(self._simulation_transaction(payer, instructions, blockhash, price)),
+                )
+            except Exception as e:
+                logger.debug(f"simulateTransaction failed: {e}")
+                limit = self.default_limit
+        return [set_compute_unit_limit(limit), set_compute_unit_price(price)]
+
+
+_planners: ClientRegistry[FeePlanner] = ClientRegistry(FeePlanner)
+
+
+def get_fee_planner(client: Union[AsyncClient, Client]) -> FeePlanner:
+    """
+    获取 client 对应的共享 FeePlanner
+    """
+    return _planners.get(client)
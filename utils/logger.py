@@ -4,6 +4,25 @@ from datetime import date
 
 from loguru import logger
 
+from data.config import LOG_ENQUEUE, LOG_JSON, LOG_SAMPLE_RATES
+
+
+def sampling_filter(rates):
+    """
+    按级别抽样：rates 中级别为 N 时每 N 条只保留 1 条（每个 sink 独立计数）
+    """
+    counters = {}
+
+    def keep(record):
+        rate = rates.get(record["level"].name, 1)
+        if rate <= 1:
+            return True
+        seen = counters.get(record["level"].name, 0)
+        counters[record["level"].name] = seen + 1
+        return seen % rate == 0
+
+    return keep
+
 
 def logging_setup():
 
@@ -15,11 +34,14 @@ def logging_setup():
 
     logger.remove()
 
-    logger.add(file_path + f"out_{date.today().strftime('%m-%d')}.log", colorize=True,
-               format=format_info)
+    # enqueue 时格式化后的记录交给后台线程写入，事件循环不阻塞在文件/终端 I/O 上
+    logger.add(file_path + f"out_{date.today().strftime('%m-%d')}.log", colorize=False,
+               format=format_info, serialize=LOG_JSON, enqueue=LOG_ENQUEUE,
+               filter=sampling_filter(LOG_SAMPLE_RATES))
 
     logger.add(sys.stdout, colorize=True,
-               format=format_info, level="INFO")
+               format=format_info, level="INFO", enqueue=LOG_ENQUEUE,
+               filter=sampling_filter(LOG_SAMPLE_RATES))
 
 
 def clean_brackets(raw_str):
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed, Finalized
+from solders.address_lookup_table_account import (
+    ID as LOOKUP_TABLE_PROGRAM_ID,
+    LOOKUP_TABLE_MAX_ADDRESSES,
+    AddressLookupTable,
+    AddressLookupTableAccount,
+    derive_lookup_table_address,
+)
+from solders.instruction import AccountMeta, Instruction
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+from solders.transaction import VersionedTransaction
+
+from data.config import LOOKUP_TABLE_CACHE_PATH
+from utils.client_registry import ClientBound, ClientRegistry
+from utils.account_loader import get_multiple_accounts_chunked
+from utils.fees import get_fee_planner
+from utils.sender import get_transaction_sender
+
+# 每笔 extend 交易追加的地址数（32 字节/个，留出签名、账户和 compute budget 的空间）
+LOOKUP_TABLE_EXTEND_CHUNK = 24
+# 未停用的查找表 deactivation_slot 为 u64::MAX
+ACTIVE_DEACTIVATION_SLOT = 2 ** 64 - 1
+
+
+def create_lookup_table_instruction(authority: Pubkey, payer: Pubkey, recent_slot: int):
+    """
+    构建 CreateLookupTable 指令
+    :return: (指令, 查找表地址)
+    """
+    table, bump = derive_lookup_table_address(authority, recent_slot)
+    data = struct.pack("<IQB", 0, recent_slot, bump)
+    accounts = [
+        AccountMeta(table, is_signer=False, is_writable=True),
+        AccountMeta(authority, is_signer=True, is_writable=False),
+        AccountMeta(payer, is_signer=True, is_writable=True),
+        AccountMeta(SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    return Instruction(LOOKUP_TABLE_PROGRAM_ID, data, accounts), table
+
+
+def extend_lookup_table_instruction(table: Pubkey, authority: Pubkey, payer: Pubkey, addresses: Sequence[Pubkey]) -> Instruction:
+    """
+    构建 ExtendLookupTable 指令
+    """
+    data = struct.pack("<IQ", 2, len(addresses)) + b"".join(bytes(address) for address in addresses)
+    accounts = [
+        AccountMeta(table, is_signer=False, is_writable=True),
+        AccountMeta(authority, is_signer=True, is_writable=False),
+        AccountMeta(payer, is_signer=True, is_writable=True),
+        AccountMeta(SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    return Instruction(LOOKUP_TABLE_PROGRAM_ID, data, accounts)
+
+
+def _chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class LookupTableManager(ClientBound):
+    """
+    地址查找表管理：按 authority 记录已创建的表（持久化到磁盘），
+    缺少的地址优先追加到已有表，放不下时再创建新表
+    """
+
+    def __init__(self, client: AsyncClient, path: Optional[str] = LOOKUP_TABLE_CACHE_PATH):
+        super().__init__(client)
+        self.path = path
+        self._known: Optional[Dict[str, List[str]]] = None
+        self._last_create_slot = 0
+        self._lock = asyncio.Lock()
+
+    def _tables_of(self, authority: Pubkey) -> List[str]:
+        if self._known is None:
+            self._known = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as file:
+                        self._known = json.load(file)
+                except Exception as e:
+                    logger.warning(f"Failed to load lookup table cache {self.path}: {e}")
+        return self._known.setdefault(str(authority), [])
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(self._known, file)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save lookup table cache {self.path}: {e}")
+
+    async def fetch(self, tables: Sequence[Pubkey], authority: Optional[Pubkey] = None) -> Dict[Pubkey, AddressLookupTable]:
+        """
+        读取查找表，跳过不存在、已停用或 authority 不匹配的表
+        """
+        accounts = await get_multiple_accounts_chunked(self.client, list(tables))
+        result = {}
+        for table, account in zip(tables, accounts):
+            if account is None or account.owner != LOOKUP_TABLE_PROGRAM_ID:
+                continue
+            lookup_table = AddressLookupTable.deserialize(bytes(account.data))
+            if lookup_table.meta.deactivation_slot != ACTIVE_DEACTIVATION_SLOT:
+                continue
+            if authority is not None and lookup_table.meta.authority != authority:
+                continue
+            result[table] = lookup_table
+        return result
+
+    async def ensure(self, authority: Keypair, addresses: Sequence[Pubkey]) -> List[AddressLookupTableAccount]:
+        """
+        确保 addresses 都在 authority 的查找表中（必要时创建/追加并等待生效）
+        :return: 包含这些地址的查找表，可直接传给 MessageV0.try_compile
+        """
+        addresses = list(dict.fromkeys(addresses))
+        async with self._lock:
+            known = self._tables_of(authority.pubkey())
+            tables = await self.fetch([Pubkey.from_string(table) for table in known], authority.pubkey())
+            present = {address for table in tables.values() for address in table.addresses}
+            missing = [address for address in addresses if address not in present]
+            if missing:
+                extends = []
+                for table, lookup_table in tables.items():
+                    room = LOOKUP_TABLE_MAX_ADDRESSES - len(lookup_table.addresses)
+                    if room <= 0:
+                        continue
+                    extends += [(table, chunk) for chunk in _chunks(missing[:room], LOOKUP_TABLE_EXTEND_CHUNK)]
+                    missing = missing[room:]
+                landed_slots = []
+                for chunk in _chunks(missing, LOOKUP_TABLE_MAX_ADDRESSES):
+                    table, slot = await self._create(authority, chunk[:LOOKUP_TABLE_EXTEND_CHUNK])
+                    known.append(str(table))
+                    self._save()
+                    landed_slots.append(slot)
+                    extends += [(table, c) for c in _chunks(chunk[LOOKUP_TABLE_EXTEND_CHUNK:], LOOKUP_TABLE_EXTEND_CHUNK)]
+                landed_slots += await asyncio.gather(*[self._extend(authority, table, chunk) for table, chunk in extends])
+                # 新追加的地址要到下一个 slot 才能被交易引用
+                await self._wait_for_slot(max(landed_slots) + 1)
+                tables = await self.fetch([Pubkey.from_string(table) for table in known], authority.pubkey())
+        wanted = set(addresses)
+        return [
+            AddressLookupTableAccount(table, list(lookup_table.addresses))
+            for table, lookup_table in tables.items()
+            if wanted.intersection(lookup_table.addresses)
+        ]
+
+    async def _send(self, authority: Keypair, instructions: List[Instruction]) -> int:
+        instructions = await get_fee_planner(self.client).budget_instructions(authority.pubkey(), instructions) + instructions
+        sender = get_transaction_sender(self.client)
+        result = await sender.send(
+            lambda recent_blockhash: VersionedTransaction(
+                MessageV0.try_compile(authority.pubkey(), instructions, [], recent_blockhash), [authority]
+            )
+        )
+        if not result.landed:
+            raise RuntimeError(f"lookup table transaction {result.signature} {result.status}: {result.err}")
+        return result.slot or 0
+
+    async def _create(self, authority: Keypair, addresses: List[Pubkey]):
+        # 同一 authority 在同一 slot 只能派生出一个表地址
+        while True:
+            recent_slot = (await self.client.get_slot(Finalized)).value
+            if recent_slot > self._last_create_slot:
+                break
+            await asyncio.sleep(0.4)
+        self._last_create_slot = recent_slot
+        create_instruction, table = create_lookup_table_instruction(authority.pubkey(), authority.pubkey(), recent_slot)
+        instructions = [create_instruction]
+        if addresses:
+            instructions.append(extend_lookup_table_instruction(table, authority.pubkey(), authority.pubkey(), addresses))
+        slot = await self._send(authority, instructions)
+        logger.info(f"Created lookup table {table} with {len(addresses)} addresses")
+        return table, slot
+
+    async def _extend(self, authority: Keypair, table: Pubkey, addresses: List[Pubkey]) -> int:
+        slot = await self._send(
+            authority, [extend_lookup_table_instruction(table, authority.pubkey(), authority.pubkey(), addresses)]
+        )
+        logger.debug(f"Extended lookup table {table} with {len(addresses)} addresses")
+        return slot
+
+    async def _wait_for_slot(self, slot: int):
+        while (await self.client.get_slot(Confirmed)).value < slot:
+            await asyncio.sleep(0.4)
+
+
+_managers: ClientRegistry[LookupTableManager] = ClientRegistry(LookupTableManager)
+
+
+def get_lookup_table_manager(client: AsyncClient) -> LookupTableManager:
+    """
+    获取 client 对应的共享查找表管理器
+    """
+    return _managers.get(client)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from loguru import logger
+from solana.rpc.core import RPCException
+
+from data.config import METRICS_MAX_SAMPLES, METRICS_JSON_PATH, METRICS_HOST, METRICS_PORT
+
+QUANTILES = (50, 95, 99)
+
+
+def error_code(exc: BaseException) -> str:
+    """
+    异常对应的错误码：JSON-RPC code、HTTP 状态码，否则为异常类型名
+    """
+    code = getattr(exc, "code", None)
+    if code is not None:
+        return str(code)
+    if isinstance(exc, RPCException) and exc.args:
+        code = getattr(exc.args[0], "code", None)
+        return str(code) if code is not None else type(exc.args[0]).__name__
+    cause = exc
+    while cause is not None:
+        if isinstance(cause, httpx.HTTPStatusError):
+            return f"http_{cause.response.status_code}"
+        cause = cause.__cause__
+    return type(exc).__name__
+
+
+class LatencySamples:
+    """
+    延迟样本（秒）：超过 max_samples 后用蓄水池抽样，分位数始终基于均匀样本
+    """
+
+    def __init__(self, max_samples: int = METRICS_MAX_SAMPLES):
+        self.max_samples = max(1, max_samples)
+        self.samples: List[float] = []
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+            return
+        index = random.randrange(self.count)
+        if index < self.max_samples:
+            self.samples[index] = value
+
+    def merge(self, count: int, total: float, samples: List[float]):
+        """
+        并入另一组样本（如分片进程的）：超过 max_samples 时两边按各自的调用数比例保留样本
+        """
+        combined = self.count + count
+        if len(self.samples) + len(samples) > self.max_samples:
+            keep = min(len(self.samples), round(self.max_samples * self.count / combined))
+            self.samples = random.sample(self.samples, keep) + random.sample(samples, min(len(samples), self.max_samples - keep))
+        else:
+            self.samples = self.samples + list(samples)
+        self.count = combined
+        self.total += total
+
+    def state(self) -> dict:
+        return {"count": self.count, "total": self.total, "samples": list(self.samples)}
+
+    def quantiles(self) -> Dict[int, float]:
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.samples)
+        return {q: ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] for q in QUANTILES}
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            **{f"p{q}": value for q, value in self.quantiles().items()},
+        }
+
+
+class MethodStats:
+    def __init__(self):
+        self.latency = LatencySamples()
+        self.errors: Dict[str, int] = {}
+        self.retries = 0
+
+    def summary(self) -> dict:
+        return {
+            **self.latency.summary(),
+            "errors": dict(self.errors),
+            "retries": self.retries,
+        }
+
+
+class Metrics:
+    """
+    运行指标：每个 RPC 方法的调用数、延迟分位数、错误码和重试次数，
+    交易从首次发送到有结果的时间（按最终状态分类），以及重播/重签等事件计数
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.monotonic()
+        self.methods: Dict[str, MethodStats] = {}
+        self.confirmations: Dict[str, LatencySamples] = {}
+        self.events: Dict[str, int] = {}
+
+    def _method(self, method: str) -> MethodStats:
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        return stats
+
+    def observe(self, method: str, elapsed: float, exc: Optional[BaseException] = None):
+        stats = self._method(method)
+        stats.latency.add(elapsed)
+        if exc is not None:
+            code = error_code(exc)
+            stats.errors[code] = stats.errors.get(code, 0) + 1
+
+    def retry(self, method: str):
+        self._method(method).retries += 1
+
+    def confirmation(self, elapsed: float, status: str):
+        samples = self.confirmations.get(status)
+        if samples is None:
+            samples = self.confirmations[status] = LatencySamples()
+        samples.add(elapsed)
+
+    def event(self, name: str, count: int = 1):
+        self.events[name] = self.events.get(name, 0) + count
+
+    @property
+    def calls(self) -> int:
+        return sum(stats.latency.count for stats in self.methods.values())
+
+    def report(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "elapsed": elapsed,
+            "calls": self.calls,
+            "calls_per_second": self.calls / elapsed if elapsed > 0 else 0.0,
+            "methods": {method: stats.summary() for method, stats in sorted(self.methods.items())},
+            "confirmations": {status: samples.summary() for status, samples in sorted(self.confirmations.items())},
+            "events": dict(sorted(self.events.items())),
+        }
+
+    def snapshot(self) -> dict:
+        """
+        可合并的原始指标（可 JSON 序列化）：分片进程随结果返回，协调进程用 merge 并入自己的指标
+        """
+        return {
+            "methods": {
+                method: {**stats.latency.state(), "errors": dict(stats.errors), "retries": stats.retries}
+                for method, stats in self.methods.items()
+            },
+            "confirmations": {status: samples.state() for status, samples in self.confirmations.items()},
+            "events": dict(self.events),
+        }
+
+    def merge(self, snapshot: dict):
+        for method, state in snapshot.get("methods", {}).items():
+            stats = self._method(method)
+            stats.latency.merge(state["count"], state["total"], state["samples"])
+            for code, count in state["errors"].items():
+                stats.errors[code] = stats.errors.get(code, 0) + count
+            stats.retries += state["retries"]
+        for status, state in snapshot.get("confirmations", {}).items():
+            samples = self.confirmations.get(status)
+            if samples is None:
+                samples = self.confirmations[status] = LatencySamples()
+            samples.merge(state["count"], state["total"], state["samples"])
+        for name, count in snapshot.get("events", {}).items():
+            self.event(name, count)
+
+    def log_report(self):
+        report = self.report()
+        if not report["calls"]:
+            return
+        logger.info(f"RPC summary: {report['calls']} calls in {report['elapsed']:.1f}s ({report['calls_per_second']:.1f}/s)")
+        for method, stats in report["methods"].items():
+            errors = ", ".join(f"{code}x{count}" for code, count in stats["errors"].items()) or "none"
+            logger.info(
+                f"  {method}: {stats['count']} calls, p50 {stats['p50'] * 1000:.0f}ms, p95 {stats['p95'] * 1000:.0f}ms, "
+                f"p99 {stats['p99'] * 1000:.0f}ms, retries {stats['retries']}, errors {errors}"
+            )
+        for status, stats in report["confirmations"].items():
+            logger.info(f"  time to {status}: {stats['count']} txs, p50 {stats['p50']:.1f}s, p95 {stats['p95']:.1f}s, p99 {stats['p99']:.1f}s")
+        if report["events"]:
+            logger.info("  events: " + ", ".join(f"{name} {count}" for name, count in report["events"].items()))
+
+    def write_json(self, path: Optional[str] = METRICS_JSON_PATH):
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+        os.replace(tmp_path, path)
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus 文本格式（延迟以 summary 类型导出）
+        """
+        lines = [
+            "# TYPE solana_rpc_latency_seconds summary",
+        ]
+        for method, stats in sorted(self.methods.items()):
+            for q, value in stats.latency.quantiles().items():
+                lines.append(f'solana_rpc_latency_seconds{{method="{method}",quantile="{q / 100}"}} {value}')
+            lines.append(f'solana_rpc_latency_seconds_sum{{method="{method}"}} {stats.latency.total}')
+            lines.append(f'solana_rpc_latency_seconds_count{{method="{method}"}} {stats.latency.count}')
+        lines.append("# TYPE solana_rpc_errors_total counter")
+        for method, stats in sorted(self.methods.items()):
+            for code, count in sorted(stats.errors.items()):
+                lines.append(f'solana_rpc_errors_total{{method="{method}",code="{code}"}} {count}')
+        lines.append("# TYPE solana_rpc_retries_total counter")
+        for method, stats in sorted(self.methods.items()):
+            lines.append(f'solana_rpc_retries_total{{method="{method}"}} {stats.retries}')
+        lines.append("# TYPE solana_tx_confirmation_seconds summary")
+        for status, samples in sorted(self.confirmations.items()):
+            for q, value in samples.quantiles().items():
+                lines.append(f'solana_tx_confirmation_seconds{{status="{status}",quantile="{q / 100}"}} {value}')
+            lines.append(f'solana_tx_confirmation_seconds_sum{{status="{status}"}} {samples.total}')
+            lines.append(f'solana_tx_confirmation_seconds_count{{status="{status}"}} {samples.count}')
+        lines.append("# TYPE solana_events_total counter")
+        for name, count in sorted(self.events.items()):
+            lines.append(f'solana_events_total{{event="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str = METRICS_HOST, port: Optional[int] = METRICS_PORT):
+        """
+        在本地端口提供 Prometheus 抓取接口（任意路径都返回指标），port 为空时不启动
+        :return: asyncio Server 或 None
+        """
+        if not port:
+            return None
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                # 只需读完请求头，内容与路径无关
+                await reader.readuntil(b"\r\n\r\n")
+                body = self.to_prometheus().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+# 全局指标（每次菜单操作开始时重置）
+metrics = Metrics()
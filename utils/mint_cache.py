@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+from solders.pubkey import Pubkey
+from spl.token.core import MINT_LAYOUT
+
+from data.config import MINT_CACHE_SIZE, MINT_CACHE_TTL, MINT_CACHE_PATH
+
+
+class MintInfoCache:
+    """
+    Mint 账户信息缓存（LRU + TTL），可选持久化到磁盘
+    缓存原始账户数据，读取时用 MINT_LAYOUT 解析
+    """
+
+    def __init__(self, maxsize: int = MINT_CACHE_SIZE, ttl: float = MINT_CACHE_TTL, path: Optional[str] = MINT_CACHE_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._parsed: Dict[str, object] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as file:
+                raw = json.load(file)
+            for mint, (data, fetched_at) in raw.items():
+                self._entries[mint] = (base64.b64decode(data), fetched_at)
+            self._evict()
+        except Exception as e:
+            logger.warning(f"Failed to load mint cache {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        raw = {mint: [base64.b64encode(data).decode(), fetched_at] for mint, (data, fetched_at) in self._entries.items()}
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(raw, file)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save mint cache {self.path}: {e}")
+
+    def _evict(self):
+        now = time.time()
+        for mint in [m for m, (_, fetched_at) in self._entries.items() if now - fetched_at > self.ttl]:
+            self._entries.pop(mint)
+            self._parsed.pop(mint, None)
+        while len(self._entries) > self.maxsize:
+            mint, _ = self._entries.popitem(last=False)
+            self._parsed.pop(mint, None)
+
+    def get(self, mint: Pubkey):
+        """
+        返回解析后的 mint 信息，不存在或过期返回 None
+        """
+        if not self._loaded:
+            self._load()
+        key = str(mint)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        data, fetched_at = entry
+        if time.time() - fetched_at > self.ttl:
+            self._entries.pop(key)
+            self._parsed.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        if key not in self._parsed:
+            self._parsed[key] = MINT_LAYOUT.parse(data)
+        return self._parsed[key]
+
+    def put(self, mint: Pubkey, data: bytes):
+        if not self._loaded:
+            self._load()
+        key = str(mint)
+        self._entries[key] = (bytes(data), time.time())
+        self._entries.move_to_end(key)
+        self._parsed[key] = MINT_LAYOUT.parse(data)
+        self._evict()
+        self._save()
+        return self._parsed[key]
+
+    async def get_or_fetch(self, mint: Pubkey, fetch: Callable[[Pubkey], Awaitable[bytes]]):
+        """
+        命中缓存直接返回；否则调用 fetch 获取原始数据，同一 mint 的并发请求只发一次 RPC
+        """
+        cached = self.get(mint)
+        if cached is not None:
+            return cached
+        key = str(mint)
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 发起请求的调用方被取消，由这个等待者重新获取
+                return await self.get_or_fetch(mint, fetch)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            data = await fetch(mint)
+            result = self.put(mint, data)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # 取消不是 Exception，同样要结束共享的 future，否则其他等待者会一直挂起
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免没有其他等待者时出现 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._parsed.clear()
+        self._save()
+
+
+mint_cache = MintInfoCache()
@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Sequence, Tuple
+
+from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+
+from data.config import PRESIGN_WORKERS, PRESIGN_USE_PROCESSES, PRESIGN_CHUNK_SIZE, PRESIGN_LOOKAHEAD
+from utils.blockhash import get_blockhash_cache
+
+
+@dataclass
+class PresignedTransaction:
+    signature: Signature
+    raw: bytes
+    last_valid_block_height: int
+
+
+def _sign_chunk(
+    secret: bytes,
+    blockhash: bytes,
+    messages: List[List[Instruction]],
+    lookup_tables: List[AddressLookupTableAccount],
+) -> List[Tuple[bytes, bytes]]:
+    """
+    在工作进程/线程中编译并签名一批消息，返回 (签名字节, 交易字节)
+    """
+    payer = Keypair.from_bytes(secret)
+    recent_blockhash = Hash.from_bytes(blockhash)
+    signed = []
+    for instructions in messages:
+        transaction = VersionedTransaction(
+            MessageV0.try_compile(payer.pubkey(), instructions, lookup_tables, recent_blockhash), [payer]
+        )
+        signed.append((bytes(transaction.signatures[0]), bytes(transaction)))
+    return signed
+
+
+class Presigner:
+    """
+    离线预签名：把编译和 ed25519 签名分片到进程池（或线程池），按顺序流式产出交易字节，
+    事件循环只负责发送；只保持 lookahead 个分片在签名中，避免签好的交易在发送前 blockhash 过期
+    """
+
+    def __init__(
+        self,
+        workers: int = PRESIGN_WORKERS,
+        use_processes: bool = PRESIGN_USE_PROCESSES,
+        chunk_size: int = PRESIGN_CHUNK_SIZE,
+        lookahead: int = PRESIGN_LOOKAHEAD,
+    ):
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.chunk_size = max(1, chunk_size)
+        self.lookahead = max(1, lookahead)
+
+    def _executor(self) -> Executor:
+        if self.use_processes:
+            # spawn 避免在已有线程（日志、事件循环）的进程里 fork
+            return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(self.workers)
+
+    async def stream(
+        self,
+        client: AsyncClient,
+        payer: Keypair,
+        messages: Sequence[List[Instruction]],
+        lookup_tables: Sequence[AddressLookupTableAccount] = (),
+    ) -> AsyncIterator[Tuple[int, PresignedTransaction]]:
+        """
+        按 messages 的顺序产出 (下标, 预签名交易)；每个分片签名时使用当时缓存的 blockhash
+        """
+        loop = asyncio.get_running_loop()
+        cache = get_blockhash_cache(client)
+        secret = bytes(payer)
+        tables = list(lookup_tables)
+        offsets = list(range(0, len(messages), self.chunk_size))
+        executor = self._executor()
+
+        async def dispatch(offset):
+            blockhash, last_valid_block_height = await cache.get_with_height()
+            chunk = [list(instructions) for instructions in messages[offset:offset + self.chunk_size]]
+            signed = await loop.run_in_executor(executor, _sign_chunk, secret, bytes(blockhash), chunk, tables)
+            return last_valid_block_height, signed
+
+        pending = [asyncio.ensure_future(dispatch(offset)) for offset in offsets[:self.lookahead]]
+        next_chunk = len(pending)
+        try:
+            for offset in offsets:
+                last_valid_block_height, signed = await pending.pop(0)
+                if next_chunk < len(offsets):
+                    pending.append(asyncio.ensure_future(dispatch(offsets[next_chunk])))
+                    next_chunk += 1
+                for index, (signature, raw) in enumerate(signed, offset):
+                    yield index, PresignedTransaction(Signature.from_bytes(signature), raw, last_valid_block_height)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from data.config import (
+    RPC_READ_RATE,
+    RPC_READ_MAX_RATE,
+    RPC_SEND_RATE,
+    RPC_SEND_MAX_RATE,
+    RPC_MAX_CONCURRENCY,
+)
+
+READ = "read"
+SEND = "send"
+# 两次乘性减速之间的最短间隔（秒）
+THROTTLE_COOLDOWN = 0.5
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate（次/秒）补充令牌，最多累积 capacity 个
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AimdLimiter:
+    """
+    AIMD 自适应限流：成功时加性增加速率和并发，被限流时乘性减少
+    """
+
+    def __init__(self, rate: float, max_rate: float, max_concurrency: int = RPC_MAX_CONCURRENCY,
+                 min_rate: float = 1.0, min_concurrency: int = 1):
+        self.bucket = TokenBucket(rate)
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self.last_throttle = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+        try:
+            await self.bucket.acquire()
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self):
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + 1 / self.bucket.rate)
+        self.bucket.capacity = max(1.0, self.bucket.rate)
+
+    def on_throttle(self):
+        self.throttled += 1
+        now = time.monotonic()
+        # 同一时刻的一批限流响应（并发请求或同一批量请求）只减速一次
+        if now - self.last_throttle < THROTTLE_COOLDOWN:
+            return
+        self.last_throttle = now
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+        self.bucket.capacity = max(1.0, self.bucket.rate)
+        # 丢弃已累积的令牌，立即降速
+        self.bucket.tokens = min(self.bucket.tokens, 0.0)
+
+
+class EndpointRateLimiter:
+    """
+    单个 RPC 节点的限流器：读请求和 sendTransaction 使用独立预算
+    """
+
+    def __init__(self, read_rate: float = RPC_READ_RATE, read_max_rate: float = RPC_READ_MAX_RATE,
+                 send_rate: float = RPC_SEND_RATE, send_max_rate: float = RPC_SEND_MAX_RATE):
+        self.limiters = {
+            READ: AimdLimiter(read_rate, read_max_rate),
+            SEND: AimdLimiter(send_rate, send_max_rate),
+        }
+
+    def __getitem__(self, kind: str) -> AimdLimiter:
+        return self.limiters[kind]
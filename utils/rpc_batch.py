@@ -0,0 +1,210 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import httpx
+from loguru import logger
+from solana.rpc.providers.core import _after_request_unparsed
+
+from data.config import RPC_BATCH_WINDOW, RPC_BATCH_MAX_SIZE, RPC_BATCH_LIMITS
+from utils.metrics import metrics
+from utils.rate_limiter import READ, SEND
+
+# 发送交易不合并：需要尽快发出，且单独失败时不影响其他请求
+UNBATCHED_REQUESTS = ("SendLegacyTransaction", "SendVersionedTransaction", "SendRawTransaction")
+
+
+def batch_limit_for(url: str) -> int:
+    """
+    节点的批量上限：RPC_BATCH_LIMITS 中第一个出现在 URL 里的键，否则为 RPC_BATCH_MAX_SIZE
+    """
+    for pattern, limit in RPC_BATCH_LIMITS.items():
+        if pattern in url:
+            return limit
+    return RPC_BATCH_MAX_SIZE
+
+
+class RawRequest:
+    """
+    solders 未封装的 JSON-RPC 请求（如 getRecentPrioritizationFees），与 solders 请求体一样可以合并
+    """
+
+    id = 0
+
+    def __init__(self, method: str, params: list):
+        self.method = method
+        self.params = params
+
+    def to_json(self) -> str:
+        return json.dumps({"jsonrpc": "2.0", "id": self.id, "method": self.method, "params": self.params})
+
+
+class RoundTrip:
+    """
+    一次逻辑调用实际花在 HTTP 往返上的时间（拿到令牌之后，不含限流等待和批量窗口）
+    """
+
+    __slots__ = ("elapsed",)
+
+    def __init__(self):
+        self.elapsed: Optional[float] = None
+
+
+# 调用方（RpcPool._call）设置，BatchingTransport 在请求完成时填写
+current_round_trip: ContextVar[Optional[RoundTrip]] = ContextVar("current_round_trip", default=None)
+
+
+@contextmanager
+def _timed(round_trips: Sequence[Optional[RoundTrip]]):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - start
+        for round_trip in round_trips:
+            if round_trip is not None:
+                round_trip.elapsed = elapsed
+
+
+@asynccontextmanager
+async def _unlimited(_kind: str):
+    yield
+
+
+class BatchingTransport:
+    """
+    JSON-RPC 批量传输：替换 provider.make_request_unparsed，把 window 秒内并发发出的读请求
+    合并成一个批量数组（最多 max_size 个），再按 id 把各自的原始响应交还给调用方。
+    每个 HTTP 请求（单个或批量）通过 slot(kind) 占用一次限流；等待令牌期间到达的读请求
+    并入同一批。节点拒绝批量请求时自动减半上限并逐个重发。
+    拿到令牌后的 HTTP 往返时间写入各调用方的 RoundTrip
+    """
+
+    def __init__(self, provider, window: float = RPC_BATCH_WINDOW, max_size: int = RPC_BATCH_MAX_SIZE,
+                 slot: Callable = _unlimited):
+        self.provider = provider
+        self.window = window
+        self.max_size = max(1, max_size)
+        self.slot = slot
+        self._send_single = provider.make_request_unparsed
+        self._queue: List[Tuple[object, asyncio.Future, Optional[RoundTrip]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 已启动、正在等待限流的批次数
+        self._waiting = 0
+        self.batches = 0
+        self.batched_requests = 0
+
+    def install(self) -> "BatchingTransport":
+        self.provider.make_request_unparsed = self.request
+        return self
+
+    async def request(self, body) -> str:
+        round_trip = current_round_trip.get()
+        if type(body).__name__ in UNBATCHED_REQUESTS:
+            async with self.slot(SEND):
+                with _timed([round_trip]):
+                    return await self._send_single(body)
+        if self.max_size <= 1:
+            async with self.slot(READ):
+                with _timed([round_trip]):
+                    return await self._send_single(body)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((body, future, round_trip))
+        if len(self._queue) >= self.max_size * (self._waiting + 1):
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # 排队的请求由等待中的批次在拿到令牌时取走，只为放不下的部分启动新批次
+        needed = -(-len(self._queue) // self.max_size) - self._waiting
+        for _ in range(needed):
+            self._waiting += 1
+            asyncio.ensure_future(self._dispatch())
+
+    def _take_batch(self) -> List[Tuple[object, asyncio.Future, Optional[RoundTrip]]]:
+        batch, self._queue = self._queue[:self.max_size], self._queue[self.max_size:]
+        # 已取消的调用方不再发送
+        return [entry for entry in batch if not entry[1].done()]
+
+    async def _dispatch(self):
+        async with self.slot(READ):
+            self._waiting -= 1
+            batch = self._take_batch()
+            if len(self._queue) > self._waiting * self.max_size:
+                # 等待期间上限被调低，剩余请求需要更多批次
+                self._flush()
+            if not batch:
+                return
+            if len(batch) == 1:
+                await self._settle(*batch[0])
+                return
+            with _timed([round_trip for _, _, round_trip in batch]):
+                parsed = await self._post_batch(batch)
+        if parsed is None:
+            return
+        if not isinstance(parsed, list):
+            # 节点不支持批量或超过了它的上限（返回单个 error 对象）
+            self.max_size = max(1, len(batch) // 2)
+            metrics.event("rpc_batch_rejected")
+            logger.warning(f"RPC batch of {len(batch)} rejected ({str(parsed)[:200]}), batch size lowered to {self.max_size}")
+            await asyncio.gather(*[self._resolve_single(*entry) for entry in batch])
+            return
+        self.batches += 1
+        self.batched_requests += len(batch)
+        metrics.event("rpc_batches")
+        metrics.event("rpc_batched_requests", len(batch))
+        responses = {item.get("id"): item for item in parsed if isinstance(item, dict)}
+        for index, (body, future, _) in enumerate(batch):
+            if future.done():
+                continue
+            item = responses.get(index)
+            if item is None:
+                future.set_exception(httpx.DecodingError(f"batch response is missing id {index}"))
+                continue
+            item["id"] = body.id
+            future.set_result(json.dumps(item))
+
+    async def _post_batch(self, batch: List[Tuple[object, asyncio.Future, Optional[RoundTrip]]]):
+        """
+        发出一个批量请求，返回解析后的响应；传输失败时把异常交给批内所有调用方并返回 None
+        """
+        payload = []
+        for index, (body, _, _) in enumerate(batch):
+            request = json.loads(body.to_json())
+            # solders 请求默认 id 都是 0，批量内改用下标以便对应响应
+            request["id"] = index
+            payload.append(request)
+        try:
+            response = await self.provider.session.post(
+                content=json.dumps(payload), **self.provider._build_common_request_kwargs()
+            )
+            return json.loads(_after_request_unparsed(response))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return None
+
+    async def _resolve_single(self, body, future: asyncio.Future, round_trip: Optional[RoundTrip]):
+        async with self.slot(READ):
+            await self._settle(body, future, round_trip)
+
+    async def _settle(self, body, future: asyncio.Future, round_trip: Optional[RoundTrip]):
+        try:
+            with _timed([round_trip]):
+                raw = await self._send_single(body)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(raw)
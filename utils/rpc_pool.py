@@ -0,0 +1,324 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence, Union
+
+import httpx
+from loguru import logger
+from solana.exceptions import SolanaRpcException
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment
+from solana.rpc.core import RPCException
+
+from data.config import RPC_SEND_FANOUT, RPC_EJECT_SECONDS, RPC_TIMEOUT, RPC_THROTTLE_CODES
+from utils.metrics import metrics
+from utils.rate_limiter import EndpointRateLimiter, READ, SEND
+from utils.rpc_batch import BatchingTransport, RawRequest, RoundTrip, batch_limit_for, current_round_trip
+
+
+class RpcThrottledError(Exception):
+    """
+    RPC 返回了限流类错误码（如 -32429）
+    """
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(f"RPC throttled ({code}): {message}")
+        self.code = code
+
+
+# 视为节点故障（需要切换节点）的异常；RPC 返回的业务错误不在此列
+TRANSPORT_ERRORS = (SolanaRpcException, httpx.HTTPError, asyncio.TimeoutError, OSError, RpcThrottledError)
+SEND_METHODS = ("send_transaction", "send_raw_transaction")
+# 预检错误中表示交易已被接收过的文本：交易可能已经上链，不能当作拒绝
+ALREADY_PROCESSED_MARKERS = ("already been processed", "AlreadyProcessed")
+
+
+def http_status_of(exc: BaseException) -> Optional[int]:
+    """
+    沿异常链查找 HTTP 状态码（solana-py 会把 httpx 异常包装成 SolanaRpcException）
+    """
+    while exc is not None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code
+        exc = exc.__cause__
+    return None
+
+
+def is_rejected(exc: BaseException) -> bool:
+    """
+    节点在预检时拒绝了交易：没有转发，不会上链，可以安全地重新签名发送
+    """
+    return isinstance(exc, RPCException) and not any(marker in str(exc) for marker in ALREADY_PROCESSED_MARKERS)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return isinstance(exc, RpcThrottledError) or http_status_of(exc) == 429
+
+
+def rpc_error_of(raw: str):
+    """
+    从原始 JSON-RPC 响应中取出 error 对象（没有则返回 None）
+    """
+    if '"error"' not in raw:
+        return None
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict) and isinstance(parsed.get("error"), dict):
+        return parsed["error"]
+    return None
+
+
+async def raw_rpc_request(client, method: str, params: list):
+    """
+    通过 client 的 HTTP provider 发送原始 JSON-RPC 请求；RpcPool 会路由到健康节点
+    """
+    if isinstance(client, RpcPool):
+        return await client.raw_request(method, params)
+    provider = client._provider
+    body = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    response = await provider.session.post(json=body, **provider._build_common_request_kwargs())
+    response.raise_for_status()
+    return parse_raw_result(response.text)
+
+
+def raw_rpc_request_sync(client, method: str, params: list):
+    """
+    同步 Client 版本的 raw_rpc_request
+    """
+    provider = client._provider
+    body = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    response = httpx.post(json=body, timeout=provider.timeout, **provider._build_common_request_kwargs())
+    response.raise_for_status()
+    return parse_raw_result(response.text)
+
+
+def parse_raw_result(raw: str):
+    parsed = json.loads(raw)
+    if "error" in parsed:
+        error = parsed["error"]
+        if error.get("code") in RPC_THROTTLE_CODES:
+            raise RpcThrottledError(error.get("code"), error.get("message", ""))
+        raise ValueError(f"RPC error {error.get('code')}: {error.get('message')}")
+    return parsed["result"]
+
+
+class RpcEndpoint:
+    """
+    单个 RPC 节点：持久化的 AsyncClient + 延迟/健康统计
+    """
+
+    def __init__(self, url: str, commitment: Optional[Commitment] = None, timeout: float = RPC_TIMEOUT):
+        self.url = url
+        self.client = AsyncClient(url, commitment=commitment, timeout=timeout)
+        self.limiter = EndpointRateLimiter()
+        # 批量层在限流器之上：读请求先合并，每个 HTTP 请求再占用一个令牌；
+        # 限流错误码检查在批量层之上，合并后的响应拆开后仍逐个检查
+        self.batcher = BatchingTransport(
+            self.client._provider, max_size=batch_limit_for(url), slot=self.http_slot
+        ).install()
+        self._install_throttle_hook()
+        self.latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def _install_throttle_hook(self):
+        """
+        在 provider 层检查原始响应，限流错误码直接抛出 RpcThrottledError，交给限流器和故障切换处理
+        """
+        provider = self.client._provider
+        make_request_unparsed = provider.make_request_unparsed
+
+        async def checked_make_request_unparsed(body):
+            raw = await make_request_unparsed(body)
+            error = rpc_error_of(raw)
+            if error is not None and error.get("code") in RPC_THROTTLE_CODES:
+                raise RpcThrottledError(error.get("code"), error.get("message", ""))
+            return raw
+
+        provider.make_request_unparsed = checked_make_request_unparsed
+
+    @asynccontextmanager
+    async def http_slot(self, kind: str):
+        """
+        一个 HTTP 请求（单个或批量）的限流：占用并发名额和一个令牌，成功后加性提速
+        """
+        limiter = self.limiter[kind]
+        async with limiter.slot():
+            yield
+        limiter.on_success()
+
+    async def raw_request(self, method: str, params: list):
+        """
+        发送 solders 未封装的 JSON-RPC 请求（如 getRecentPrioritizationFees），返回 result
+        """
+        # 经过批量层和限流错误码检查，和其他读请求一起合并
+        return parse_raw_result(await self.client._provider.make_request_unparsed(RawRequest(method, params)))
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def score(self) -> float:
+        # 未测过延迟的节点优先尝试一次
+        return self.latency if self.latency is not None else 0.0
+
+    def record_success(self, elapsed: float):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+    def record_failure(self, exc: BaseException, eject_seconds: float):
+        self.requests += 1
+        self.errors += 1
+        if not self.healthy:
+            # 剔除前已发出的请求（如同一批量请求里的其他调用）随后失败，不再叠加退避
+            return
+        self.consecutive_failures += 1
+        backoff = eject_seconds * min(2 ** (self.consecutive_failures - 1), 32)
+        if is_rate_limited(exc):
+            backoff *= 2
+        self.ejected_until = time.monotonic() + backoff
+        logger.warning(f"RPC endpoint {self.url} ejected for {backoff:.1f}s: {exc!r}")
+
+
+class RpcPool:
+    """
+    多节点 RPC 池，可直接替代 AsyncClient 使用：
+    读请求路由到延迟最低的健康节点，失败自动切换；发送交易同时广播到多个节点
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        commitment: Optional[Commitment] = None,
+        timeout: float = RPC_TIMEOUT,
+        send_fanout: int = RPC_SEND_FANOUT,
+        eject_seconds: float = RPC_EJECT_SECONDS,
+    ):
+        if not urls:
+            raise ValueError("RpcPool needs at least one endpoint")
+        self.endpoints = [RpcEndpoint(url, commitment, timeout) for url in dict.fromkeys(urls)]
+        self.send_fanout = max(1, send_fanout)
+        self.eject_seconds = eject_seconds
+
+    def __repr__(self) -> str:
+        return f"RpcPool({', '.join(endpoint.url for endpoint in self.endpoints)})"
+
+    async def __aenter__(self) -> "RpcPool":
+        return self
+
+    async def __aexit__(self, _exc_type, _exc, _tb):
+        await self.close()
+
+    async def close(self):
+        await asyncio.gather(*[endpoint.client.close() for endpoint in self.endpoints], return_exceptions=True)
+
+    def ranked_endpoints(self) -> List[RpcEndpoint]:
+        """
+        健康节点按延迟排序在前；被剔除的节点按恢复时间排在后面作为兜底
+        """
+        healthy = sorted((e for e in self.endpoints if e.healthy), key=RpcEndpoint.score)
+        ejected = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.ejected_until)
+        return healthy + ejected
+
+    async def _call(self, endpoint: RpcEndpoint, method: str, *args, **kwargs):
+        # 令牌在 HTTP 层按请求（而非逻辑调用）扣除，见 RpcEndpoint.http_slot
+        limiter = endpoint.limiter[SEND if method in SEND_METHODS else READ]
+        # raw_request 按实际的 JSON-RPC 方法统计
+        name = args[0] if method == "raw_request" else method
+        # 延迟只计 HTTP 往返（由批量层填写），不含等待令牌和批量窗口，否则限流越紧节点显得越慢
+        round_trip = RoundTrip()
+        token = current_round_trip.set(round_trip)
+        start = time.monotonic()
+
+        def elapsed() -> float:
+            return round_trip.elapsed if round_trip.elapsed is not None else time.monotonic() - start
+
+        try:
+            target = getattr(endpoint.client, method, None) or getattr(endpoint, method)
+            result = await target(*args, **kwargs)
+        except TRANSPORT_ERRORS as e:
+            metrics.observe(name, elapsed(), e)
+            if is_rate_limited(e):
+                limiter.on_throttle()
+            endpoint.record_failure(e, self.eject_seconds)
+            raise
+        except Exception as e:
+            metrics.observe(name, elapsed(), e)
+            raise
+        finally:
+            current_round_trip.reset(token)
+        round_trip_time = elapsed()
+        metrics.observe(name, round_trip_time)
+        endpoint.record_success(round_trip_time)
+        return result
+
+    async def request(self, method: str, *args, **kwargs):
+        """
+        依次尝试排名靠前的节点，直到成功
+        """
+        last_error: Optional[BaseException] = None
+        for endpoint in self.ranked_endpoints():
+            if last_error is not None:
+                metrics.retry(args[0] if method == "raw_request" else method)
+            try:
+                return await self._call(endpoint, method, *args, **kwargs)
+            except TRANSPORT_ERRORS as e:
+                last_error = e
+        raise last_error
+
+    async def broadcast(self, method: str, *args, **kwargs):
+        """
+        同时向前 send_fanout 个节点发送，返回第一个成功结果。全部失败时，只有每个节点都在预检时拒绝才抛出拒绝错误；
+        否则抛出其他错误（如传输错误）：交易可能已被某个节点转发，调用方不能当作没有发出
+        """
+        endpoints = self.ranked_endpoints()[:self.send_fanout]
+        tasks = [asyncio.ensure_future(self._call(endpoint, method, *args, **kwargs)) for endpoint in endpoints]
+        errors: List[BaseException] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            # 其余节点的请求在后台完成即可，结果不再需要
+            for task in tasks:
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise next((e for e in errors if not is_rejected(e)), errors[-1])
+
+    async def send_transaction(self, *args, **kwargs):
+        return await self.broadcast("send_transaction", *args, **kwargs)
+
+    async def raw_request(self, method: str, params: list):
+        return await self.request("raw_request", method, params)
+
+    async def send_raw_transaction(self, *args, **kwargs):
+        return await self.broadcast("send_raw_transaction", *args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(AsyncClient, name, None)):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            return await self.request(name, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+
+@asynccontextmanager
+async def open_client(network: Union[str, RpcPool, AsyncClient]):
+    """
+    统一获取客户端：传入 RpcPool/AsyncClient 时直接复用（不关闭），传入 URL 时临时创建单节点 RpcPool（带限流）
+    """
+    if isinstance(network, (RpcPool, AsyncClient)):
+        yield network
+    else:
+        async with RpcPool([network]) as client:
+            yield client
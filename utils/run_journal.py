@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.types import TxOpts
+from solders.signature import Signature
+
+from data.config import RUN_JOURNAL_PATH, RUN_JOURNAL_SYNCHRONOUS, CONFIRM_COMMITMENT, REBROADCAST_INTERVAL
+from utils.confirmation import ConfirmationResult, get_confirmation_tracker, MAX_SIGNATURE_STATUSES, COMMITMENT_RANK, EXPIRED, FAILED as TX_FAILED
+from utils.rpc_pool import is_rejected
+
+# 动作状态：planned 已计划未发送；sent 已签名（签名在发送前写入），结果未知；
+# confirmed 已落地；failed 确定没有落地（交易失败或 blockhash 已过期），可以重试
+PLANNED = "planned"
+SENT = "sent"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+def digest(values: Iterable[str]) -> str:
+    """
+    长列表（地址、钱包）的摘要，用作运行参数的一部分
+    """
+    hasher = hashlib.sha256()
+    for value in values:
+        hasher.update(str(value).encode())
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+class RunJournal:
+    """
+    运行日志（SQLite WAL）：记录每次操作计划的动作、发送前的签名和最终状态。
+    同一操作和参数的未完成运行在重启后继续，只重新检查结果未知的签名
+    """
+
+    def __init__(self, path: str = RUN_JOURNAL_PATH, synchronous: str = RUN_JOURNAL_SYNCHRONOUS):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_id TEXT PRIMARY KEY, operation TEXT NOT NULL, params TEXT NOT NULL, "
+            "started_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS actions ("
+            "run_id TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL, signature TEXT, "
+            "last_valid_block_height INTEGER, detail TEXT, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (run_id, key)) WITHOUT ROWID"
+        )
+        # 签好的交易字节：续跑时重播仍在有效期内的交易，不必干等 blockhash 过期
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "run_id TEXT NOT NULL, signature TEXT NOT NULL, raw BLOB NOT NULL, PRIMARY KEY (run_id, signature))"
+        )
+        self._db.commit()
+
+    def open_run(self, operation: str, params: dict) -> "JournalRun":
+        """
+        打开 operation+params 对应的运行：上次未完成则继续，否则（含已完成）开始新的一轮
+        """
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        run_id = hashlib.sha256(f"{operation}\n{encoded}".encode()).hexdigest()[:16]
+        row = self._db.execute("SELECT finished_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        resumed = row is not None and row[0] is None
+        if not resumed:
+            self._db.execute("DELETE FROM actions WHERE run_id = ?", (run_id,))
+            self._db.execute("DELETE FROM transactions WHERE run_id = ?", (run_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs (run_id, operation, params, started_at, finished_at) VALUES (?, ?, ?, ?, NULL)",
+                (run_id, operation, encoded, time.time()),
+            )
+            self._db.commit()
+        run = JournalRun(self, run_id, operation, resumed)
+        if resumed:
+            counts = run.counts()
+            logger.info(
+                f"Resuming interrupted {operation} run {run_id}: "
+                f"{counts.get(CONFIRMED, 0)} done, {counts.get(SENT, 0)} in flight, {counts.get(FAILED, 0)} failed"
+            )
+        return run
+
+    def close(self):
+        self._db.close()
+
+
+class JournalRun:
+    """
+    一次运行的动作记录；key 由各操作自行定义（收款地址、钱包地址、钱包/交易序号等）
+    """
+
+    def __init__(self, journal: RunJournal, run_id: str, operation: str, resumed: bool):
+        self._db = journal._db
+        self.run_id = run_id
+        self.operation = operation
+        self.resumed = resumed
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._db.execute("SELECT status, COUNT(*) FROM actions WHERE run_id = ? GROUP BY status", (self.run_id,))
+        return dict(rows.fetchall())
+
+    def plan(self, entries: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        登记计划的动作；已登记过的 key 保留原来的 detail（例如随机金额），保证续跑时金额不变
+        :return: key -> 生效的 detail
+        """
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR IGNORE INTO actions (run_id, key, status, detail, updated_at) VALUES (?, ?, ?, ?, ?)",
+            [(self.run_id, key, PLANNED, json.dumps(detail), now) for key, detail in entries.items()],
+        )
+        self._db.commit()
+        stored = {}
+        keys = list(entries)
+        for i in range(0, len(keys), 900):
+            chunk = keys[i:i + 900]
+            rows = self._db.execute(
+                f"SELECT key, detail FROM actions WHERE run_id = ? AND key IN ({','.join('?' * len(chunk))})",
+                [self.run_id] + chunk,
+            )
+            stored.update({key: json.loads(detail) if detail else {} for key, detail in rows})
+        return stored
+
+    def with_status(self, *statuses: str) -> Dict[str, Tuple[Optional[str], dict]]:
+        """
+        :return: key -> (signature, detail)
+        """
+        rows = self._db.execute(
+            f"SELECT key, signature, detail FROM actions WHERE run_id = ? AND status IN ({','.join('?' * len(statuses))})",
+            [self.run_id, *statuses],
+        )
+        return {key: (signature, json.loads(detail) if detail else {}) for key, signature, detail in rows}
+
+    def done(self) -> Dict[str, Tuple[Optional[str], dict]]:
+        """
+        已落地或结果仍未知的动作：续跑时都不能再次执行
+        """
+        return self.with_status(CONFIRMED, SENT)
+
+    def sent(self, keys: Sequence[str], signature: Signature, raw: bytes, last_valid_block_height: Optional[int]):
+        """
+        在广播前记录签名和交易字节（写前日志）：崩溃后可以据此判断交易是否已经落地
+        """
+        now = time.time()
+        self._db.execute(
+            "INSERT OR IGNORE INTO transactions (run_id, signature, raw) VALUES (?, ?, ?)",
+            (self.run_id, str(signature), raw),
+        )
+        self._db.executemany(
+            "INSERT INTO actions (run_id, key, status, signature, last_valid_block_height, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_id, key) DO UPDATE SET status = excluded.status, signature = excluded.signature, "
+            "last_valid_block_height = excluded.last_valid_block_height, updated_at = excluded.updated_at",
+            [(self.run_id, key, SENT, str(signature), last_valid_block_height, now) for key in keys],
+        )
+        self._db.commit()
+
+    def on_signed(self, keys: Sequence[str]) -> Callable[[Signature, bytes, Optional[int]], None]:
+        """
+        给发送器的回调：每次（重新）签名后、广播前记录签名
+        """
+        return lambda signature, raw, last_valid_block_height: self.sent(keys, signature, raw, last_valid_block_height)
+
+    def finish(self, keys: Sequence[str], status: str, signature: Optional[Signature] = None, detail: Optional[dict] = None):
+        now = time.time()
+        self._db.executemany(
+            "INSERT INTO actions (run_id, key, status, signature, detail, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_id, key) DO UPDATE SET status = excluded.status, "
+            "signature = COALESCE(excluded.signature, signature), detail = COALESCE(excluded.detail, detail), "
+            "updated_at = excluded.updated_at",
+            [
+                (self.run_id, key, status, str(signature) if signature is not None else None,
+                 json.dumps(detail) if detail is not None else None, now)
+                for key in keys
+            ],
+        )
+        self._db.commit()
+
+    def fail(self, keys: Sequence[str], error: BaseException) -> bool:
+        """
+        发送出错时调用：所有节点都预检拒绝或还没记录签名时标记为 failed；已记录签名的保持 sent，
+        交易可能已被节点接收（包括 "already processed"），由 recover_in_flight 确定结果
+        :return: 是否可以安全重试
+        """
+        if not is_rejected(error):
+            rows = self._db.execute(
+                f"SELECT 1 FROM actions WHERE run_id = ? AND status = ? AND key IN ({','.join('?' * len(keys))}) LIMIT 1",
+                [self.run_id, SENT, *keys],
+            )
+            if rows.fetchone() is not None:
+                return False
+        self.finish(keys, FAILED)
+        return True
+
+    def record(self, keys: Sequence[str], result: ConfirmationResult, detail: Optional[dict] = None):
+        """
+        按确认结果更新动作：落地为 confirmed，交易失败或过期为 failed，超时（结果未知）保持 sent
+        """
+        if result.landed:
+            self.finish(keys, CONFIRMED, result.signature, detail)
+        elif result.status in (TX_FAILED, EXPIRED):
+            self.finish(keys, FAILED, result.signature, detail)
+
+    def reset_prefix(self, prefix: str):
+        """
+        重新处理一个钱包前，清掉它上一轮已有结果的子动作（key 以 prefix 开头）
+        """
+        self._db.execute(
+            "DELETE FROM actions WHERE run_id = ? AND key LIKE ? AND status != ?",
+            (self.run_id, prefix.replace("%", "") + "%", SENT),
+        )
+        self._db.commit()
+
+    def in_flight(self) -> Dict[str, Tuple[List[str], Optional[int], Optional[bytes]]]:
+        """
+        :return: signature -> (keys, last_valid_block_height, 交易字节)，一笔批量交易可对应多个 key
+        """
+        pending: Dict[str, Tuple[List[str], Optional[int], Optional[bytes]]] = {}
+        rows = self._db.execute(
+            "SELECT a.key, a.signature, a.last_valid_block_height, t.raw FROM actions a "
+            "LEFT JOIN transactions t ON t.run_id = a.run_id AND t.signature = a.signature "
+            "WHERE a.run_id = ? AND a.status = ?",
+            (self.run_id, SENT),
+        )
+        for key, signature, last_valid_block_height, raw in rows:
+            keys, _, _ = pending.setdefault(signature, ([], last_valid_block_height, raw))
+            keys.append(key)
+        return pending
+
+    def complete(self) -> bool:
+        """
+        没有失败和未知结果的动作时把运行标记为完成（同样的参数下次会重新开始）；否则保持打开，重跑时只补做剩余部分
+        """
+        counts = self.counts()
+        remaining = sum(count for status, count in counts.items() if status != CONFIRMED)
+        if remaining:
+            logger.warning(f"{self.operation} run {self.run_id} left {remaining} actions unfinished; run it again to resume")
+            return False
+        self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+        self._db.commit()
+        return True
+
+
+async def _rebroadcast_until_final(client: AsyncClient, signature: Signature, raw: Optional[bytes], last_valid_block_height: Optional[int]):
+    """
+    重播上次签好的交易（崩溃时可能还没发出），直到确认跟踪器给出结果
+    """
+    confirmation = get_confirmation_tracker(client).track(signature, last_valid_block_height)
+    while raw is not None and not confirmation.done():
+        try:
+            await client.send_raw_transaction(raw, TxOpts(skip_preflight=True, max_retries=0))
+        except Exception as e:
+            logger.debug(f"rebroadcast {signature} failed: {e}")
+        try:
+            await asyncio.wait_for(asyncio.shield(confirmation), REBROADCAST_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+    return await confirmation
+
+
+async def recover_in_flight(client: AsyncClient, run: JournalRun) -> Dict[str, int]:
+    """
+    续跑前重新检查上次发出但结果未知的签名：查询带历史的签名状态，已落地的标记完成，
+    交易失败或 blockhash 已过期的标记失败（可以安全重发），仍在有效期内的重播原交易直到有结果
+    :return: 各结果的数量
+    """
+    pending = run.in_flight()
+    if not pending:
+        return {}
+    tracker = get_confirmation_tracker(client)
+    required = COMMITMENT_RANK.get(str(tracker.commitment), 1)
+    block_height = (await client.get_block_height(CONFIRM_COMMITMENT)).value
+    counts = {CONFIRMED: 0, FAILED: 0, SENT: 0}
+    waiting = []
+    signatures = list(pending)
+    for i in range(0, len(signatures), MAX_SIGNATURE_STATUSES):
+        chunk = signatures[i:i + MAX_SIGNATURE_STATUSES]
+        # 上次运行可能在很久之前，状态缓存之外的签名要查历史
+        response = await client.get_signature_statuses(
+            [Signature.from_string(signature) for signature in chunk], search_transaction_history=True
+        )
+        for signature, status in zip(chunk, response.value):
+            keys, last_valid_block_height, _ = pending[signature]
+            if status is not None and status.err is not None:
+                run.finish(keys, FAILED, signature)
+                counts[FAILED] += 1
+            elif status is not None and (int(status.confirmation_status) if status.confirmation_status is not None else 2) >= required:
+                run.finish(keys, CONFIRMED, signature)
+                counts[CONFIRMED] += 1
+            elif status is None and last_valid_block_height is not None and block_height > last_valid_block_height:
+                run.finish(keys, FAILED, signature)
+                counts[FAILED] += 1
+            else:
+                waiting.append(signature)
+    results = await asyncio.gather(
+        *[
+            _rebroadcast_until_final(client, Signature.from_string(signature), pending[signature][2], pending[signature][1])
+            for signature in waiting
+        ]
+    )
+    for signature, result in zip(waiting, results):
+        # 超时仍无法确定的保持 sent：这些动作不会被重新执行
+        run.record(pending[signature][0], result)
+        counts[CONFIRMED if result.landed else FAILED if result.status in (TX_FAILED, EXPIRED) else SENT] += 1
+    logger.info(
+        f"Rechecked {len(pending)} in-flight signatures: {counts[CONFIRMED]} landed, "
+        f"{counts[FAILED]} failed or expired, {counts[SENT]} still unknown"
+    )
+    return counts
+
+
+_journal: Optional[RunJournal] = None
+
+
+def get_run_journal() -> RunJournal:
+    """
+    获取共享的运行日志（首次使用时打开）
+    """
+    global _journal
+    if _journal is None:
+        _journal = RunJournal()
+    return _journal
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Union
+
+from loguru import logger
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Finalized
+from solana.rpc.types import TxOpts
+from solders.hash import Hash
+from solders.signature import Signature
+from solders.transaction import Transaction, VersionedTransaction
+
+from data.config import REBROADCAST_INTERVAL, MAX_RESIGNS, CONFIRM_TIMEOUT
+from utils.client_registry import ClientBound, ClientRegistry
+from utils.blockhash import get_blockhash_cache
+from utils.metrics import metrics
+from utils.rpc_pool import is_rejected
+from utils.confirmation import (
+    get_confirmation_tracker,
+    ConfirmationResult,
+    CONFIRMED,
+    FAILED,
+    EXPIRED,
+    TIMEOUT,
+    COMMITMENT_RANK,
+)
+
+if TYPE_CHECKING:
+    from utils.presign import PresignedTransaction
+
+BuildTransaction = Callable[[Hash], Union[Transaction, VersionedTransaction]]
+# 每次签名后、广播前调用：(签名, 交易字节, last_valid_block_height)
+OnSigned = Callable[[Signature, bytes, Optional[int]], None]
+
+class TransactionNotLanded(Exception):
+    """
+    交易没有确认上链；retryable 为 False 表示结果未知（超时），重发可能导致重复转账
+    """
+
+    def __init__(self, result: ConfirmationResult):
+        super().__init__(f"transaction {result.signature} {result.status}: {result.err}")
+        self.result = result
+
+    @property
+    def retryable(self) -> bool:
+        return self.result.status != TIMEOUT
+
+
+# 重播时跳过预检，并让 RPC 节点不要自行重试（由我们重播）
+REBROADCAST_OPTS = TxOpts(skip_preflight=True, max_retries=0)
+
+
+class TransactionSender(ClientBound):
+    """
+    签名一次、重复广播同一份字节直到确认或 blockhash 过期；只有确认过期后才用新 blockhash 重新签名，
+    避免重建交易导致的重复转账
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        rebroadcast_interval: float = REBROADCAST_INTERVAL,
+        max_resigns: int = MAX_RESIGNS,
+    ):
+        super().__init__(client)
+        self.rebroadcast_interval = rebroadcast_interval
+        self.max_resigns = max_resigns
+        self._tasks: Dict[Signature, asyncio.Task] = {}
+
+    async def submit(
+        self,
+        build: BuildTransaction,
+        presigned: Optional["PresignedTransaction"] = None,
+        on_signed: Optional[OnSigned] = None,
+    ) -> Signature:
+        """
+        用缓存的 blockhash 构建并发送交易（首次带预检，预检拒绝和签名前的错误直接抛出），后台持续重播直到有结果。
+        签名记录之后的广播错误（超时、断连）不抛出：节点可能已经收到交易，由重播和确认跟踪给出结果
+        :param build: 接收 blockhash、返回已签名交易的函数
+        :param presigned: 预先签好的交易字节，首次发送直接使用；build 仅在 blockhash 过期后重签时调用
+        :param on_signed: 每个新签名在广播前的回调（运行日志据此在崩溃后检查交易是否落地）
+        :return: 首次签名，可用 wait() 等待最终结果
+        """
+        submitted_at = time.monotonic()
+        if presigned is None:
+            blockhash, last_valid_block_height = await get_blockhash_cache(self.client).get_with_height()
+            transaction = build(blockhash)
+            signature = transaction.signatures[0]
+            raw = bytes(transaction)
+            if on_signed is not None:
+                on_signed(signature, raw, last_valid_block_height)
+            await self._broadcast(signature, self.client.send_transaction(transaction))
+        else:
+            signature, raw, last_valid_block_height = (
+                presigned.signature, presigned.raw, presigned.last_valid_block_height
+            )
+            if on_signed is not None:
+                on_signed(signature, raw, last_valid_block_height)
+            await self._broadcast(signature, self.client.send_raw_transaction(raw))
+        self._tasks[signature] = asyncio.get_running_loop().create_task(
+            self._drive(build, signature, raw, last_valid_block_height, submitted_at, on_signed)
+        )
+        return signature
+
+    @staticmethod
+    async def _broadcast(signature: Signature, request):
+        """
+        首次广播：预检拒绝说明交易不会上链，直接抛出；其他错误（包括 "already processed"）时交易可能已被接收，交给重播
+        """
+        try:
+            await request
+        except Exception as e:
+            if is_rejected(e):
+                raise
+            logger.debug(f"broadcast {signature} failed, rebroadcasting: {e}")
+
+    def is_tracking(self, signature: Signature) -> bool:
+        return signature in self._tasks
+
+    async def wait(self, signature: Signature) -> ConfirmationResult:
+        """
+        等待 submit 返回的签名的最终结果；结果中的 signature 是最终落地（或最后一次）的签名
+        """
+        task = self._tasks[signature]
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._tasks.pop(signature, None)
+
+    async def send(
+        self,
+        build: BuildTransaction,
+        presigned: Optional["PresignedTransaction"] = None,
+        on_signed: Optional[OnSigned] = None,
+    ) -> ConfirmationResult:
+        return await self.wait(await self.submit(build, presigned, on_signed))
+
+    async def _drive(self, build: BuildTransaction, signature: Signature, raw: bytes, last_valid_block_height: int, submitted_at: float, on_signed: Optional[OnSigned] = None) -> ConfirmationResult:
+        result = await self._drive_until_final(build, signature, raw, last_valid_block_height, on_signed)
+        # 从首次发送到最终结果的时间（包含重播和重签）
+        metrics.confirmation(time.monotonic() - submitted_at, result.status)
+        return result
+
+    async def _drive_until_final(self, build: BuildTransaction, signature: Signature, raw: bytes, last_valid_block_height: int, on_signed: Optional[OnSigned] = None) -> ConfirmationResult:
+        tracker = get_confirmation_tracker(self.client)
+        resigns = 0
+        while True:
+            confirmation = tracker.track(signature, last_valid_block_height)
+            while not confirmation.done():
+                try:
+                    await asyncio.wait_for(asyncio.shield(confirmation), self.rebroadcast_interval)
+                except asyncio.TimeoutError:
+                    metrics.event("rebroadcasts")
+                    try:
+                        await self.client.send_raw_transaction(raw, REBROADCAST_OPTS)
+                    except Exception as e:
+                        logger.debug(f"rebroadcast {signature} failed: {e}")
+            result = confirmation.result()
+            if result.status != EXPIRED or resigns >= self.max_resigns:
+                return result
+            # blockhash 已确认过期，旧交易不可能再上链，此时重新签名才安全
+            resigns += 1
+            logger.debug(f"{signature} expired, re-signing ({resigns}/{self.max_resigns})")
+            metrics.event("resigns")
+            try:
+                blockhash, last_valid_block_height = await get_blockhash_cache(self.client).refresh()
+                transaction = build(blockhash)
+            except Exception as e:
+                # 旧签名已确认过期，新交易还没签出
+                return ConfirmationResult(signature, FAILED, str(e))
+            signature = transaction.signatures[0]
+            raw = bytes(transaction)
+            if on_signed is not None:
+                on_signed(signature, raw, last_valid_block_height)
+            try:
+                await self._broadcast(signature, self.client.send_transaction(transaction))
+            except Exception as e:
+                # _broadcast 只抛出预检拒绝
+                return ConfirmationResult(signature, FAILED, str(e))
+
+
+_senders: ClientRegistry[TransactionSender] = ClientRegistry(TransactionSender)
+
+
+def get_transaction_sender(client: AsyncClient) -> TransactionSender:
+    """
+    获取 client 对应的共享发送器
+    """
+    return _senders.get(client)
+
+
+def send_until_expiry_sync(
+    client: Client,
+    build: BuildTransaction,
+    rebroadcast_interval: float = REBROADCAST_INTERVAL,
+    max_resigns: int = MAX_RESIGNS,
+    commitment=Finalized,
+) -> ConfirmationResult:
+    """
+    同步 Client 版本：签名一次并重播，直到确认或 blockhash 过期后再重签
+    """
+    required = COMMITMENT_RANK.get(str(commitment), 1)
+    cache = get_blockhash_cache(client, commitment)
+    resigns = 0
+    while True:
+        blockhash, last_valid_block_height = cache.get_sync()
+        transaction = build(blockhash)
+        signature = transaction.signatures[0]
+        client.send_transaction(transaction)
+        raw = bytes(transaction)
+        deadline = time.monotonic() + CONFIRM_TIMEOUT
+        while True:
+            time.sleep(rebroadcast_interval)
+            status = client.get_signature_statuses([signature]).value[0]
+            if status is not None:
+                if status.err is not None:
+                    return ConfirmationResult(signature, FAILED, status.err, status.slot)
+                rank = int(status.confirmation_status) if status.confirmation_status is not None else 2
+                if rank >= required:
+                    return ConfirmationResult(signature, CONFIRMED, None, status.slot)
+                continue
+            block_height = client.get_block_height(commitment).value
+            if block_height > last_valid_block_height:
+                break
+            if time.monotonic() > deadline:
+                return ConfirmationResult(signature, TIMEOUT)
+            try:
+                client.send_raw_transaction(raw, REBROADCAST_OPTS)
+            except Exception as e:
+                logger.debug(f"rebroadcast {signature} failed: {e}")
+        if resigns >= max_resigns:
+            return ConfirmationResult(signature, EXPIRED)
+        resigns += 1
+        # 强制获取新的 blockhash
+        cache.fetched_at = 0.0
@@ -0,0 +1,484 @@
+"""
+分片执行：把 keys.txt/addresses.txt 切成分片，每个分片在独立的工作进程中用自己的事件循环和 RPC 连接运行，
+分片作为任务登记在 SQLite 任务队列里，其他机器可以用相同的数据文件加入：
+
+    python -m utils.sharding work --queue /shared/shard_jobs.sqlite --main-key main.key
+    python -m utils.sharding status --queue /shared/shard_jobs.sqlite
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+from solders.keypair import Keypair
+
+from data.config import (
+    RPC_URLS,
+    RPC_READ_RATE,
+    RPC_READ_MAX_RATE,
+    RPC_SEND_RATE,
+    RPC_SEND_MAX_RATE,
+    SHARD_WORKERS,
+    SHARD_SIZE,
+    SHARD_QUEUE_PATH,
+    SHARD_LEASE_SECONDS,
+    SHARD_MAX_ATTEMPTS,
+)
+from utils.metrics import metrics
+from utils.run_journal import digest
+
+# 操作 -> 分片的数据文件（data/ 下）
+OPERATIONS = {
+    "send_sol": "addresses.txt",
+    "collect_tokens": "keys.txt",
+    "sweep_tokens": "keys.txt",
+    "close_accounts": "keys.txt",
+    "collect_sol": "keys.txt",
+    "consolidate": "keys.txt",
+}
+# 重跑会重复转账的操作：运行日志只在运行过分片的机器上，重试和租期过期的分片只交还给那台机器
+HOST_BOUND_OPERATIONS = ("send_sol",)
+# 合并汇总时取最大值而不是相加的字段
+MAX_FIELDS = ("duration",)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def item_key(item) -> str:
+    return str(item.pubkey()) if isinstance(item, Keypair) else str(item)
+
+
+def merge_summaries(summaries: Sequence[dict]) -> dict:
+    """
+    合并各分片的汇总：数值相加（duration 取最大），列表拼接，字典（如按 mint 的总量）递归合并
+    """
+    merged: dict = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value, list) else merge_summaries([value]) if isinstance(value, dict) else value
+            elif isinstance(value, list):
+                merged[key].extend(value)
+            elif isinstance(value, dict):
+                merged[key] = merge_summaries([merged[key], value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = max(merged[key], value) if key in MAX_FIELDS else merged[key] + value
+    return merged
+
+
+class JobQueue:
+    """
+    分片任务队列（SQLite）：每个批次按分片序号登记任务，工作进程用 BEGIN IMMEDIATE 领取，
+    运行中定期心跳；心跳超过租期的任务可被其他工作进程重新领取（send_sol 分片只能由原来的机器重新领取）。
+    队列文件可以放在共享目录供多台机器使用（不开启 WAL，WAL 不支持网络文件系统）
+    """
+
+    def __init__(self, path: str = SHARD_QUEUE_PATH, lease: float = SHARD_LEASE_SECONDS, max_attempts: int = SHARD_MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 自动提交模式，领取任务时显式开启写事务
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "batch_id TEXT NOT NULL, shard INTEGER NOT NULL, operation TEXT NOT NULL, params TEXT NOT NULL, "
+            "source TEXT NOT NULL, digest TEXT NOT NULL, shard_size INTEGER NOT NULL, "
+            "status TEXT NOT NULL, worker TEXT, heartbeat REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, error TEXT, PRIMARY KEY (batch_id, shard))"
+        )
+
+    def submit(self, operation: str, params: dict, source: str, items_digest: str, total: int, shard_size: int = SHARD_SIZE) -> str:
+        """
+        登记一个批次；相同操作、参数和数据的批次只登记一次，重复提交会接着未完成的分片运行
+        :return: batch_id
+        """
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        batch_id = hashlib.sha256(f"{operation}\n{encoded}\n{items_digest}\n{shard_size}".encode()).hexdigest()[:16]
+        shards = (total + shard_size - 1) // shard_size
+        existing = self.progress(batch_id)
+        if existing and existing.get(FAILED):
+            # 重试放弃过的分片，保留 worker：send_sol 分片仍只由运行过它的机器重跑；已完成的分片不再运行
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, error = NULL WHERE batch_id = ? AND status = ?",
+                (PENDING, batch_id, FAILED),
+            )
+        elif existing and existing.get(PENDING, 0) + existing.get(RUNNING, 0) == 0:
+            # 上一轮已全部完成，重新开始
+            self._db.execute("DELETE FROM jobs WHERE batch_id = ?", (batch_id,))
+        self._db.executemany(
+            "INSERT OR IGNORE INTO jobs (batch_id, shard, operation, params, source, digest, shard_size, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(batch_id, shard, operation, encoded, source, items_digest, shard_size, PENDING) for shard in range(shards)],
+        )
+        return batch_id
+
+    def release_dead_local(self):
+        """
+        本机已退出的进程（例如崩溃后重启的菜单）留下的 running 分片立即放回队列，不必等租期过去
+        """
+        prefix = f"{socket.gethostname()}:"
+        rows = self._db.execute("SELECT batch_id, shard, worker FROM jobs WHERE status = ? AND worker LIKE ?", (RUNNING, prefix + "%"))
+        for batch_id, shard, worker in rows.fetchall():
+            if not _process_alive(int(worker[len(prefix):])):
+                self._db.execute(
+                    "UPDATE jobs SET status = ? WHERE batch_id = ? AND shard = ? AND status = ? AND worker = ?",
+                    (PENDING, batch_id, shard, RUNNING, worker),
+                )
+
+    def claim(self, worker: str, batch_id: Optional[str] = None) -> Optional[dict]:
+        """
+        领取一个待运行（或租期已过）的分片；已运行过的 send_sol 分片只由同一台机器领取，
+        其他机器没有它的运行日志，重跑会给已付款的地址再付一次
+        """
+        now = time.time()
+        host = worker.split(":", 1)[0]
+        bound = ", ".join("?" for _ in HOST_BOUND_OPERATIONS)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT batch_id, shard, operation, params, source, digest, shard_size, attempts FROM jobs "
+                "WHERE (status = ? OR (status = ? AND heartbeat < ?)) AND (? IS NULL OR batch_id = ?) "
+                f"AND (operation NOT IN ({bound}) OR worker IS NULL OR worker LIKE ?) "
+                "ORDER BY batch_id, shard LIMIT 1",
+                (PENDING, RUNNING, now - self.lease, batch_id, batch_id, *HOST_BOUND_OPERATIONS, f"{host}:%"),
+            ).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE batch_id = ? AND shard = ?",
+                (RUNNING, worker, now, row[0], row[1]),
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        batch, shard, operation, params, source, items_digest, shard_size, attempts = row
+        return {
+            "batch_id": batch, "shard": shard, "operation": operation, "params": json.loads(params),
+            "source": source, "digest": items_digest, "shard_size": shard_size, "attempts": attempts + 1,
+        }
+
+    def heartbeat(self, job: dict, worker: str):
+        self._db.execute(
+            "UPDATE jobs SET heartbeat = ? WHERE batch_id = ? AND shard = ? AND worker = ?",
+            (time.time(), job["batch_id"], job["shard"], worker),
+        )
+
+    def finish(self, job: dict, summary: dict):
+        self._db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL WHERE batch_id = ? AND shard = ?",
+            (DONE, json.dumps(summary, default=str), job["batch_id"], job["shard"]),
+        )
+
+    def fail(self, job: dict, error: str):
+        """
+        分片进程异常退出：未超过最大次数时放回队列。运行日志保存在本机，send_sol 分片重跑时
+        靠它跳过已付款的地址，因此只会由同一台机器重新领取（见 claim）
+        """
+        status = FAILED if job["attempts"] >= self.max_attempts else PENDING
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ? WHERE batch_id = ? AND shard = ?",
+            (status, error, job["batch_id"], job["shard"]),
+        )
+
+    def bound_elsewhere(self, batch_id: str, host: str) -> Dict[int, str]:
+        """
+        等待其他机器重新领取的分片（send_sol 分片的工作进程已停止或出错）：分片序号 -> 原来的 worker
+        """
+        bound = ", ".join("?" for _ in HOST_BOUND_OPERATIONS)
+        rows = self._db.execute(
+            "SELECT shard, worker FROM jobs WHERE batch_id = ? AND worker NOT LIKE ? "
+            f"AND operation IN ({bound}) AND (status = ? OR (status = ? AND heartbeat < ?))",
+            (batch_id, f"{host}:%", *HOST_BOUND_OPERATIONS, PENDING, RUNNING, time.time() - self.lease),
+        )
+        return dict(rows.fetchall())
+
+    def progress(self, batch_id: str) -> Dict[str, int]:
+        rows = self._db.execute("SELECT status, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,))
+        return dict(rows.fetchall())
+
+    def batches(self) -> List[str]:
+        return [row[0] for row in self._db.execute("SELECT DISTINCT batch_id FROM jobs ORDER BY batch_id")]
+
+    def results(self, batch_id: str) -> List[dict]:
+        rows = self._db.execute("SELECT result FROM jobs WHERE batch_id = ? AND status = ? ORDER BY shard", (batch_id, DONE))
+        return [json.loads(result) for (result,) in rows]
+
+    def errors(self, batch_id: str) -> Dict[int, str]:
+        rows = self._db.execute("SELECT shard, error FROM jobs WHERE batch_id = ? AND status = ?", (batch_id, FAILED))
+        return dict(rows.fetchall())
+
+    def close(self):
+        self._db.close()
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def load_items(source: str) -> list:
+    """
+    读取 data/ 下的数据文件：keys.txt 得到 Keypair 列表，其他为地址列表（与菜单相同的去重和校验）
+    """
+    from utils.wallet_loader import load_keys, load_addresses
+
+    path = os.path.join("data", source)
+    if source == "keys.txt":
+        index, report = load_keys(path)
+        report.log()
+        return index.keypairs()
+    addresses, report = load_addresses(path)
+    report.log()
+    return addresses
+
+
+async def _run_operation(client, operation: str, params: dict, items: list, sender: Optional[Keypair]) -> dict:
+    import main
+
+    if operation == "send_sol":
+        return await main.send_sol_to_addresses({
+            'network_url': client,
+            'addresses': items,
+            'min_amount': params['min_amount'],
+            'max_amount': params['max_amount'],
+            'private_key': sender,
+            'batch': params.get('batch', False),
+            # 查找表缓存文件不能由多个进程同时维护；签名已经分散在各分片进程中
+            'lookup_tables': False,
+            'presign': False,
+        })
+    if operation == "collect_tokens":
+        return {'total_tokens': await main.collect_tokens_from_addresses(client, params['mint'], params['recipient'], items)}
+    if operation == "sweep_tokens":
+        return await main.sweep_all_tokens_from_addresses(client, params['recipient'], items)
+    if operation == "close_accounts":
+        return await main.close_all_token_account_from_addresses(client, items)
+    if operation == "collect_sol":
+        return await main.collect_sol_from_addresses(client, params['recipient'], items, close_accounts=params.get('close_accounts', False))
+    if operation == "consolidate":
+        return await main.consolidate_wallets(client, params['recipient'], items)
+    raise ValueError(f"unknown operation {operation}")
+
+
+async def _run_shard_async(job: dict, items: list, sender: Optional[Keypair], rpc_urls: List[str], share: int) -> dict:
+    from utils.rate_limiter import EndpointRateLimiter
+    from utils.rpc_pool import RpcPool
+
+    metrics.reset()
+    async with RpcPool(rpc_urls) as client:
+        # 同一台机器上的分片进程平分节点限额
+        for endpoint in client.endpoints:
+            endpoint.limiter = EndpointRateLimiter(
+                RPC_READ_RATE / share, RPC_READ_MAX_RATE / share, RPC_SEND_RATE / share, RPC_SEND_MAX_RATE / share
+            )
+        summary = await _run_operation(client, job["operation"], job["params"], items, sender)
+    logger.info(f"Shard {job['shard']} of batch {job['batch_id']} finished")
+    metrics.log_report()
+    # RPC 调用都发生在分片进程里，指标随结果交给协调进程汇总
+    summary['metrics'] = metrics.snapshot()
+    return summary
+
+
+def run_shard(job: dict, items: list, sender: Optional[Keypair], rpc_urls: List[str], share: int) -> dict:
+    """
+    工作进程入口：为分片新建事件循环和 RPC 连接
+    """
+    return asyncio.run(_run_shard_async(job, items, sender, rpc_urls, share))
+
+
+async def work(
+    queue: JobQueue,
+    processes: int = SHARD_WORKERS,
+    batch_id: Optional[str] = None,
+    items: Optional[list] = None,
+    sender: Optional[Keypair] = None,
+    rpc_urls: Optional[List[str]] = None,
+):
+    """
+    用 processes 个工作进程领取并运行队列中的分片，直到没有可领取的分片
+    :param items: 本机已加载的完整数据（按 batch 的数据文件）；为空时按任务从 data/ 读取并校验摘要
+    """
+    processes = max(1, processes)
+    rpc_urls = rpc_urls or list(RPC_URLS.values())
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    loaded: Dict[str, list] = {}
+    loop = asyncio.get_running_loop()
+
+    def items_for(job: dict) -> list:
+        data = items
+        if data is None:
+            data = loaded.get(job["source"])
+            if data is None:
+                data = loaded[job["source"]] = load_items(job["source"])
+        if digest(item_key(item) for item in data) != job["digest"]:
+            raise RuntimeError(f"data/{job['source']} differs from the one batch {job['batch_id']} was submitted with")
+        start = job["shard"] * job["shard_size"]
+        return data[start:start + job["shard_size"]]
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        async def slot():
+            while True:
+                job = queue.claim(worker_id, batch_id)
+                if job is None:
+                    return
+                logger.info(f"Running shard {job['shard']} of batch {job['batch_id']} (attempt {job['attempts']})")
+                try:
+                    if job["operation"] == "send_sol" and sender is None:
+                        raise RuntimeError("send_sol shards need the sender key (--main-key)")
+                    future = loop.run_in_executor(pool, run_shard, job, items_for(job), sender, rpc_urls, processes)
+                    while True:
+                        try:
+                            summary = await asyncio.wait_for(asyncio.shield(future), queue.lease / 3)
+                            break
+                        except asyncio.TimeoutError:
+                            queue.heartbeat(job, worker_id)
+                except BrokenProcessPool as e:
+                    # 工作进程崩溃后整个进程池不可用：放回分片，由下一次 work() 用新的进程池继续
+                    logger.error(f"Shard {job['shard']} of batch {job['batch_id']} lost its worker process: {e!r}")
+                    queue.fail(job, repr(e))
+                    return
+                except Exception as e:
+                    logger.error(f"Shard {job['shard']} of batch {job['batch_id']} failed: {e!r}")
+                    queue.fail(job, repr(e))
+                    continue
+                queue.finish(job, summary)
+
+        await asyncio.gather(*[slot() for _ in range(processes)])
+
+
+class ShardedExecutor:
+    """
+    把一个操作的数据切成分片登记到任务队列，由本机的工作进程（以及加入同一队列的其他机器）执行，
+    等全部分片结束后合并成与单进程相同格式的汇总
+    """
+
+    def __init__(
+        self,
+        workers: int = SHARD_WORKERS,
+        shard_size: int = SHARD_SIZE,
+        queue_path: str = SHARD_QUEUE_PATH,
+        rpc_urls: Optional[List[str]] = None,
+        poll_interval: float = 5.0,
+    ):
+        self.workers = max(1, workers)
+        self.shard_size = max(1, shard_size)
+        self.queue_path = queue_path
+        self.rpc_urls = rpc_urls
+        self.poll_interval = poll_interval
+
+    async def run(self, operation: str, items: list, params: dict, sender: Optional[Keypair] = None) -> dict:
+        """
+        :param items: 完整的地址列表（send_sol）或 Keypair 列表，需与 data/ 下对应文件的内容一致，其他机器才能加入
+        :param params: 操作参数（只含公开信息，会写入任务队列）
+        :param sender: send_sol 的付款钱包，只传给本机工作进程
+        :return: 合并后的汇总，另有 'shards'、'failed_shards'（放弃的分片数）和 'unprocessed'（其中的钱包/地址数）
+        """
+        source = OPERATIONS[operation]
+        queue = JobQueue(self.queue_path)
+        try:
+            started_at = time.time()
+            items_digest = digest(item_key(item) for item in items)
+            queue.release_dead_local()
+            batch_id = queue.submit(operation, params, source, items_digest, len(items), self.shard_size)
+            logger.info(
+                f"Running {operation} over {len(items)} wallets as batch {batch_id} "
+                f"({(len(items) + self.shard_size - 1) // self.shard_size} shards, {self.workers} local workers)"
+            )
+            waiting_on: Dict[int, str] = {}
+            while True:
+                await work(queue, self.workers, batch_id, items, sender, self.rpc_urls)
+                # 其他机器可能还在运行剩余分片；它们停止心跳后分片会被本机重新领取
+                progress = queue.progress(batch_id)
+                if not progress.get(PENDING) and not progress.get(RUNNING):
+                    break
+                stranded = queue.bound_elsewhere(batch_id, socket.gethostname())
+                if stranded and stranded != waiting_on:
+                    hosts = sorted({worker.split(":", 1)[0] for worker in stranded.values()})
+                    logger.warning(
+                        f"Shards {sorted(stranded)} of batch {batch_id} can only be resumed on {', '.join(hosts)} "
+                        f"(its run journal knows who was paid); run `python -m utils.sharding work` there"
+                    )
+                waiting_on = stranded
+                await asyncio.sleep(self.poll_interval)
+            results = queue.results(batch_id)
+            for result in results:
+                # 分片的 RPC 指标并入本进程，菜单照常输出整个批次的报告
+                metrics.merge(result.pop('metrics', {}))
+            summary = merge_summaries(results)
+            errors = queue.errors(batch_id)
+            for shard, error in errors.items():
+                logger.error(f"Shard {shard} of batch {batch_id} gave up: {error}")
+            # 放弃的分片没有结果，汇总里要写明缺了多少，部分完成的运行不能看起来像已全部完成
+            summary['shards'] = (len(items) + self.shard_size - 1) // self.shard_size
+            summary['failed_shards'] = len(errors)
+            summary['unprocessed'] = sum(min(self.shard_size, len(items) - shard * self.shard_size) for shard in errors)
+            if 'duration' in summary:
+                summary['duration'] = time.time() - started_at
+            return summary
+        finally:
+            queue.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run or inspect sharded jobs from a shared queue")
+    parser.add_argument("command", choices=("work", "status"))
+    parser.add_argument("--queue", default=SHARD_QUEUE_PATH, help="job queue database shared by all machines")
+    parser.add_argument("--processes", type=int, default=SHARD_WORKERS, help="worker processes on this machine")
+    parser.add_argument("--batch", help="only work on / report this batch")
+    parser.add_argument("--main-key", help="file with the main wallet private key (needed for send_sol shards)")
+    parser.add_argument("--rpc", action="append", help="RPC URL for this machine (repeatable, defaults to RPC_URLS)")
+    return parser.parse_args()
+
+
+def cli():
+    args = parse_args()
+    queue = JobQueue(args.queue)
+    try:
+        queue.release_dead_local()
+        if args.command == "work":
+            sender = None
+            if args.main_key:
+                from utils.wallet_loader import parse_keypair
+
+                with open(args.main_key) as file:
+                    sender = parse_keypair(file.read().strip())
+            asyncio.run(work(queue, args.processes, args.batch, sender=sender, rpc_urls=args.rpc))
+            return
+        for batch_id in [args.batch] if args.batch else queue.batches():
+            progress = queue.progress(batch_id)
+            print(f"batch {batch_id}: " + ", ".join(f"{status} {count}" for status, count in sorted(progress.items())))
+            summary = merge_summaries(queue.results(batch_id))
+            summary.pop('results', None)
+            summary.pop('metrics', None)
+            print(json.dumps(summary, indent=2, default=str))
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,74 @@
+from typing import Callable, List, Sequence, Union
+
+from solders.instruction import Instruction
+from solders.message import Message, MessageV0, to_bytes_versioned
+
+# Solana 单笔交易的最大序列化大小（IPv6 MTU - 头部）
+PACKET_DATA_SIZE = 1232
+
+
+def _short_vec_len(n: int) -> int:
+    size = 1
+    while n >= 0x80:
+        n >>= 7
+        size += 1
+    return size
+
+
+def transaction_size(message: Union[Message, MessageV0]) -> int:
+    """
+    计算消息签名后的交易字节数，无需真正签名
+    """
+    num_signatures = message.header.num_required_signatures
+    if isinstance(message, MessageV0):
+        message_size = len(to_bytes_versioned(message))
+    else:
+        message_size = len(bytes(message))
+    return _short_vec_len(num_signatures) + 64 * num_signatures + message_size
+
+
+def pack_instruction_groups(
+    groups: Sequence[Sequence[Instruction]],
+    build_message: Callable[[List[Instruction]], Union[Message, MessageV0]],
+    max_size: int = PACKET_DATA_SIZE,
+) -> List[List[int]]:
+    """
+    贪心地将指令组打包，同一组的指令（如创建账户 + 转账）总在同一笔交易中
+    :param groups: 待打包的指令组（按顺序）
+    :param build_message: 用一组指令编译消息的函数（可包含固定的前置指令，如 compute budget）
+    :return: 每笔交易包含的指令组下标列表
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_instructions: List[Instruction] = []
+    for index, group in enumerate(groups):
+        candidate = current_instructions + list(group)
+        if transaction_size(build_message(candidate)) <= max_size:
+            current.append(index)
+            current_instructions = candidate
+            continue
+        if not current:
+            raise ValueError("Single instruction exceeds transaction size limit")
+        batches.append(current)
+        current = [index]
+        current_instructions = list(group)
+        if transaction_size(build_message(current_instructions)) > max_size:
+            raise ValueError("Single instruction exceeds transaction size limit")
+    if current:
+        batches.append(current)
+    return batches
+
+
+def pack_instructions(
+    instructions: Sequence[Instruction],
+    build_message: Callable[[List[Instruction]], Union[Message, MessageV0]],
+    max_size: int = PACKET_DATA_SIZE,
+) -> List[List[Instruction]]:
+    """
+    贪心地将指令分组，使每组编译出的交易不超过 max_size 字节
+    :param instructions: 待打包的指令（按顺序）
+    :param build_message: 用一组指令编译消息的函数（可包含固定的前置指令，如 compute budget）
+    :return: 指令分组列表
+    """
+    batches = pack_instruction_groups([[instruction] for instruction in instructions], build_message, max_size)
+    return [[instructions[index] for index in batch] for batch in batches]
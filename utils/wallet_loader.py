@@ -0,0 +1,222 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+
+from data.config import LOADER_WORKERS, LOADER_CHUNK_LINES, LOADER_PARALLEL_MIN_BYTES
+
+# 报告中最多逐行列出的错误行数
+MAX_REPORTED_LINES = 20
+
+
+def decode_private_key(value: Union[Sequence[int], str]) -> bytes:
+    """
+    把私钥（JSON 数组或 base58 字符串）解码为 64 字节，格式不对时抛出 ValueError
+    （不使用 eval；也不调用 Keypair.from_base58_string，它对非法输入会 panic 而不是抛异常；
+    64 字节的 base58 借用 Signature.from_string 在 Rust 中解码）
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid JSON key: {e}") from None
+        else:
+            try:
+                return bytes(Signature.from_string(value))
+            except ValueError as e:
+                raise ValueError(f"invalid base58 key: {e}") from None
+    if not all(isinstance(byte, int) and 0 <= byte < 256 for byte in value):
+        raise ValueError("key array must contain bytes (0-255)")
+    return _check_length(bytes(value))
+
+
+def _check_length(secret: bytes) -> bytes:
+    if len(secret) != 64:
+        raise ValueError(f"key must be 64 bytes, got {len(secret)}")
+    return secret
+
+
+def parse_keypair(value: Union[Sequence[int], str]) -> Keypair:
+    """
+    解析私钥，非法（包括公钥与私钥不匹配）时抛出 ValueError
+    """
+    secret = decode_private_key(value)
+    keypair = Keypair.from_seed(secret[:32])
+    if bytes(keypair)[32:] != secret[32:]:
+        raise ValueError("public key does not match private key")
+    return keypair
+
+
+@dataclass
+class LoadReport:
+    path: str
+    lines: int = 0
+    loaded: int = 0
+    duplicates: int = 0
+    invalid: List[Tuple[int, str]] = field(default_factory=list)
+
+    def log(self):
+        logger.info(f"{self.path}: {self.loaded} loaded, {self.duplicates} duplicates skipped, {len(self.invalid)} invalid of {self.lines} lines")
+        for line_number, reason in self.invalid[:MAX_REPORTED_LINES]:
+            logger.warning(f"{self.path}:{line_number}: {reason}")
+        if len(self.invalid) > MAX_REPORTED_LINES:
+            logger.warning(f"{self.path}: {len(self.invalid) - MAX_REPORTED_LINES} more invalid lines not shown")
+
+
+class KeyIndex:
+    """
+    pubkey -> 私钥的紧凑索引（只存 64 字节），Keypair 在首次使用时创建并缓存，pubkey 无需反复推导
+    """
+
+    def __init__(self):
+        self._secrets: Dict[Pubkey, bytes] = {}
+        self._keypairs: Dict[Pubkey, Keypair] = {}
+
+    def add(self, pubkey: Pubkey, secret: bytes, keypair: Optional[Keypair] = None) -> bool:
+        if pubkey in self._secrets:
+            return False
+        self._secrets[pubkey] = secret
+        if keypair is not None:
+            self._keypairs[pubkey] = keypair
+        return True
+
+    def __len__(self):
+        return len(self._secrets)
+
+    def __contains__(self, pubkey: Pubkey):
+        return pubkey in self._secrets
+
+    def pubkeys(self) -> List[Pubkey]:
+        return list(self._secrets)
+
+    def keypair(self, pubkey: Pubkey) -> Keypair:
+        keypair = self._keypairs.get(pubkey)
+        if keypair is None:
+            keypair = Keypair.from_bytes(self._secrets[pubkey])
+            self._keypairs[pubkey] = keypair
+        return keypair
+
+    def keypairs(self) -> List[Keypair]:
+        return [self.keypair(pubkey) for pubkey in self._secrets]
+
+
+def iter_lines(path: str) -> Iterator[Tuple[int, str]]:
+    """
+    逐行读取（不一次性载入整个文件），跳过空行，产出 (行号, 内容)
+    """
+    with open(path, 'r') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if line:
+                yield line_number, line
+
+
+def _chunks(iterator, size: int):
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decode_key_chunk(lines: List[Tuple[int, str]], keep_keypairs: bool = False):
+    """
+    在工作进程中解码一批私钥，返回 ([(行号, pubkey 字节, 私钥字节, Keypair 或 None)], [(行号, 错误)])
+    keep_keypairs 仅在同进程解码时使用，避免之后再次创建 Keypair
+    """
+    decoded, invalid = [], []
+    for line_number, line in lines:
+        try:
+            keypair = parse_keypair(line)
+        except ValueError as e:
+            invalid.append((line_number, str(e)))
+            continue
+        secret = bytes(keypair)
+        # 私钥字节的后 32 字节就是 pubkey，无需再调用 keypair.pubkey()
+        decoded.append((line_number, secret[32:], secret, keypair if keep_keypairs else None))
+    return decoded, invalid
+
+
+def _file_signature(path: str):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+_key_cache: Dict[str, Tuple[tuple, KeyIndex, LoadReport]] = {}
+_address_cache: Dict[str, Tuple[tuple, List[str], LoadReport]] = {}
+
+
+def load_keys(path: str, workers: int = LOADER_WORKERS, chunk_lines: int = LOADER_CHUNK_LINES) -> Tuple[KeyIndex, LoadReport]:
+    """
+    流式读取私钥文件：去重、并行解码、报告非法行；文件未变化时直接复用上次的索引
+    """
+    signature = _file_signature(path)
+    cached = _key_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+    index, report = KeyIndex(), LoadReport(path)
+    seen = set()
+
+    def unique_lines():
+        for line_number, line in iter_lines(path):
+            report.lines += 1
+            if line in seen:
+                report.duplicates += 1
+                continue
+            seen.add(line)
+            yield line_number, line
+
+    chunks = _chunks(unique_lines(), max(1, chunk_lines))
+    if workers > 1 and signature[1] >= LOADER_PARALLEL_MIN_BYTES:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(_decode_key_chunk, chunks))
+    else:
+        results = [_decode_key_chunk(chunk, keep_keypairs=True) for chunk in chunks]
+    for decoded, invalid in results:
+        report.invalid.extend(invalid)
+        for _, pubkey, secret, keypair in decoded:
+            # 同一私钥的不同写法（JSON / base58）按 pubkey 再去重一次
+            if index.add(Pubkey.from_bytes(pubkey), secret, keypair):
+                report.loaded += 1
+            else:
+                report.duplicates += 1
+    report.invalid.sort()
+    _key_cache[path] = (signature, index, report)
+    return index, report
+
+
+def load_addresses(path: str) -> Tuple[List[str], LoadReport]:
+    """
+    流式读取地址文件：校验并去重，报告非法行；文件未变化时直接复用上次的结果
+    """
+    signature = _file_signature(path)
+    cached = _address_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+    addresses, report = [], LoadReport(path)
+    seen = set()
+    for line_number, line in iter_lines(path):
+        report.lines += 1
+        try:
+            pubkey = Pubkey.from_string(line)
+        except ValueError as e:
+            report.invalid.append((line_number, f"invalid address: {e}"))
+            continue
+        if pubkey in seen:
+            report.duplicates += 1
+            continue
+        seen.add(pubkey)
+        addresses.append(str(pubkey))
+    report.loaded = len(addresses)
+    _address_cache[path] = (signature, addresses, report)
+    return addresses, report